@@ -1,13 +1,19 @@
 import logging
 import os
 import json
-from openai import AzureOpenAI  
-import requests
-import fitz 
-from azure.storage.blob import BlobClient
-from azure.core.credentials import AzureKeyCredential
-from azure.cosmos import CosmosClient, PartitionKey
+import threading
+import time
 import azure.functions as func
+from .chunking import chunk_text, pool_embeddings
+from .embedding_cache import create_embedding_cache
+from .embedding_codec import encode_embedding
+from .vector_index import index_document
+from .pdf_extract import extract_pdf
+from .blob_fetch import download_blob_bytes, download_blob_text, blob_etag, fetch_concurrently
+from . import openai_client
+from . import idempotency
+from . import telemetry
+from . import warmup
 
 # Config vars
 AZURE_OPENAI_KEY = os.environ["AZURE_OPENAI_KEY"]
@@ -19,50 +25,192 @@ cosmos_db = os.environ["COSMOS_DB"]
 cosmos_container = os.environ["COSMOS_CONTAINER"]
 STORAGE_ACCOUNT_NAME = os.environ["STORAGE_ACCOUNT_NAME"]
 STORAGE_SAS_TOKEN = os.environ["BLOB_SAS_TOKEN"]
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "16"))
+ETAG_LOOKUP_ATTEMPTS = int(os.environ.get("ETAG_LOOKUP_ATTEMPTS", "3"))
 
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_KEY,
-    api_version="2024-02-01",
-    azure_endpoint=AZURE_OPENAI_ENDPOINT
-)
-
-cosmos_client = CosmosClient(cosmos_url, credential=cosmos_key)
-db = cosmos_client.get_database_client(cosmos_db)
-container = db.get_container_client(cosmos_container)
-
-def extract_text_from_pdf_bytes(pdf_bytes):
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        text = ""
-        for page in doc:
-            text += page.get_text()
-    return text
-
-def download_blob_text(blob_url):
-    full_url = f"{blob_url}?{STORAGE_SAS_TOKEN}"
-    response = requests.get(full_url)
-    response.raise_for_status()
-    return response.text
+# Clientes (y SDKs) creados en el primer uso para no alargar el arranque en frío
+_client = None
+_db = None
+_container = None
+_embedding_cache = None
+_embedding_cache_loaded = False
+_clients_lock = threading.RLock()
+
+def get_openai_client():
+    global _client
+    if _client is None:
+        with _clients_lock:
+            if _client is None:
+                _client = openai_client.create_client(endpoint=AZURE_OPENAI_ENDPOINT, api_key=AZURE_OPENAI_KEY)
+    return _client
+
+def get_database():
+    global _db
+    if _db is None:
+        with _clients_lock:
+            if _db is None:
+                from azure.cosmos import CosmosClient
+                _db = CosmosClient(cosmos_url, credential=cosmos_key).get_database_client(cosmos_db)
+    return _db
+
+def get_container():
+    global _container
+    if _container is None:
+        with _clients_lock:
+            if _container is None:
+                _container = get_database().get_container_client(cosmos_container)
+    return _container
+
+def get_embedding_cache():
+    """Caché de embeddings (None si EMBEDDING_CACHE_BACKEND=none)"""
+    global _embedding_cache, _embedding_cache_loaded
+    if not _embedding_cache_loaded:
+        with _clients_lock:
+            if not _embedding_cache_loaded:
+                _embedding_cache = create_embedding_cache(OPENAI_DEPLOYMENT, get_database=get_database)
+                _embedding_cache_loaded = True
+    return _embedding_cache
+
+def extract_text_from_pdf_bytes(pdf_bytes, with_offsets=False):
+    with telemetry.span("pdf.extract", bytes=len(pdf_bytes)) as span:
+        result = extract_pdf(pdf_bytes)
+        span.set(pages=result.pages_read, chars=len(result.text))
+    logging.info(f"PDF extraído: {result.pages_read}/{result.pages_total} páginas, {len(result.text)} caracteres")
+    if with_offsets:
+        return result.text, result.page_offsets
+    return result.text
+
+def with_sas(blob_url):
+    return f"{blob_url}?{STORAGE_SAS_TOKEN}"
+
+def generate_embeddings(texts):
+    """Genera los embeddings de varios textos agrupándolos en el menor número de llamadas.
+
+    Los textos ya presentes en la caché (o repetidos en la misma petición) no se envían a OpenAI.
+    """
+    embedding_cache = get_embedding_cache()
+    embeddings = [embedding_cache.get(text) if embedding_cache else None for text in texts]
+    pending = list(dict.fromkeys(text for text, vector in zip(texts, embeddings) if vector is None))
+
+    computed = {}
+    for i in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+        batch = pending[i:i + EMBEDDING_BATCH_SIZE]
+        with telemetry.span("openai.embeddings", inputs=len(batch)) as span:
+            response = get_openai_client().embeddings.create(
+                input=batch,
+                model=OPENAI_DEPLOYMENT
+            )
+            span.set(**telemetry.openai_usage(response))
+        for text, item in zip(batch, sorted(response.data, key=lambda d: d.index)):
+            computed[text] = item.embedding
+            if embedding_cache:
+                embedding_cache.set(text, item.embedding)
+
+    return [vector if vector is not None else computed[text] for text, vector in zip(texts, embeddings)]
 
 def generate_embedding(text):
-    response = client.embeddings.create(
-        input=text,
-        model=OPENAI_DEPLOYMENT
-    )
-    return response.data[0].embedding
+    return generate_embeddings([text])[0]
+
+def embed_documents(texts):
+    """Divide cada documento en fragmentos y los embebe todos en un único lote.
+
+    Devuelve, por documento, el vector agregado y la lista de fragmentos con su vector.
+    """
+    with telemetry.span("chunking", documents=len(texts)) as span:
+        chunks_per_doc = [chunk_text(text) for text in texts]
+        span.set(chunks=sum(len(chunks) for chunks in chunks_per_doc))
+    if not all(chunks_per_doc):
+        raise ValueError("Documento sin texto para generar embeddings")
+
+    all_chunks = [chunk for chunks in chunks_per_doc for chunk in chunks]
+    with telemetry.span("embeddings", chunks=len(all_chunks)):
+        vectors = generate_embeddings([chunk.text for chunk in all_chunks])
+    logging.info(f"Embeddings generados: {len(all_chunks)} fragmentos de {len(texts)} documentos")
 
-def insert_into_cosmos(doc_id, text, embedding, doc_type):
+    results = []
+    offset = 0
+    for chunks in chunks_per_doc:
+        doc_vectors = vectors[offset:offset + len(chunks)]
+        offset += len(chunks)
+        pooled = pool_embeddings(doc_vectors, [chunk.tokens for chunk in chunks])
+        chunk_docs = [
+            {"start": chunk.start, "end": chunk.end, "tokens": chunk.tokens, "embedding": encode_embedding(vector)}
+            for chunk, vector in zip(chunks, doc_vectors)
+        ]
+        results.append((pooled, chunk_docs))
+    return results
+
+def insert_into_cosmos(doc_id, text, embedding, doc_type, chunks=None, source=None):
     document = {
         "id": f"{doc_id}-{doc_type}",
         "text": text,
-        "embedding": embedding,
+        "embedding": encode_embedding(embedding),
         "type": doc_type
     }
-    container.upsert_item(document)
+    if chunks is not None:
+        document["chunks"] = chunks
+    if source is not None:
+        # Blob y ETag de origen: permite saber si el documento está al día sin volver a procesarlo
+        document["source"] = source
+    container = get_container()
+    with telemetry.span("cosmos.upsert", item_type=doc_type) as span:
+        span.set(bytes=len(json.dumps(document)))
+        container.upsert_item(document, response_hook=telemetry.cosmos_hook(span))
+    index_document(document["id"], doc_type, embedding)
     logging.info(f"Documento subido a Cosmos DB")
 
+def publish_status(job_id, state, error=None):
+    """Publica {job_id}-status para que Function3 sepa cuándo están listos los embeddings"""
+    document = {
+        "id": f"{job_id}-status",
+        "type": "status",
+        "state": state,
+        "updated": time.time()
+    }
+    if error is not None:
+        document["error"] = error
+    try:
+        container = get_container()
+        with telemetry.span("cosmos.upsert", item_type="status", state=state) as span:
+            container.upsert_item(document, response_hook=telemetry.cosmos_hook(span))
+    except Exception as e:
+        logging.warning(f"No se pudo publicar el estado {state} de {job_id}: {e}")
+
+def stored_source_etag(doc_id, doc_type):
+    """ETag del blob con el que se generó {doc_id}-{doc_type} (None si no existe)"""
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
+    container = get_container()
+    with telemetry.span("cosmos.read", item_type=doc_type) as span:
+        try:
+            item = container.read_item(
+                f"{doc_id}-{doc_type}", partition_key=f"{doc_id}-{doc_type}", response_hook=telemetry.cosmos_hook(span)
+            )
+        except CosmosResourceNotFoundError as e:
+            span.set(found=False, request_charge=telemetry.cosmos_charge(e.headers))
+            return None
+    return item.get("source", {}).get("etag")
+
+def source_etag(event_data, blob_url):
+    """ETag de la versión del blob del evento; sin él la clave de idempotencia no distinguiría versiones.
+
+    Si no se obtiene se lanza la excepción para que Event Grid reintente la entrega.
+    """
+    etag = (event_data.get("eTag") or "").strip('"')
+    for attempt in range(ETAG_LOOKUP_ATTEMPTS):
+        if etag:
+            return etag
+        if attempt:
+            time.sleep(0.5 * attempt)
+        etag = (blob_etag(with_sas(blob_url)) or "").strip('"')
+    if etag:
+        return etag
+    raise ValueError(f"No se pudo obtener el ETag de {blob_url.split('?', 1)[0]}")
+
 def main(event: func.EventGridEvent):
     logging.info("Evento recibido")
-    
+    job_id = None
+    record = None
+
     try:
         # Obtener datos del evento
         event_data = event.get_json()
@@ -71,22 +219,65 @@ def main(event: func.EventGridEvent):
         filename = blob_url.split("/")[-1]
         job_id = filename.split("-")[1]
 
-        job_offer_url = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net/upload/joboffer/jobOffer-{job_id}.txt"
+        with telemetry.job_trace(job_id, "GenerateEmbeddings") as trace:
+            # Idempotencia: cada versión del blob (URL + ETag) se procesa una sola vez
+            etag = source_etag(event_data, blob_url)
+            key = idempotency.ingest_key(blob_url, etag)
+            with idempotency.collapse(key) as owner:
+                if not owner:
+                    logging.info(f"Entrega concurrente de {filename} ({etag}) en este proceso, se ignora")
+                    trace.set(outcome="duplicate")
+                    return
+                with telemetry.span("idempotency.claim"):
+                    record = idempotency.claim(get_container(), key, blob_url, etag, job_id)
+                if record is None:
+                    trace.set(outcome="duplicate")
+                    return
+                process_blob(job_id, blob_url, etag)
+                idempotency.complete(get_container(), record)
+                trace.set(outcome="processed")
 
-        # Procesar archivos guardados
-        cv_text = extract_text_from_pdf_bytes(requests.get(blob_url + "?" + STORAGE_SAS_TOKEN).content)
-        job_offer_text = download_blob_text(job_offer_url)
+    except Exception as e:
+        logging.error(f"Error procesando los blobs: {e}")
+        if record is not None:
+            idempotency.fail(get_container(), record, str(e))
+        if job_id is not None:
+            publish_status(job_id, "failed", str(e))
+        raise e
 
-        # Generar embeddings
-        cv_embedding = generate_embedding(cv_text)
-        job_embedding = generate_embedding(job_offer_text)
+def process_blob(job_id, blob_url, etag):
+    publish_status(job_id, "processing")
 
-        # Insertar en Cosmos DB
-        insert_into_cosmos(job_id, cv_text, cv_embedding, "cv")
-        insert_into_cosmos(job_id, job_offer_text, job_embedding, "joboffer")
-        
-        logging.info(f"Procesamiento completado para job_id: {job_id}")
+    job_offer_url = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net/upload/joboffer/jobOffer-{job_id}.txt"
 
-    except Exception as e:
-        logging.error(f"Error procesando los blobs: {e}")
-        raise e
\ No newline at end of file
+    # Descargar el CV y, en paralelo, comprobar si la oferta ya está embebida con su versión actual
+    cv_bytes, offer_etag, stored_offer_etag = fetch_concurrently(
+        (download_blob_bytes, with_sas(blob_url)),
+        (blob_etag, with_sas(job_offer_url)),
+        (stored_source_etag, job_id, "joboffer")
+    )
+    cv_text = extract_text_from_pdf_bytes(cv_bytes)
+
+    if offer_etag and offer_etag == stored_offer_etag:
+        logging.info(f"Oferta de {job_id} sin cambios ({offer_etag}), se reutilizan sus embeddings")
+        (cv_embedding, cv_chunks), = embed_documents([cv_text])
+    else:
+        job_offer_text = download_blob_text(with_sas(job_offer_url))
+        # Generar embeddings (CV y oferta en el mismo lote)
+        (cv_embedding, cv_chunks), (job_embedding, job_chunks) = embed_documents([cv_text, job_offer_text])
+        insert_into_cosmos(job_id, job_offer_text, job_embedding, "joboffer", job_chunks,
+                           source={"url": job_offer_url, "etag": offer_etag})
+
+    # Insertar en Cosmos DB
+    insert_into_cosmos(job_id, cv_text, cv_embedding, "cv", cv_chunks,
+                       source={"url": blob_url.split("?", 1)[0], "etag": etag})
+    publish_status(job_id, "ready")
+    
+    if get_embedding_cache():
+        logging.info(f"Caché de embeddings: {get_embedding_cache().stats()}")
+    logging.info(f"Cuota OpenAI: {openai_client.stats()}")
+    logging.info(f"Telemetría: {telemetry.stats()}")
+    logging.info(f"Procesamiento completado para job_id: {job_id}")
+
+if warmup.STARTUP_WARMUP:
+    warmup.start("fitz", get_openai_client, get_container, get_embedding_cache)
@@ -0,0 +1,91 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import telemetry
+
+# Límites de descarga de blobs
+BLOB_CONNECT_TIMEOUT = float(os.environ.get("BLOB_CONNECT_TIMEOUT", "5"))
+BLOB_READ_TIMEOUT = float(os.environ.get("BLOB_READ_TIMEOUT", "30"))
+BLOB_MAX_BYTES = int(os.environ.get("BLOB_MAX_BYTES", str(20 * 1024 * 1024)))
+BLOB_CHUNK_SIZE = 256 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="blob-fetch")
+
+
+class BlobTooLargeError(Exception):
+    pass
+
+
+def get_session():
+    """Sesión HTTP compartida (keep-alive) con reintentos para errores transitorios"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.3,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "HEAD"])
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def download_blob_bytes(url, max_bytes=BLOB_MAX_BYTES):
+    """Descarga un blob por streaming en bloques, abortando si supera max_bytes"""
+    with telemetry.span("blob.download") as span:
+        data = _download(url, max_bytes)
+        span.set(bytes=len(data))
+    return data
+
+
+def _download(url, max_bytes):
+    response = get_session().get(url, stream=True, timeout=(BLOB_CONNECT_TIMEOUT, BLOB_READ_TIMEOUT))
+    with response:
+        response.raise_for_status()
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > max_bytes:
+            raise BlobTooLargeError(f"Blob de {declared} bytes supera el límite de {max_bytes}")
+
+        blocks = []
+        size = 0
+        for block in response.iter_content(chunk_size=BLOB_CHUNK_SIZE):
+            size += len(block)
+            if size > max_bytes:
+                raise BlobTooLargeError(f"Blob supera el límite de {max_bytes} bytes")
+            blocks.append(block)
+    logging.info(f"Blob descargado: {size} bytes")
+    return b"".join(blocks)
+
+
+def blob_etag(url):
+    """ETag actual del blob (petición HEAD, sin descargar el contenido)"""
+    with telemetry.span("blob.head"):
+        response = get_session().head(url, timeout=(BLOB_CONNECT_TIMEOUT, BLOB_READ_TIMEOUT))
+    response.raise_for_status()
+    return response.headers.get("ETag", "").strip('"')
+
+
+def download_blob_text(url, max_bytes=BLOB_MAX_BYTES, encoding="utf-8"):
+    return download_blob_bytes(url, max_bytes).decode(encoding, errors="replace")
+
+
+def fetch_concurrently(*calls):
+    """Ejecuta varias descargas (func, *args) en paralelo y devuelve sus resultados en orden"""
+    # Cada tarea hereda el contexto (span activo) de quien la lanza
+    futures = [_executor.submit(contextvars.copy_context().run, *call) for call in calls]
+    return [future.result() for future in futures]
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from .embedding_codec import decode_embedding, encode_embedding
+
+# Configuración de la caché de embeddings
+CACHE_BACKEND = os.environ.get("EMBEDDING_CACHE_BACKEND", "memory")  # memory | sqlite | cosmos | none
+CACHE_MAX_ITEMS = int(os.environ.get("EMBEDDING_CACHE_MAX_ITEMS", "2048"))
+CACHE_SQLITE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "/tmp/genesis-embeddings.sqlite")
+CACHE_COSMOS_CONTAINER = os.environ.get("EMBEDDING_CACHE_CONTAINER", "embedding-cache")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normaliza el texto para que variaciones de espacios o Unicode compartan entrada"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text, deployment):
+    digest = hashlib.sha256()
+    digest.update(deployment.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MemoryBackend:
+    """LRU en memoria del proceso"""
+
+    def __init__(self, max_items=CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is not None:
+                self._items.move_to_end(key)
+            return vector
+
+    def set(self, key, vector):
+        with self._lock:
+            self._items[key] = vector
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+class SQLiteBackend:
+    """Almacén local en disco (sobrevive a reinicios del worker en el mismo host)"""
+
+    def __init__(self, path=CACHE_SQLITE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, created REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def set(self, key, vector):
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)",
+                (key, blob, time.time())
+            )
+            self._conn.commit()
+
+
+class CosmosBackend:
+    """Caché compartida entre instancias en un contenedor de Cosmos DB (partición /id)"""
+
+    def __init__(self, database, container_name=CACHE_COSMOS_CONTAINER):
+        from azure.cosmos import PartitionKey
+        self._container = database.create_container_if_not_exists(
+            id=container_name, partition_key=PartitionKey(path="/id")
+        )
+
+    def get(self, key):
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+        try:
+            item = self._container.read_item(key, partition_key=key)
+        except CosmosResourceNotFoundError:
+            return None
+        # decode_embedding también acepta las entradas antiguas guardadas como lista de floats
+        return decode_embedding(item["embedding"]).tolist()
+
+    def set(self, key, vector):
+        self._container.upsert_item({"id": key, "embedding": encode_embedding(vector)})
+
+
+class EmbeddingCache:
+    """Caché direccionada por contenido: hash(texto normalizado + deployment) -> embedding.
+
+    Se puede encadenar una caché en memoria delante de un backend persistente.
+    """
+
+    def __init__(self, deployment, backend, front=None):
+        self.deployment = deployment
+        self.backend = backend
+        self.front = front
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, text):
+        key = cache_key(text, self.deployment)
+        vector = self.front.get(key) if self.front is not None else None
+        if vector is None:
+            try:
+                vector = self.backend.get(key)
+            except Exception as e:
+                logging.warning(f"Error leyendo la caché de embeddings: {e}")
+                vector = None
+            if vector is not None and self.front is not None:
+                self.front.set(key, vector)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return vector
+
+    def set(self, text, vector):
+        key = cache_key(text, self.deployment)
+        if self.front is not None:
+            self.front.set(key, vector)
+        try:
+            self.backend.set(key, vector)
+        except Exception as e:
+            logging.warning(f"Error escribiendo en la caché de embeddings: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def create_embedding_cache(deployment, get_database=None, backend_name=CACHE_BACKEND):
+    """Construye la caché según EMBEDDING_CACHE_BACKEND (None si está desactivada).
+
+    get_database solo se llama con el backend 'cosmos': los demás no necesitan cliente de Cosmos.
+    """
+    if backend_name == "none":
+        return None
+    if backend_name == "memory":
+        return EmbeddingCache(deployment, MemoryBackend())
+    if backend_name == "sqlite":
+        return EmbeddingCache(deployment, SQLiteBackend(), front=MemoryBackend())
+    if backend_name == "cosmos":
+        if get_database is None:
+            raise ValueError("El backend 'cosmos' necesita el cliente de base de datos")
+        return EmbeddingCache(deployment, CosmosBackend(get_database()), front=MemoryBackend())
+    raise ValueError(f"Backend de caché de embeddings desconocido: {backend_name}")
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Procesamiento idempotente de eventos de EventGrid (entrega "al menos una vez").
+# Cada versión de un blob (URL + ETag) tiene un registro ingest-{clave} en Cosmos con su estado;
+# el primero que lo crea procesa el blob y el resto de entregas terminan sin hacer nada.
+INGEST_LEASE_SECONDS = int(os.environ.get("INGEST_LEASE_SECONDS", "600"))
+INGEST_RECORD_TTL_SECONDS = int(os.environ.get("INGEST_RECORD_TTL_SECONDS", str(30 * 24 * 3600)))
+
+STATE_PROCESSING = "processing"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def ingest_key(blob_url, etag):
+    base_url = blob_url.split("?", 1)[0]
+    etag = (etag or "").strip('"')
+    if not etag:
+        raise ValueError(f"Se necesita el ETag para la clave de idempotencia de {base_url}")
+    return hashlib.sha256(f"{base_url}|{etag}".encode("utf-8")).hexdigest()[:32]
+
+
+@contextmanager
+def collapse(key):
+    """Agrupa entregas simultáneas de la misma versión en este proceso: solo la primera obtiene True"""
+    with _inflight_lock:
+        owner = key not in _inflight
+        _inflight.add(key)
+    try:
+        yield owner
+    finally:
+        if owner:
+            with _inflight_lock:
+                _inflight.discard(key)
+
+
+def _record(key, blob_url, etag, job_id, now):
+    return {
+        "id": f"ingest-{key}",
+        "type": "ingest",
+        "blob_url": blob_url.split("?", 1)[0],
+        "etag": etag,
+        "job_id": job_id,
+        "state": STATE_PROCESSING,
+        "lease_until": now + INGEST_LEASE_SECONDS,
+        "attempts": 1,
+        "updated": now,
+        "ttl": INGEST_RECORD_TTL_SECONDS  # solo aplica si el contenedor tiene TTL habilitado
+    }
+
+
+def claim(container, key, blob_url, etag, job_id):
+    """Reclama el procesamiento de esta versión del blob.
+
+    Devuelve el registro si hay que procesarla, o None si ya está hecha o la está procesando
+    otra instancia con el lease vigente. Un intento fallido o con el lease caducado se retoma.
+    """
+    # Importación diferida del SDK de Cosmos (arranque en frío)
+    from azure.core import MatchConditions
+    from azure.cosmos.exceptions import (
+        CosmosAccessConditionFailedError,
+        CosmosResourceExistsError,
+        CosmosResourceNotFoundError,
+    )
+    now = time.time()
+    try:
+        return container.create_item(_record(key, blob_url, etag, job_id, now))
+    except CosmosResourceExistsError:
+        pass
+
+    try:
+        existing = container.read_item(f"ingest-{key}", partition_key=f"ingest-{key}")
+    except CosmosResourceNotFoundError:
+        return claim(container, key, blob_url, etag, job_id)
+
+    if existing["state"] == STATE_DONE:
+        logging.info(f"Evento duplicado: {existing['blob_url']} ({etag}) ya procesado")
+        return None
+    if existing["state"] == STATE_PROCESSING and existing["lease_until"] > now:
+        logging.info(f"Evento duplicado: {existing['blob_url']} ({etag}) en proceso en otra instancia")
+        return None
+
+    # Retomar: reemplazo condicionado al _etag leído para que solo gane una instancia
+    record = _record(key, blob_url, etag, job_id, now)
+    record["attempts"] = existing.get("attempts", 1) + 1
+    try:
+        return container.replace_item(
+            existing["id"], record, etag=existing["_etag"], match_condition=MatchConditions.IfNotModified
+        )
+    except CosmosAccessConditionFailedError:
+        logging.info(f"Otra instancia retomó {existing['blob_url']} ({etag})")
+        return None
+
+
+def _finish(container, record, state, error=None):
+    document = {k: v for k, v in record.items() if not k.startswith("_")}
+    document.update({"state": state, "updated": time.time(), "lease_until": 0})
+    if error is not None:
+        document["error"] = error
+    try:
+        container.upsert_item(document)
+    except Exception as e:
+        logging.warning(f"No se pudo marcar {document['id']} como {state}: {e}")
+
+
+def complete(container, record):
+    _finish(container, record, STATE_DONE)
+
+
+def fail(container, record, error):
+    _finish(container, record, STATE_FAILED, error)
@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+# Nivel superior de la app (no dentro del paquete): los procesos del pool no importan GenerateEmbeddings
+from pdf_pages import extract_range as _extract_range
+
+# Presupuestos de extracción
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "50"))
+PDF_MAX_CHARS = int(os.environ.get("PDF_MAX_CHARS", "200000"))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class ExtractionResult:
+    text: str
+    page_offsets: list = field(default_factory=list)  # (inicio, fin) de cada página dentro de text
+    pages_total: int = 0
+    pages_read: int = 0
+    truncated: bool = False
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: el worker de Functions tiene varios hilos y fork copiaría sus locks en cualquier estado
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _extract_parallel(pdf_bytes, pages_to_read, max_chars):
+    workers = max(1, min(PDF_WORKERS, pages_to_read))
+    step = -(-pages_to_read // workers)
+    ranges = [(start, min(start + step, pages_to_read)) for start in range(0, pages_to_read, step)]
+    pool = _get_pool()
+    futures = [pool.submit(_extract_range, pdf_bytes, start, stop, max_chars) for start, stop in ranges]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def extract_pdf(pdf_bytes, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS):
+    """Extrae el texto de un PDF respetando los límites de páginas y caracteres.
+
+    Los documentos grandes se reparten por rangos de páginas entre un pool de procesos.
+    """
+    import fitz
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pages_total = doc.page_count
+    pages_to_read = min(pages_total, max_pages)
+
+    pages = None
+    if pages_to_read >= PDF_PARALLEL_MIN_PAGES and PDF_WORKERS > 1:
+        try:
+            pages = _extract_parallel(pdf_bytes, pages_to_read, max_chars)
+        except Exception as e:
+            logging.warning(f"Extracción paralela fallida, se extrae en serie: {e}")
+    if pages is None:
+        pages = _extract_range(pdf_bytes, 0, pages_to_read, max_chars)
+
+    # Aplicar el presupuesto global de caracteres y calcular desplazamientos por página
+    kept = []
+    offsets = []
+    position = 0
+    for page_text in pages:
+        if position >= max_chars:
+            break
+        page_text = page_text[:max_chars - position]
+        kept.append(page_text)
+        offsets.append((position, position + len(page_text)))
+        position += len(page_text)
+
+    truncated = pages_total > max_pages or len(kept) < pages_to_read or sum(len(p) for p in pages) > position
+    if truncated:
+        logging.warning(f"PDF truncado: {len(kept)}/{pages_total} páginas, {position} caracteres")
+
+    return ExtractionResult(
+        text="".join(kept),
+        page_offsets=offsets,
+        pages_total=pages_total,
+        pages_read=len(kept),
+        truncated=truncated
+    )
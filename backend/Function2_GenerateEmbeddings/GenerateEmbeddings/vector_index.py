@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from .embedding_codec import decode_embedding
+
+# Índice vectorial en memoria (IVF sobre una matriz NumPy) para emparejar CVs y ofertas
+INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", "/tmp/genesis-index")
+IVF_MIN_TRAIN = int(os.environ.get("VECTOR_INDEX_IVF_MIN", "2048"))
+IVF_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", "8"))
+SYNC_INTERVAL = float(os.environ.get("VECTOR_INDEX_SYNC_SECONDS", "30"))
+
+DOC_TYPES = ("cv", "joboffer")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class VectorIndex:
+    """Índice de similitud coseno con búsqueda exacta y, a partir de IVF_MIN_TRAIN vectores, IVF.
+
+    Las filas se añaden de forma incremental; el IVF se reentrena en un hilo en segundo plano
+    cuando el índice duplica el tamaño con el que se entrenó (add nunca espera al k-means).
+    """
+
+    def __init__(self, dim=None):
+        self.dim = dim
+        self.ids = []
+        self.watermark = 0  # mayor _ts de Cosmos incorporado
+        self._rows = {}
+        self._matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._centroids = None
+        self._lists = []
+        self._assignments = []
+        self._trained_size = 0
+        self._training = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _ensure_capacity(self, rows):
+        if rows <= self._matrix.shape[0]:
+            return
+        capacity = max(rows, 2 * self._matrix.shape[0], 64)
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:len(self.ids)] = self._matrix[:len(self.ids)]
+        self._matrix = grown
+
+    def add(self, item_id, vector, ts=None):
+        vector = _normalize(vector)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vector.shape[0]
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            if vector.shape[0] != self.dim:
+                raise ValueError(f"Dimensión {vector.shape[0]} distinta de la del índice ({self.dim})")
+
+            row = self._rows.get(item_id)
+            if row is None:
+                row = len(self.ids)
+                self._ensure_capacity(row + 1)
+                self.ids.append(item_id)
+                self._rows[item_id] = row
+                self._assignments.append(-1)
+            self._matrix[row] = vector
+            if ts is not None:
+                self.watermark = max(self.watermark, ts)
+
+            if self._centroids is not None:
+                self._assign(row)
+            if self._training is None and len(self.ids) >= IVF_MIN_TRAIN and len(self.ids) >= 2 * self._trained_size:
+                self._training = threading.Thread(target=self._train_background, name="genesis-ivf-train", daemon=True)
+                self._training.start()
+
+    def _train_background(self):
+        try:
+            self.train()
+        except Exception as e:
+            logging.warning(f"No se pudo reentrenar el índice IVF: {e}")
+        finally:
+            with self._lock:
+                self._training = None
+
+    def _assign(self, row):
+        previous = self._assignments[row]
+        if previous >= 0:
+            self._lists[previous].remove(row)
+        cluster = int(np.argmax(self._centroids @ self._matrix[row]))
+        self._lists[cluster].append(row)
+        self._assignments[row] = cluster
+
+    def train(self, nlist=None, iterations=10, seed=0):
+        """k-means esférico sobre los vectores actuales para construir las listas invertidas.
+
+        Se entrena sobre una copia sin retener el lock; solo la asignación final lo bloquea.
+        """
+        with self._lock:
+            size = len(self.ids)
+            data = self._matrix[:size].copy()
+        nlist = nlist or max(1, int(np.sqrt(size)))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(size, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = data[labels == cluster]
+                if len(members):
+                    centroids[cluster] = _normalize(members.mean(axis=0))
+
+        with self._lock:
+            # Incluye las filas añadidas o actualizadas mientras se entrenaba
+            labels = np.argmax(self._matrix[:len(self.ids)] @ centroids.T, axis=1)
+            self._centroids = centroids
+            self._lists = [[] for _ in range(nlist)]
+            for row, cluster in enumerate(labels):
+                self._lists[cluster].append(row)
+            self._assignments = labels.tolist()
+            self._trained_size = size
+        logging.info(f"Índice IVF entrenado: {size} vectores, {nlist} listas")
+
+    def search(self, vector, k=10, exclude=(), nprobe=IVF_NPROBE):
+        """Devuelve [(id, score)] de los k vectores más similares"""
+        query = _normalize(vector)
+        with self._lock:
+            size = len(self.ids)
+            if size == 0:
+                return []
+            if self._centroids is None:
+                candidates = None
+                scores = self._matrix[:size] @ query
+            else:
+                probe = np.argsort(self._centroids @ query)[::-1][:nprobe]
+                candidates = np.fromiter(
+                    (row for cluster in probe for row in self._lists[cluster]), dtype=np.int64
+                )
+                scores = self._matrix[candidates] @ query
+            ids = self.ids
+
+        wanted = min(len(scores), k + len(exclude))
+        if wanted == 0:
+            return []
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for position in top:
+            row = int(position if candidates is None else candidates[position])
+            if ids[row] in exclude:
+                continue
+            results.append((ids[row], float(scores[position])))
+            if len(results) == k:
+                break
+        return results
+
+    def save(self, path):
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            tmp = os.path.join(path, "index.tmp.npz")
+            np.savez(
+                tmp,
+                matrix=self._matrix[:len(self.ids)],
+                centroids=self._centroids if self._centroids is not None else np.zeros((0, 0), np.float32)
+            )
+            os.replace(tmp, os.path.join(path, "index.npz"))
+            meta_tmp = os.path.join(path, "meta.tmp.json")
+            with open(meta_tmp, "w") as f:
+                json.dump({"ids": self.ids, "watermark": self.watermark, "trained_size": self._trained_size}, f)
+            os.replace(meta_tmp, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(path, "index.npz"))
+        matrix = arrays["matrix"]
+        index = cls(dim=matrix.shape[1] if matrix.size else None)
+        index.ids = meta["ids"]
+        index.watermark = meta["watermark"]
+        index._rows = {item_id: row for row, item_id in enumerate(index.ids)}
+        index._matrix = np.array(matrix, dtype=np.float32)
+        index._assignments = [-1] * len(index.ids)
+        if arrays["centroids"].size:
+            index._centroids = arrays["centroids"]
+            index._lists = [[] for _ in range(len(index._centroids))]
+            index._trained_size = meta["trained_size"]
+            labels = np.argmax(index._matrix @ index._centroids.T, axis=1)
+            for row, cluster in enumerate(labels):
+                index._lists[cluster].append(row)
+            index._assignments = labels.tolist()
+        return index
+
+    def sync(self, container, doc_type):
+        """Incorpora los documentos de Cosmos con _ts >= watermark (incremental)"""
+        items = container.query_items(
+            query="SELECT c.id, c.embedding, c._ts FROM c WHERE c.type = @type AND c._ts >= @since",
+            parameters=[{"name": "@type", "value": doc_type}, {"name": "@since", "value": self.watermark}],
+            enable_cross_partition_query=True
+        )
+        added = 0
+        for item in items:
+            self.add(item["id"], decode_embedding(item["embedding"]), ts=item["_ts"])
+            added += 1
+        return added
+
+
+class _ManagedIndex:
+    def __init__(self, doc_type):
+        self.doc_type = doc_type
+        self.path = os.path.join(INDEX_DIR, doc_type)
+        self.last_sync = 0.0
+        try:
+            self.index = VectorIndex.load(self.path)
+            logging.info(f"Índice {doc_type} cargado de disco: {len(self.index)} vectores")
+        except FileNotFoundError:
+            self.index = VectorIndex()
+
+
+def get_index(doc_type, container=None):
+    """Índice del proceso para un tipo de documento, sincronizado con Cosmos cada SYNC_INTERVAL"""
+    if doc_type not in DOC_TYPES:
+        raise ValueError(f"Tipo de documento no indexado: {doc_type}")
+    with _indexes_lock:
+        managed = _indexes.get(doc_type)
+        if managed is None:
+            managed = _indexes[doc_type] = _ManagedIndex(doc_type)
+
+    if container is not None and time.monotonic() - managed.last_sync > SYNC_INTERVAL:
+        added = managed.index.sync(container, doc_type)
+        managed.last_sync = time.monotonic()
+        if added:
+            managed.index.save(managed.path)
+            logging.info(f"Índice {doc_type} sincronizado: {added} documentos nuevos o actualizados")
+    return managed.index
+
+
+def index_document(item_id, doc_type, vector):
+    """Actualiza el índice del proceso (si ya está cargado) tras insertar un documento"""
+    managed = _indexes.get(doc_type)
+    if managed is not None:
+        managed.index.add(item_id, vector)
@@ -0,0 +1,94 @@
+import logging
+import json
+import azure.functions as func
+from ..GenerateEmbeddings import get_container
+from ..GenerateEmbeddings.embedding_codec import decode_embedding
+from ..GenerateEmbeddings.vector_index import get_index
+
+MAX_K = 100
+
+# Para un CV se buscan ofertas y viceversa
+TARGET_TYPE = {"cv": "joboffer", "joboffer": "cv"}
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    cors_headers = {
+        "Access-Control-Allow-Origin": "https://red-sand-04619bc10.6.azurestaticapps.net",
+        "Access-Control-Allow-Methods": "POST, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, Ocp-Apim-Subscription-Key",
+        "Access-Control-Max-Age": "86400"
+    }
+
+    if req.method == "OPTIONS":
+        return func.HttpResponse("", status_code=200, headers=cors_headers)
+
+    try:
+        request_json = req.get_json()
+        job_id = request_json.get("jobId")
+        source = request_json.get("source", "cv")
+        k = request_json.get("k", 10)
+    except Exception as e:
+        logging.error(f"Error procesando request: {e}")
+        return func.HttpResponse(
+            json.dumps({"error": "Request inválido"}),
+            status_code=400,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
+
+    # bool es subclase de int: {"k": true} no es un k válido
+    if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+        return func.HttpResponse(
+            json.dumps({"error": f"k debe ser un entero entre 1 y {MAX_K}"}),
+            status_code=400,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
+    k = min(k, MAX_K)
+
+    if not job_id or source not in TARGET_TYPE:
+        return func.HttpResponse(
+            json.dumps({"error": "Se requiere jobId y source ('cv' o 'joboffer')"}),
+            status_code=400,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
+
+    try:
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+        item_id = f"{job_id}-{source}"
+        container = get_container()
+        try:
+            item = container.read_item(item_id, partition_key=item_id)
+        except CosmosResourceNotFoundError:
+            return func.HttpResponse(
+                json.dumps({"error": f"No existe el documento {item_id}"}),
+                status_code=404,
+                headers=cors_headers,
+                mimetype="application/json"
+            )
+
+        target = TARGET_TYPE[source]
+        index = get_index(target, container)
+        matches = index.search(decode_embedding(item["embedding"]), k=k)
+        logging.info(f"Top-{k} {target} para {item_id}: {len(matches)} resultados de {len(index)}")
+
+        return func.HttpResponse(
+            json.dumps({
+                "matches": [
+                    {"jobId": match_id.rsplit("-", 1)[0], "type": target, "score": score}
+                    for match_id, score in matches
+                ]
+            }),
+            status_code=200,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
+
+    except Exception as e:
+        logging.error(f"Error en MatchDocuments: {e}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
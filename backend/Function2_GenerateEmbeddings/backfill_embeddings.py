@@ -0,0 +1,236 @@
+"""Re-embebido masivo de los CVs y ofertas ya subidos (upload/cv/* y upload/joboffer/*).
+
+Uso (desde backend/Function2_GenerateEmbeddings, con las mismas variables de entorno que la función):
+    python backfill_embeddings.py --dry-run --sample 20
+    python backfill_embeddings.py --concurrency 4 --batch-jobs 8
+
+Reutiliza la extracción, el troceado/embebido por lotes e insert_into_cosmos de GenerateEmbeddings.
+Cada job procesado se anota en un fichero de checkpoint (JSONL); al relanzar se omiten los jobs cuyos
+blobs no han cambiado (mismo ETag), así que el proceso puede interrumpirse y reanudarse.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+
+from azure.storage.blob import ContainerClient
+
+import GenerateEmbeddings as ge
+from GenerateEmbeddings.blob_fetch import download_blob_bytes, download_blob_text
+from GenerateEmbeddings.chunking import chunk_text
+from GenerateEmbeddings.embedding_codec import EMBEDDING_STORAGE_FORMAT
+
+CONTAINER = "upload"
+
+
+@dataclass
+class Job:
+    job_id: str
+    cv_blob: Optional[str] = None
+    cv_etag: Optional[str] = None
+    cv_modified: Optional[object] = None
+    offer_blob: Optional[str] = None
+    offer_etag: Optional[str] = None
+
+    @property
+    def version(self):
+        return f"{self.cv_etag}|{self.offer_etag}"
+
+
+def container_client():
+    url = f"https://{ge.STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER}?{ge.STORAGE_SAS_TOKEN}"
+    return ContainerClient.from_container_url(url)
+
+
+def list_jobs(limit=None):
+    """Agrupa los blobs por job_id: cv/cv-{job_id}-*.pdf y joboffer/jobOffer-{job_id}.txt"""
+    client = container_client()
+    jobs = {}
+    for blob in client.list_blobs(name_starts_with="cv/"):
+        parts = blob.name.split("/")[-1].split("-")
+        if len(parts) < 2:
+            continue
+        job = jobs.setdefault(parts[1], Job(parts[1]))
+        # Si hay varios CVs para el mismo job se usa el más reciente
+        if job.cv_blob is None or blob.last_modified > job.cv_modified:
+            job.cv_blob, job.cv_etag, job.cv_modified = blob.name, blob.etag, blob.last_modified
+    for blob in client.list_blobs(name_starts_with="joboffer/"):
+        name = blob.name.split("/")[-1]
+        if not name.startswith("jobOffer-") or not name.endswith(".txt"):
+            continue
+        job_id = name[len("jobOffer-"):-len(".txt")]
+        job = jobs.setdefault(job_id, Job(job_id))
+        job.offer_blob, job.offer_etag = blob.name, blob.etag
+    ordered = sorted(jobs.values(), key=lambda j: j.job_id)
+    return ordered[:limit] if limit else ordered
+
+
+class Checkpoint:
+    """Fichero JSONL con una línea por job terminado; la última línea de cada job manda"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # línea truncada por una interrupción
+                    if entry["status"] == "done":
+                        self.done[entry["job_id"]] = entry["version"]
+                    else:
+                        self.done.pop(entry["job_id"], None)
+
+    def is_done(self, job):
+        return self.done.get(job.job_id) == job.version
+
+    def record(self, job, status, error=None):
+        entry = {"job_id": job.job_id, "version": job.version, "status": status, "time": time.time()}
+        if error:
+            entry["error"] = error
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+
+
+def blob_url(name):
+    return ge.with_sas(f"https://{ge.STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER}/{name}")
+
+
+def fetch_job(job):
+    """[(doc_type, texto)] del job descargando y extrayendo sus blobs"""
+    documents = []
+    if job.cv_blob:
+        documents.append(("cv", ge.extract_text_from_pdf_bytes(download_blob_bytes(blob_url(job.cv_blob)))))
+    if job.offer_blob:
+        documents.append(("joboffer", download_blob_text(blob_url(job.offer_blob))))
+    return documents
+
+
+def store_job(job, documents, embedded):
+    sources = {"cv": (job.cv_blob, job.cv_etag), "joboffer": (job.offer_blob, job.offer_etag)}
+    for (doc_type, text), (embedding, chunks) in zip(documents, embedded):
+        name, etag = sources[doc_type]
+        source = {"url": f"https://{ge.STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER}/{name}",
+                  "etag": etag.strip('"')}
+        ge.insert_into_cosmos(job.job_id, text, embedding, doc_type, chunks, source=source)
+    if job.cv_blob and job.offer_blob:
+        ge.publish_status(job.job_id, "ready")
+
+
+def process_batch(jobs, checkpoint):
+    """Descarga los jobs del lote, los embebe en un único embed_documents y los guarda"""
+    fetched = []
+    for job in jobs:
+        try:
+            fetched.append((job, fetch_job(job)))
+        except Exception as e:
+            logging.error(f"❌ {job.job_id}: error descargando/extrayendo: {e}")
+            checkpoint.record(job, "failed", str(e))
+
+    texts = [text for _, documents in fetched for _, text in documents]
+    try:
+        embedded = ge.embed_documents(texts) if texts else []
+    except Exception as e:
+        # Un documento problemático no debe tumbar el lote: se reintenta job a job
+        logging.warning(f"Lote fallido ({e}), reintentando job a job")
+        return sum(_process_single(job, documents, checkpoint) for job, documents in fetched)
+
+    processed, offset = 0, 0
+    for job, documents in fetched:
+        results = embedded[offset:offset + len(documents)]
+        offset += len(documents)
+        try:
+            store_job(job, documents, results)
+            checkpoint.record(job, "done")
+            processed += 1
+        except Exception as e:
+            logging.error(f"❌ {job.job_id}: error guardando en Cosmos: {e}")
+            checkpoint.record(job, "failed", str(e))
+    return processed
+
+
+def _process_single(job, documents, checkpoint):
+    try:
+        store_job(job, documents, ge.embed_documents([text for _, text in documents]))
+        checkpoint.record(job, "done")
+        return 1
+    except Exception as e:
+        logging.error(f"❌ {job.job_id}: {e}")
+        checkpoint.record(job, "failed", str(e))
+        return 0
+
+
+def run(jobs, checkpoint, concurrency, batch_jobs):
+    pending = [job for job in jobs if not checkpoint.is_done(job)]
+    print(f"📋 {len(jobs)} jobs, {len(jobs) - len(pending)} ya completados, {len(pending)} pendientes")
+    batches = [pending[i:i + batch_jobs] for i in range(0, len(pending), batch_jobs)]
+
+    start = time.perf_counter()
+    processed = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="backfill") as executor:
+        futures = [executor.submit(process_batch, batch, checkpoint) for batch in batches]
+        for done, future in enumerate(as_completed(futures), 1):
+            processed += future.result()
+            elapsed = time.perf_counter() - start
+            print(f"⏳ Lotes {done}/{len(batches)} · {processed} jobs · {processed / elapsed:.2f} jobs/s")
+    if ge.get_embedding_cache():
+        print(f"Caché de embeddings: {ge.get_embedding_cache().stats()}")
+    print(f"✅ {processed}/{len(pending)} jobs re-embebidos en {time.perf_counter() - start:.1f}s")
+
+
+def dry_run(jobs, sample, concurrency, tpm):
+    """Descarga y trocea una muestra (sin llamar a OpenAI ni escribir en Cosmos) y extrapola"""
+    sampled = jobs[:sample]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        fetched = list(executor.map(fetch_job, sampled))
+    fetch_seconds = time.perf_counter() - start
+
+    documents = [text for docs in fetched for _, text in docs]
+    chunks = [chunk for text in documents for chunk in chunk_text(text)]
+    tokens = sum(chunk.tokens for chunk in chunks)
+    calls = -(-len(chunks) // ge.EMBEDDING_BATCH_SIZE)
+
+    scale = len(jobs) / max(len(sampled), 1)
+    total_tokens = tokens * scale
+    fetch_estimate = fetch_seconds * scale
+    embed_estimate = total_tokens / tpm * 60
+    print(f"🔎 Muestra: {len(sampled)} jobs, {len(documents)} documentos, {len(chunks)} fragmentos, "
+          f"{tokens} tokens, {calls} llamadas de embeddings, descarga+extracción {fetch_seconds:.1f}s")
+    print(f"📈 Estimación para {len(jobs)} jobs: ~{total_tokens:,.0f} tokens, ~{calls * scale:,.0f} llamadas")
+    print(f"   descarga+extracción ≈ {fetch_estimate:.0f}s con concurrencia {concurrency}; "
+          f"embeddings ≈ {embed_estimate:.0f}s a {tpm:,} TPM")
+    print(f"   duración estimada ≈ {max(fetch_estimate, embed_estimate) / 60:.1f} min (sin contar aciertos de caché)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="lotes procesándose a la vez")
+    parser.add_argument("--batch-jobs", type=int, default=8, help="jobs por lote de embed_documents")
+    parser.add_argument("--limit", type=int, help="procesar como máximo N jobs")
+    parser.add_argument("--checkpoint", default=f"backfill-{ge.OPENAI_DEPLOYMENT}-{EMBEDDING_STORAGE_FORMAT}.jsonl")
+    parser.add_argument("--dry-run", action="store_true", help="estimar tiempo y tokens sin escribir nada")
+    parser.add_argument("--sample", type=int, default=20, help="jobs de la muestra en --dry-run")
+    parser.add_argument("--tpm", type=int, default=int(os.environ.get("AZURE_OPENAI_TPM", "120000")),
+                        help="cuota de tokens por minuto del despliegue de embeddings")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    jobs = list_jobs(args.limit)
+    if args.dry_run:
+        dry_run(jobs, args.sample, args.concurrency, args.tpm)
+    else:
+        run(jobs, Checkpoint(args.checkpoint), args.concurrency, args.batch_jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# Función que ejecutan los procesos del pool de extracción de PDFs (GenerateEmbeddings/pdf_extract.py).
+# Es un módulo de nivel superior que solo usa fitz: con el contexto spawn cada proceso importa el módulo
+# de la función que ejecuta, y desde el paquete GenerateEmbeddings eso ejecutaría su __init__
+# (variables de entorno obligatorias, clientes, precarga).
+
+
+def extract_range(pdf_bytes, start, stop, max_chars):
+    """Extrae el texto de las páginas [start, stop) sin superar max_chars"""
+    import fitz  # diferido: PyMuPDF solo se carga al extraer el primer PDF
+    pages = []
+    remaining = max_chars
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for number in range(start, stop):
+            if remaining <= 0:
+                break
+            page_text = doc.load_page(number).get_text()
+            pages.append(page_text[:remaining])
+            remaining -= len(page_text)
+    return pages
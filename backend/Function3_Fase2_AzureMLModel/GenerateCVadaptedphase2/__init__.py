@@ -1,22 +1,55 @@
-import tempfile
-import logging, os, json, time, base64, fitz
-from azure.storage.blob import BlobServiceClient
-from azure.cosmos import CosmosClient
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
-from io import BytesIO
+import logging, os, json, time, base64, asyncio, threading
 from numpy import dot
 from numpy.linalg import norm
-from reportlab.pdfgen import canvas
 import azure.functions as func
-
-# Variables globales
+from . import readiness
+from .model_cache import ModelCache, MODEL_VERSION_CHECK_SECONDS
+from .batching import BatchScheduler
+from .inference_backend import load_seq2seq_model, load_kwargs, backend_key, INFERENCE_BACKEND
+from . import result_cache
+from . import pdf_render
+from . import aio
+from . import context_packing
+from . import adapters
+from . import telemetry
+from . import warmup
+
+# Variables globales. transformers (torch), azure.ai.ml y los SDKs de Azure se importan en el
+# primer uso: un preflight OPTIONS o una respuesta cacheada no deben pagar varios segundos de imports
 _cosmos = None
 _container = None
 _blob_service = None
 _pipe = None
+_pipe_lock = threading.Lock()
 _ml_client = None
+_batcher = None
+_adapter_model = None
+_adapter_lock = threading.Lock()
+_adapter_check = None
+_pending_adapter = None
+_last_version_check = 0.0
+
+MODEL_NAME = os.environ.get("MODEL_NAME", "genesis-model")
+_model_version = None
+
+# Incrementar al cambiar la plantilla del prompt para invalidar los resultados cacheados
+PROMPT_VERSION = "2"
+
+# Presupuesto de tokens de entrada (0 = model_max_length del tokenizer) y fracción reservada a la oferta
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "0"))
+PROMPT_JOB_SHARE = float(os.environ.get("PROMPT_JOB_SHARE", "0.35"))
+
+PROMPT_TEMPLATE = """
+Toma el siguiente CV y adáptalo a la oferta de trabajo proporcionada. El resultado debe ser un CV personalizado que resalte las habilidades y experiencias más relevantes para dicha oferta.
+
+[CV]
+{cv_text}
+
+[OFERTA]
+{job_text}
+
+[CV ADAPTADO]
+"""
 
 def fix_cosmos_key(key):
     key = key.strip()
@@ -29,6 +62,7 @@ def fix_cosmos_key(key):
 def get_cosmos_client():
     global _cosmos, _container
     if _cosmos is None:
+        from azure.cosmos import CosmosClient
         cosmos_key = fix_cosmos_key(os.environ["COSMOS_KEY"])
         _cosmos = CosmosClient(os.environ["COSMOS_URL"], credential=cosmos_key)
         db = _cosmos.get_database_client(os.environ["COSMOS_DB"])
@@ -38,12 +72,15 @@ def get_cosmos_client():
 def get_blob_service():
     global _blob_service
     if _blob_service is None:
+        from azure.storage.blob import BlobServiceClient
         _blob_service = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
     return _blob_service
 
 def get_ml_client():
     global _ml_client
     if _ml_client is None:
+        from azure.ai.ml import MLClient
+        from azure.identity import ManagedIdentityCredential
         try:
             # Try Managed Identity first
             credential = ManagedIdentityCredential()
@@ -77,102 +114,225 @@ def get_ml_client():
 def cosine_sim(a, b):
     return dot(a, b) / (norm(a) * norm(b))
 
-def wait_for_embeddings(job_id, retries=10, delay=3):
-    _, container = get_cosmos_client()
-    for attempt in range(retries):
-        try:
-            cv = container.read_item(f"{job_id}-cv", partition_key=f"{job_id}-cv")
-            job = container.read_item(f"{job_id}-joboffer", partition_key=f"{job_id}-joboffer")
-            return cv["text"], job["text"], cv["embedding"], job["embedding"]
-        except:
-            if attempt < retries - 1:
-                time.sleep(delay)
-            else:
-                raise Exception("Embeddings no disponibles")
-
-def generate_pdf(text):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer)
-    p.setFont("Helvetica", 10)
-
-    width, height = p._pagesize
-    margin = 50
-    line_height = 15
-    max_lines_per_page = int((height - 2 * margin) / line_height)
-
-    lines = []
-    for paragraph in text.split('\n'):
-        while len(paragraph) > 100:
-            lines.append(paragraph[:100])
-            paragraph = paragraph[100:]
-        lines.append(paragraph)
-
-    y = height - margin
-    lines_on_page = 0
-
-    for line in lines:
-        if lines_on_page >= max_lines_per_page or y < margin:
-            p.showPage()
-            p.setFont("Helvetica", 10)
-            y = height - margin
-            lines_on_page = 0
-        p.drawString(margin, y, line)
-        y -= line_height
-        lines_on_page += 1
-
-    p.save()
-    buffer.seek(0)
-    return buffer
-
-
-def upload_pdf(pdf_stream, job_id):
-    blob_service = get_blob_service()
-    blob_name = f"generated/{job_id}.pdf"
-    blob = blob_service.get_blob_client("upload", blob_name)
-    blob.upload_blob(pdf_stream, overwrite=True, content_type="application/pdf")
+def compute_texts_inline(job_id):
+    # El modelo fine-tuneado solo necesita los textos; la similitud queda sin calcular
+    cv_text, job_text = readiness.load_source_texts(get_blob_service(), job_id)
+    return cv_text, job_text, None, None
+
+def blob_url(blob_name):
     account_name = os.environ["STORAGE_ACCOUNT_NAME"]
     sas_token = os.environ["BLOB_SAS_TOKEN"]
     return f"https://{account_name}.blob.core.windows.net/upload/{blob_name}?{sas_token}"
 
+def list_registered_versions():
+    # El cliente de Azure ML solo se crea si hay que consultar versiones o descargar
+    return [m.version for m in get_ml_client().models.list(name=MODEL_NAME)]
+
 def get_latest_registered_model():
+    global _model_version
+    cache = ModelCache(MODEL_NAME)
     try:
-        ml_client = get_ml_client()
-        models = ml_client.models.list(name="genesis-model")
-        latest_model = max(models, key=lambda m: m.version)
-        logging.info(f"✅ Usando modelo registrado: {latest_model.name} v{latest_model.version}")
-
-        # Descargar modelo a una carpeta temporal
-        temp_dir = tempfile.mkdtemp()
-        ml_client.models.download(name=latest_model.name, version=latest_model.version, download_path=temp_dir)
-        logging.info(f"📦 Modelo descargado en: {temp_dir}")
-        return temp_dir
+        version = cache.latest_version(list_registered_versions)
+        logging.info(f"✅ Usando modelo registrado: {MODEL_NAME} v{version}")
+        _model_version = f"{MODEL_NAME}:{version}"
+        cache.pin(version)
+        return cache.get(
+            version,
+            lambda path: get_ml_client().models.download(name=MODEL_NAME, version=version, download_path=path)
+        )
     except Exception as e:
         logging.error(f"Failed to get ML model: {e}")
+        cached = cache.cached_versions()
+        if cached:
+            logging.warning(f"Using cached model version: {cached[-1]}")
+            _model_version = f"{MODEL_NAME}:{cached[-1]}"
+            cache.pin(cached[-1])
+            return cache.path(cached[-1])
         fallback_path = os.environ.get("MODEL_PATH", "google/flan-t5-small")
         logging.warning(f"Using fallback model: {fallback_path}")
+        _model_version = fallback_path
         return fallback_path
 
 
+def expected_model_version():
+    """Versión con la que se servirá la petición sin esperar a que cargue el pipeline (None si no se sabe)"""
+    if _pipe is not None:
+        return _model_version
+    cache = ModelCache(MODEL_NAME)
+    try:
+        return f"{MODEL_NAME}:{cache.latest_version(list_registered_versions)}"
+    except Exception:
+        cached = cache.cached_versions()
+        return f"{MODEL_NAME}:{cached[-1]}" if cached else None
+
+def get_result_key(cv_text, job_text, model_version):
+    return result_cache.result_key(cv_text, job_text, f"{model_version}:{backend_key()}", PROMPT_VERSION)
+
+
+def load_base_model(reference):
+    """Modelo base de un adaptador: de Hugging Face o de una versión registrada (vía ModelCache)"""
+    if INFERENCE_BACKEND != "pytorch":
+        logging.warning(f"Los adaptadores LoRA se sirven con pytorch; se ignora INFERENCE_BACKEND={INFERENCE_BACKEND}")
+    if reference["source"] == "hf":
+        from transformers import AutoModelForSeq2SeqLM
+        return AutoModelForSeq2SeqLM.from_pretrained(reference["name"], **load_kwargs())
+    name, version = reference["name"], reference["version"]
+    cache = ModelCache(name)
+    # Los adaptadores nuevos se descargan en la misma caché: la versión base no debe desalojarse
+    cache.pin(version)
+    path = cache.get(
+        version,
+        lambda target: get_ml_client().models.download(name=name, version=version, download_path=target)
+    )
+    return load_seq2seq_model(os.path.join(path, name, "model"), backend="pytorch")
+
+def get_adapter_model(model_dir):
+    """Aplica el adaptador de model_dir sobre el modelo base (cargado una sola vez por proceso)"""
+    global _adapter_model
+    reference = adapters.base_reference(model_dir)
+    key = adapters.reference_key(reference)
+    if _adapter_model is None or _adapter_model.base_key != key:
+        _adapter_model = adapters.AdapterModel(load_base_model(reference), key)
+    return _adapter_model.activate(model_dir, _model_version)
+
 def get_model_pipeline():
     global _pipe
     if _pipe is None:
+        # Una sola carga por proceso aunque coincidan la precarga y la primera petición
+        with _pipe_lock:
+            if _pipe is None:
+                _pipe = _load_model_pipeline()
+    return _pipe
+
+def _load_model_pipeline():
+    global _model_version, _last_version_check
+    from transformers import pipeline, AutoTokenizer
+    with telemetry.span("model.load") as span:
         try:
             model_path = get_latest_registered_model()
-            model_dir = os.path.join(model_path, "genesis-model", "model")
+            model_dir = os.path.join(model_path, MODEL_NAME, "model")
             logging.info(f"📁 Contenido de {model_dir}: {os.listdir(model_dir)}")
-            logging.info(os.listdir(model_dir))
             tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
-            model = AutoModelForSeq2SeqLM.from_pretrained(model_dir, local_files_only=True)
-            _pipe = pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+            if adapters.is_adapter(model_dir):
+                model = get_adapter_model(model_dir)
+            else:
+                model = load_seq2seq_model(model_dir)
+            pipe = pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+            _last_version_check = time.monotonic()
         except Exception as e:
             logging.error(f"Failed to load custom model: {e}")
             logging.warning("Using fallback public model")
-            _pipe = pipeline("text2text-generation", model="google/flan-t5-small")
-    return _pipe
-
-
-
-def main(req: func.HttpRequest) -> func.HttpResponse:
+            _model_version = "google/flan-t5-small"
+            pipe = pipeline("text2text-generation", model="google/flan-t5-small")
+        span.set(model_version=_model_version, backend=backend_key())
+    return pipe
+
+def check_adapter_update():
+    """Busca una versión nueva y, si es un adaptador del modelo base cargado, la descarga para refresh_adapter.
+
+    Se ejecuta en un hilo propio: los tags del registro permiten descartar modelos completos sin descargarlos.
+    """
+    global _pending_adapter
+    cache = ModelCache(MODEL_NAME)
+    try:
+        version = cache.latest_version(list_registered_versions)
+        model_version = f"{MODEL_NAME}:{version}"
+        if model_version == _model_version:
+            return
+        tags = get_ml_client().models.get(name=MODEL_NAME, version=version).tags or {}
+        if tags.get("artifact") != "lora-adapter" or tags.get("base_model") != _adapter_model.base_key:
+            logging.warning(f"{model_version} no es un adaptador del modelo base cargado; se usará al reiniciar")
+            return
+        path = cache.get(
+            version,
+            lambda target: get_ml_client().models.download(name=MODEL_NAME, version=version, download_path=target)
+        )
+        model_dir = os.path.join(path, MODEL_NAME, "model")
+        if not adapters.is_adapter(model_dir):
+            logging.warning(f"{model_version} está etiquetado como adaptador pero no contiene {adapters.ADAPTER_CONFIG}")
+            return
+        with _adapter_lock:
+            _pending_adapter = (model_dir, model_version)
+    except Exception as e:
+        logging.warning(f"No se pudo comprobar la versión del adaptador: {e}")
+
+def refresh_adapter():
+    """Activa el adaptador nuevo que check_adapter_update dejó descargado, sin recargar el pipeline.
+
+    Se llama desde el hilo del BatchScheduler, entre lotes, para no cambiar el adaptador a mitad de uno;
+    la consulta a Azure ML y la descarga se lanzan en segundo plano para no retrasar la inferencia.
+    """
+    global _model_version, _last_version_check, _adapter_check, _pending_adapter
+    if _adapter_model is None:
+        return
+    with _adapter_lock:
+        pending, _pending_adapter = _pending_adapter, None
+        checking = _adapter_check is not None and _adapter_check.is_alive()
+        if pending is None and not checking and time.monotonic() - _last_version_check >= MODEL_VERSION_CHECK_SECONDS:
+            _last_version_check = time.monotonic()
+            _adapter_check = threading.Thread(target=check_adapter_update, name="genesis-adapter-check", daemon=True)
+            _adapter_check.start()
+    if pending is None:
+        return
+    model_dir, model_version = pending
+    try:
+        _adapter_model.activate(model_dir, model_version)
+        _model_version = model_version
+    except Exception as e:
+        logging.warning(f"No se pudo activar el adaptador {model_version}: {e}")
+
+def build_prompt(pipe, cv_text, job_text):
+    """Prompt que cabe en la ventana del modelo: oferta recortada y secciones del CV más relevantes"""
+    tokenizer = pipe.tokenizer
+    budget = PROMPT_TOKEN_BUDGET or min(tokenizer.model_max_length, 4096)
+
+    def count_tokens(text):
+        return len(tokenizer(text, add_special_tokens=False).input_ids)
+
+    available = budget - count_tokens(PROMPT_TEMPLATE.format(cv_text="", job_text="")) - 2
+    job_text = context_packing.truncate_tokens(job_text, int(available * PROMPT_JOB_SHARE), count_tokens)
+    cv_budget = available - count_tokens(job_text)
+    if count_tokens(cv_text) > cv_budget:
+        # Sin cliente de embeddings en esta app: las secciones se puntúan por solapamiento léxico
+        sections = context_packing.split_sections(cv_text)
+        scores = context_packing.lexical_scores(sections, job_text)
+        packed = context_packing.pack(sections, scores, cv_budget, count_tokens)
+        logging.info(f"Contexto empaquetado: {len(packed)}/{len(cv_text)} caracteres del CV")
+        cv_text = packed
+    telemetry.annotate(budget_tokens=budget, job_tokens=count_tokens(job_text))
+    return PROMPT_TEMPLATE.format(cv_text=cv_text, job_text=job_text)
+
+def run_pipeline_batch(prompts, **options):
+    """Ejecuta un lote de prompts en el pipeline (con padding por lote).
+
+    Devuelve, por prompt, (salida, versión del modelo que la generó): refresh_adapter puede cambiar
+    _model_version en cuanto termina el lote, así que la versión se fija aquí y viaja con cada salida.
+    """
+    pipe = get_model_pipeline()
+    refresh_adapter()
+    model_version = _model_version
+    with telemetry.span("pipeline.batch", batch_size=len(prompts), model_version=model_version):
+        outputs = pipe(prompts, batch_size=len(prompts), **options)
+    return [(output if isinstance(output, list) else [output], model_version) for output in outputs]
+
+def get_batch_scheduler():
+    global _batcher
+    if _batcher is None:
+        _batcher = BatchScheduler(run_pipeline_batch)
+    return _batcher
+
+def discard_tasks(*tasks):
+    """Cancela las tareas que la petición ya no va a esperar y recoge el error de las que fallaron.
+
+    Cancelar no detiene el hilo de to_thread: una carga del modelo en curso termina y queda para la siguiente petición.
+    """
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     cors_headers = {
         "Access-Control-Allow-Origin": "https://red-sand-04619bc10.6.azurestaticapps.net",
         "Access-Control-Allow-Methods": "POST, OPTIONS",
@@ -189,62 +349,97 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         if not job_id:
             raise ValueError("Falta jobId")
 
-        cv_text, job_text, cv_embed, job_embed = wait_for_embeddings(job_id)
-        sim = cosine_sim(cv_embed, job_embed)
-
-        prompt = f"""
-Toma el siguiente CV y adáptalo a la oferta de trabajo proporcionada. El resultado debe ser un CV personalizado que resalte las habilidades y experiencias más relevantes para dicha oferta.
-
-[CV]
-{cv_text}
-
-[OFERTA]
-{job_text}
-
-[CV ADAPTADO]
-"""
-
-        pipe = get_model_pipeline()
-        logging.info(" Pipeline cargado, iniciando inferencia...")
-        result = pipe(prompt, max_length=1024, do_sample=False, truncation=True)
-        logging.info(f" Resultado del modelo: {result}")
-
-        # Extraer solo la parte generada posterior a la etiqueta
-        generated = result[0]["generated_text"]
-
-        # Intentar extraer solo el texto después del separador
-        if "[CV ADAPTADO]" in generated:
-            new_cv = generated.split("[CV ADAPTADO]", 1)[-1].strip()
-        else:
-            prompt_preview = prompt.strip().replace("\n", "").replace(" ", "")
-            generated_preview = generated.strip().replace("\n", "").replace(" ", "")
-            if generated_preview.startswith(prompt_preview[:150]):
-                logging.warning("🔁 El modelo ha repetido el prompt, eliminando encabezado...")
-                new_cv = generated[len(prompt):].strip()
-            else:
-                new_cv = generated.strip()
-
-
-        # Validar que no quedó vacío tras la limpieza
-        if not new_cv.strip():
-            logging.warning("⚠️ La salida está vacía tras limpieza. Usando fallback.")
-            new_cv = "No se pudo generar un CV adaptado. Intenta con otro ejemplo o revisa el modelo."
-
-        logging.info(f"✅ Texto adaptado generado (preview):\n{new_cv[:300]}")
-
-
-        logging.info(f"✅ Texto adaptado generado:\n{new_cv[:300]}")
+        with telemetry.job_trace(job_id, "GenerateCVadaptedphase2") as trace:
+            # La carga del modelo (CPU/disco) se solapa con la espera de los embeddings
+            pipeline_task = asyncio.create_task(asyncio.to_thread(get_model_pipeline))
+            version_task = asyncio.create_task(asyncio.to_thread(expected_model_version))
+            try:
+                with telemetry.span("wait_for_embeddings"):
+                    cv_text, job_text, cv_embed, job_embed = await aio.wait_for_embeddings(job_id, inline=compute_texts_inline)
+                if cv_embed is not None and job_embed is not None:
+                    sim = cosine_sim(cv_embed, job_embed)
+                    logging.info(f"Similaridad calculada: {sim:.2f}")
+
+                # Reutilizar el resultado si ya se generó con las mismas entradas, modelo y prompt.
+                # La versión sale de la caché de modelos: un acierto no espera a que cargue el pipeline
+                model_version = await version_task
+                cache_key = get_result_key(cv_text, job_text, model_version) if model_version else None
+                if request_json.get("refresh"):
+                    if cache_key:
+                        await aio.invalidate_result(cache_key)
+                elif cache_key:
+                    try:
+                        with telemetry.span("result_cache.lookup") as span:
+                            cached_blob, _ = await aio.lookup_result(cache_key, job_id)
+                            span.set(hit=bool(cached_blob))
+                    except Exception as e:
+                        logging.warning(f"Error consultando la caché de resultados: {e}")
+                        cached_blob = None
+                    if cached_blob:
+                        logging.info(f"Resultado servido desde caché para job_id: {job_id}")
+                        trace.set(cached=True)
+                        return func.HttpResponse(
+                            body=json.dumps({"generatedCvUrl": blob_url(cached_blob), "cached": True}),
+                            status_code=200,
+                            mimetype="application/json",
+                            headers=cors_headers
+                        )
+
+                with telemetry.span("model.wait"):
+                    pipe = await pipeline_task
+                with telemetry.span("prompt.build", chars=len(cv_text) + len(job_text)):
+                    prompt = await asyncio.to_thread(build_prompt, pipe, cv_text, job_text)
+                logging.info(" Pipeline cargado, iniciando inferencia...")
+
+                # Incluye la espera en la cola del BatchScheduler; el lote en sí se mide en pipeline.batch
+                with telemetry.span("pipeline.inference") as span:
+                    result, used_version = await asyncio.wrap_future(
+                        get_batch_scheduler().submit(prompt, max_length=1024, do_sample=False, truncation=True)
+                    )
+                    span.set(output_chars=len(result[0]["generated_text"]))
+                logging.info(f" Resultado del modelo: {result}")
+
+                # Extraer solo la parte generada posterior a la etiqueta
+                generated = result[0]["generated_text"]
+
+                # Intentar extraer solo el texto después del separador
+                if "[CV ADAPTADO]" in generated:
+                    new_cv = generated.split("[CV ADAPTADO]", 1)[-1].strip()
+                else:
+                    prompt_preview = prompt.strip().replace("\n", "").replace(" ", "")
+                    generated_preview = generated.strip().replace("\n", "").replace(" ", "")
+                    if generated_preview.startswith(prompt_preview[:150]):
+                        logging.warning("🔁 El modelo ha repetido el prompt, eliminando encabezado...")
+                        new_cv = generated[len(prompt):].strip()
+                    else:
+                        new_cv = generated.strip()
+
+
+                # Validar que no quedó vacío tras la limpieza
+                if not new_cv.strip():
+                    logging.warning("⚠️ La salida está vacía tras limpieza. Usando fallback.")
+                    new_cv = "No se pudo generar un CV adaptado. Intenta con otro ejemplo o revisa el modelo."
+
+                logging.info(f"✅ Texto adaptado generado (preview):\n{new_cv[:300]}")
+
+
+                logging.info(f"✅ Texto adaptado generado:\n{new_cv[:300]}")
         
-        pdf = generate_pdf(new_cv)
-        url = upload_pdf(pdf, job_id)
+                blob_name = await aio.render_and_upload_pdf(new_cv, job_id)
+                # La entrada de caché solo se escribe cuando el PDF ya está subido, con la versión que lo generó
+                await aio.store_result(get_result_key(cv_text, job_text, used_version), job_id, new_cv)
+                url = blob_url(blob_name)
+                logging.info(f"Telemetría: {telemetry.stats()}")
         
 
-        return func.HttpResponse(
-            body=json.dumps({"generatedCvUrl": url}),
-            status_code=200,
-            mimetype="application/json",
-            headers=cors_headers
-        )
+                return func.HttpResponse(
+                    body=json.dumps({"generatedCvUrl": url}),
+                    status_code=200,
+                    mimetype="application/json",
+                    headers=cors_headers
+                )
+            finally:
+                discard_tasks(pipeline_task, version_task)
 
     except Exception as e:
         logging.error(f"Error Function 3: {e}")
@@ -253,4 +448,9 @@ Toma el siguiente CV y adáptalo a la oferta de trabajo proporcionada. El result
             status_code=500,
             headers=cors_headers,
             mimetype="application/json"
-        )
\ No newline at end of file
+        )
+
+if warmup.STARTUP_WARMUP:
+    # El modelo (lo más lento del arranque) se carga mientras llega la primera petición
+    warmup.start(get_cosmos_client, get_blob_service, "azure.cosmos.aio", "azure.storage.blob.aio",
+                 get_model_pipeline, pdf_render.get_page_template, "reportlab.pdfgen.canvas")
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import threading
+
+# Versiones registradas como adaptador LoRA (TRAINING_MODE=lora): el modelo base se carga una vez
+# por proceso y los adaptadores se aplican o intercambian sobre él sin recargarlo.
+ADAPTER_CONFIG = "adapter_config.json"
+BASE_MODEL_FILE = "base_model.json"
+ADAPTER_KEEP = int(os.environ.get("ADAPTER_KEEP", "2"))
+
+
+def is_adapter(model_dir):
+    return os.path.isfile(os.path.join(model_dir, ADAPTER_CONFIG))
+
+
+def base_reference(model_dir):
+    """Referencia al modelo base ({"source": "hf"|"azureml", "name", ["version"]})"""
+    path = os.path.join(model_dir, BASE_MODEL_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    with open(os.path.join(model_dir, ADAPTER_CONFIG)) as f:
+        return {"source": "hf", "name": json.load(f)["base_model_name_or_path"]}
+
+
+def reference_key(reference):
+    return ":".join(str(reference[k]) for k in ("source", "name", "version") if k in reference)
+
+
+def _adapter_name(version):
+    # PEFT usa el nombre del adaptador como nombre de módulo: sin puntos ni dos puntos
+    return "v_" + "".join(c if c.isalnum() else "_" for c in str(version))
+
+
+class AdapterModel:
+    """Modelo base en memoria con adaptadores intercambiables"""
+
+    def __init__(self, base_model, base_key):
+        self.base_model = base_model
+        self.base_key = base_key
+        self.model = None
+        self.active = None
+        self._loaded = []
+        self._lock = threading.Lock()
+
+    def activate(self, adapter_dir, version):
+        """Aplica (cargándolo si hace falta) el adaptador de version y lo deja activo"""
+        from peft import PeftModel
+        name = _adapter_name(version)
+        with self._lock:
+            if self.model is None:
+                self.model = PeftModel.from_pretrained(self.base_model, adapter_dir, adapter_name=name)
+                self._loaded.append(name)
+            elif name not in self._loaded:
+                self.model.load_adapter(adapter_dir, adapter_name=name)
+                self._loaded.append(name)
+            else:
+                self._loaded.remove(name)
+                self._loaded.append(name)
+            self.model.set_adapter(name)
+            self.model.eval()
+            self.active = version
+
+            # Mantener en memoria solo los últimos adaptadores (vuelta atrás instantánea)
+            while len(self._loaded) > ADAPTER_KEEP:
+                self.model.delete_adapter(self._loaded.pop(0))
+        logging.info(f"🧩 Adaptador {version} activo sobre {self.base_key}")
+        return self.model
@@ -0,0 +1,77 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Agrupación dinámica de peticiones concurrentes para el pipeline text2text
+PIPELINE_MAX_BATCH_SIZE = int(os.environ.get("PIPELINE_MAX_BATCH_SIZE", "8"))
+PIPELINE_MAX_WAIT_MS = float(os.environ.get("PIPELINE_MAX_WAIT_MS", "25"))
+
+
+class _Request:
+    __slots__ = ("prompt", "options", "future")
+
+    def __init__(self, prompt, options):
+        self.prompt = prompt
+        self.options = options
+        self.future = Future()
+
+
+class BatchScheduler:
+    """Recoge prompts concurrentes durante max_wait_ms y los ejecuta como un único lote.
+
+    `run_batch(prompts, **options)` debe devolver una salida por prompt, en el mismo orden.
+    Solo se agrupan peticiones con las mismas opciones de generación.
+    """
+
+    def __init__(self, run_batch, max_batch_size=PIPELINE_MAX_BATCH_SIZE, max_wait_ms=PIPELINE_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name="pipeline-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt, **options):
+        request = _Request(prompt, tuple(sorted(options.items())))
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt, **options):
+        return self.submit(prompt, **options).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        pending = []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            (batch if request.options == first.options else pending).append(request)
+        # Las peticiones con otras opciones vuelven a la cola para el siguiente lote
+        for request in pending:
+            self._queue.put(request)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                outputs = self.run_batch([r.prompt for r in batch], **dict(batch[0].options))
+                if len(outputs) != len(batch):
+                    raise RuntimeError(f"El lote devolvió {len(outputs)} salidas para {len(batch)} prompts")
+                for request, output in zip(batch, outputs):
+                    request.future.set_result(output)
+                logging.info(f"Lote de inferencia ejecutado: {len(batch)} prompts")
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
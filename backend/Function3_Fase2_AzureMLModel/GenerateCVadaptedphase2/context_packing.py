@@ -0,0 +1,124 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+
+# Empaquetado de contexto: se eligen las secciones del CV más relevantes para la oferta
+# hasta llenar un presupuesto de tokens, manteniendo su orden original.
+CHARS_PER_TOKEN = 3
+MAX_SECTION_CHARS = 1200
+MIN_SECTION_CHARS = 80
+
+_HEADING_RE = re.compile(r"^\s*([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ0-9 &/\-]{2,60}|[^\n]{2,60}:)\s*$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+")
+_WORD_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+
+@dataclass
+class Section:
+    text: str
+    start: int
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _split_long(text, start):
+    """Divide una sección demasiado larga por frases"""
+    pieces, current, current_start, offset = [], "", start, start
+    for sentence in _SENTENCE_RE.split(text):
+        if current and len(current) + len(sentence) > MAX_SECTION_CHARS:
+            pieces.append(Section(current, current_start))
+            current, current_start = "", offset
+        current = f"{current} {sentence}" if current else sentence
+        offset += len(sentence) + 1
+    if current:
+        pieces.append(Section(current, current_start))
+    return pieces
+
+
+def split_sections(text):
+    """Separa el CV en secciones por líneas en blanco y encabezados"""
+    sections, lines, start, position = [], [], 0, 0
+    for line in text.splitlines(keepends=True):
+        is_break = not line.strip() or (_HEADING_RE.match(line) and lines)
+        if is_break and "".join(lines).strip():
+            sections.append(Section("".join(lines).strip(), start))
+            lines, start = [], position
+        if line.strip():
+            if not lines:
+                start = position
+            lines.append(line)
+        position += len(line)
+    if "".join(lines).strip():
+        sections.append(Section("".join(lines).strip(), start))
+
+    # Fusionar secciones muy cortas (p. ej. un encabezado suelto) con la siguiente
+    merged = []
+    for section in sections:
+        if merged and len(merged[-1].text) < MIN_SECTION_CHARS:
+            merged[-1] = Section(f"{merged[-1].text}\n{section.text}", merged[-1].start)
+        else:
+            merged.append(section)
+
+    result = []
+    for section in merged:
+        if len(section.text) > MAX_SECTION_CHARS:
+            result.extend(_split_long(section.text, section.start))
+        else:
+            result.append(section)
+    return result
+
+
+def embedding_scores(section_vectors, job_embed):
+    matrix = np.asarray(section_vectors, dtype=np.float32)
+    job = np.asarray(job_embed, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(job)
+    return (matrix @ job) / np.where(norms == 0, 1, norms)
+
+
+def lexical_scores(sections, job_text):
+    """Solapamiento de vocabulario ponderado por IDF entre cada sección y la oferta"""
+    job_terms = Counter(w.lower() for w in _WORD_RE.findall(job_text))
+    section_terms = [set(w.lower() for w in _WORD_RE.findall(s.text)) for s in sections]
+    doc_freq = Counter(term for terms in section_terms for term in terms)
+    total = len(sections) + 1
+    scores = []
+    for terms in section_terms:
+        score = sum(math.log(total / (1 + doc_freq[t])) + 1 for t in terms if t in job_terms)
+        scores.append(score / math.sqrt(len(terms) + 1))
+    return np.asarray(scores, dtype=np.float32)
+
+
+def pack(sections, scores, budget, count_tokens=estimate_tokens, keep_first=True):
+    """Selecciona secciones por relevancia hasta `budget` tokens y las devuelve en orden original"""
+    costs = [count_tokens(s.text) for s in sections]
+    chosen, used = set(), 0
+    order = list(np.argsort(-np.asarray(scores), kind="stable"))
+    if keep_first and sections:
+        # La primera sección suele contener nombre y datos de contacto
+        order.remove(0)
+        order.insert(0, 0)
+    for i in order:
+        if used + costs[i] <= budget:
+            chosen.add(int(i))
+            used += costs[i]
+    return "\n\n".join(sections[i].text for i in sorted(chosen))
+
+
+def truncate_tokens(text, budget, count_tokens=estimate_tokens):
+    """Recorta text a budget tokens (por palabras)"""
+    if count_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    return cut[:cut.rfind(" ")] if " " in cut else cut
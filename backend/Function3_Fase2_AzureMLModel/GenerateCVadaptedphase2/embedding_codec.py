@@ -0,0 +1,54 @@
+import base64
+import os
+
+import numpy as np
+
+# Formato compacto de embeddings en Cosmos DB.
+#   v0 (legacy): lista JSON de floats
+#   v1: {"v": 1, "dtype": "float32" | "float16" | "int8", "dim": n, "data": base64, "scale": s}
+#       int8 usa cuantización escalar simétrica por vector: x ≈ q * scale
+EMBEDDING_STORAGE_FORMAT = os.environ.get("EMBEDDING_STORAGE_FORMAT", "float16")
+CODEC_VERSION = 1
+
+_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+
+def encode_embedding(vector, dtype=EMBEDDING_STORAGE_FORMAT):
+    """Serializa un vector como base64 en el formato indicado"""
+    if dtype not in _DTYPES:
+        raise ValueError(f"Formato de embedding desconocido: {dtype}")
+    values = np.asarray(vector, dtype=np.float32)
+    encoded = {"v": CODEC_VERSION, "dtype": dtype, "dim": int(values.shape[0])}
+
+    if dtype == "int8":
+        peak = float(np.abs(values).max()) if values.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        data = np.clip(np.rint(values / scale), -127, 127).astype(_DTYPES[dtype])
+        encoded["scale"] = scale
+    else:
+        data = values.astype(_DTYPES[dtype])
+
+    encoded["data"] = base64.b64encode(data.tobytes()).decode("ascii")
+    return encoded
+
+
+def decode_embedding(value):
+    """Devuelve un np.ndarray float32 para cualquier versión almacenada.
+
+    Para float32 el array es una vista directa sobre los bytes decodificados (sin copia).
+    """
+    if isinstance(value, dict):
+        version = value.get("v")
+        if version != CODEC_VERSION:
+            raise ValueError(f"Versión de embedding no soportada: {version}")
+        dtype = value["dtype"]
+        raw = np.frombuffer(base64.b64decode(value["data"]), dtype=_DTYPES[dtype])
+        if dtype == "int8":
+            return raw.astype(np.float32) * np.float32(value["scale"])
+        return raw.astype(np.float32, copy=False)
+    # v0: lista JSON de floats
+    return np.asarray(value, dtype=np.float32)
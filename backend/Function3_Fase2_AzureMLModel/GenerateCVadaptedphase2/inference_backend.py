@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+
+# Backend de inferencia en CPU: pytorch (fp32) | pytorch-int8 | onnx-int8
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "pytorch")
+
+# Precisión de carga de los pesos en pytorch: float32 | bfloat16 | float16
+MODEL_LOAD_DTYPE = os.environ.get("MODEL_LOAD_DTYPE", "float32")
+
+# Artefacto generado por ml/deployment/register_model.py dentro de la carpeta del modelo
+ONNX_INT8_SUBDIR = "onnx-int8"
+ONNX_INT8_METADATA = "quantization.json"
+
+
+def backend_key(backend=INFERENCE_BACKEND, dtype=MODEL_LOAD_DTYPE):
+    """Identificador del backend para la caché de resultados (la precisión cambia las salidas)"""
+    return backend if dtype == "float32" or backend != "pytorch" else f"{backend}-{dtype}"
+
+
+def load_kwargs(model_dir=None, dtype=MODEL_LOAD_DTYPE):
+    """Opciones de from_pretrained para cargar rápido y con poca memoria.
+
+    Con safetensors los pesos se leen memory-mapped y low_cpu_mem_usage evita inicializar el
+    modelo en RAM antes de copiarlos (un único juego de pesos en memoria en lugar de dos).
+    """
+    import torch
+    kwargs = {"low_cpu_mem_usage": True, "torch_dtype": getattr(torch, dtype)}
+    if model_dir is not None and os.path.isdir(model_dir):
+        kwargs["local_files_only"] = True
+        if any(name.endswith(".safetensors") for name in os.listdir(model_dir)):
+            kwargs["use_safetensors"] = True
+    return kwargs
+
+
+def _load_pytorch(model_dir, dtype=MODEL_LOAD_DTYPE):
+    from transformers import AutoModelForSeq2SeqLM
+    return AutoModelForSeq2SeqLM.from_pretrained(model_dir, **load_kwargs(model_dir, dtype))
+
+
+def _load_pytorch_int8(model_dir):
+    import torch
+    # La cuantización dinámica parte de pesos float32
+    model = _load_pytorch(model_dir, dtype="float32")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx_int8(model_dir):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    onnx_dir = os.path.join(model_dir, ONNX_INT8_SUBDIR)
+    with open(os.path.join(onnx_dir, ONNX_INT8_METADATA)) as f:
+        files = json.load(f)["files"]
+    return ORTModelForSeq2SeqLM.from_pretrained(
+        onnx_dir,
+        encoder_file_name=files["encoder"],
+        decoder_file_name=files["decoder"],
+        decoder_with_past_file_name=files.get("decoder_with_past"),
+        use_cache=files.get("decoder_with_past") is not None,
+        local_files_only=True
+    )
+
+
+_LOADERS = {
+    "pytorch": _load_pytorch,
+    "pytorch-int8": _load_pytorch_int8,
+    "onnx-int8": _load_onnx_int8,
+}
+
+
+def load_seq2seq_model(model_dir, backend=INFERENCE_BACKEND):
+    """Carga el modelo con el backend configurado, degradando a pytorch fp32 si no es posible"""
+    if backend not in _LOADERS:
+        raise ValueError(f"INFERENCE_BACKEND desconocido: {backend}")
+    try:
+        model = _LOADERS[backend](model_dir)
+        logging.info(f"⚙️ Modelo cargado con backend {backend}")
+        return model
+    except Exception as e:
+        if backend == "pytorch":
+            raise
+        logging.warning(f"No se pudo cargar el backend {backend}, usando pytorch: {e}")
+        return _load_pytorch(model_dir)
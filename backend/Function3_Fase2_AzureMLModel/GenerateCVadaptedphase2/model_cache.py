@@ -0,0 +1,162 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Caché en disco de modelos registrados en Azure ML: {MODEL_CACHE_DIR}/{nombre}/{versión}/
+MODEL_CACHE_DIR = os.environ.get(
+    "MODEL_CACHE_DIR", os.path.join(os.environ.get("HOME", tempfile.gettempdir()), "genesis-models")
+)
+MODEL_CACHE_KEEP = int(os.environ.get("MODEL_CACHE_KEEP", "2"))
+MODEL_CACHE_VERIFY = os.environ.get("MODEL_CACHE_VERIFY", "size")  # size | hash
+MODEL_VERSION_CHECK_SECONDS = float(os.environ.get("MODEL_VERSION_CHECK_SECONDS", "600"))
+
+MANIFEST = "manifest.json"
+LATEST = "latest.json"
+
+# Versiones en uso por este proceso (p. ej. el modelo base de un adaptador LoRA): evict no las elimina
+_pinned = {}
+
+
+def version_key(version):
+    """Ordena versiones numéricamente cuando es posible ('10' > '9')"""
+    return (0, int(version), "") if str(version).isdigit() else (1, 0, str(version))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _list_files(root):
+    for folder, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(folder, name)
+            rel = os.path.relpath(path, root)
+            if rel != MANIFEST:
+                yield rel, path
+
+
+def write_manifest(root, name, version):
+    files = {rel: {"size": os.path.getsize(path), "sha256": _sha256(path)} for rel, path in _list_files(root)}
+    with open(os.path.join(root, MANIFEST), "w") as f:
+        json.dump({"name": name, "version": str(version), "files": files, "created": time.time()}, f)
+
+
+def verify(root, mode=MODEL_CACHE_VERIFY):
+    """Comprueba que una versión cacheada está completa y no se ha corrompido"""
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    for rel, info in manifest["files"].items():
+        path = os.path.join(root, rel)
+        if not os.path.isfile(path) or os.path.getsize(path) != info["size"]:
+            return False
+        if mode == "hash" and _sha256(path) != info["sha256"]:
+            return False
+    return True
+
+
+@contextmanager
+def _locked(name):
+    os.makedirs(os.path.join(MODEL_CACHE_DIR, name), exist_ok=True)
+    with open(os.path.join(MODEL_CACHE_DIR, name, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ModelCache:
+    def __init__(self, name, root=MODEL_CACHE_DIR, keep=MODEL_CACHE_KEEP):
+        self.name = name
+        self.root = os.path.join(root, name)
+        self.keep = keep
+
+    def path(self, version):
+        return os.path.join(self.root, str(version))
+
+    def pin(self, version):
+        """Marca una versión como en uso para que evict la conserve aunque no esté entre las más recientes"""
+        _pinned.setdefault(self.name, set()).add(str(version))
+
+    def cached_versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        versions = [
+            entry for entry in os.listdir(self.root)
+            if not entry.startswith(".") and os.path.isfile(os.path.join(self.root, entry, MANIFEST))
+        ]
+        return sorted(versions, key=version_key)
+
+    def _read_latest(self):
+        try:
+            with open(os.path.join(self.root, LATEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_latest(self, version):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f".{LATEST}.{os.getpid()}")
+        with open(tmp, "w") as f:
+            json.dump({"version": str(version), "checked": time.time()}, f)
+        os.replace(tmp, os.path.join(self.root, LATEST))
+
+    def latest_version(self, list_versions):
+        """Última versión registrada; solo consulta Azure ML si la comprobación anterior ha caducado"""
+        latest = self._read_latest()
+        if latest and time.time() - latest["checked"] < MODEL_VERSION_CHECK_SECONDS:
+            return latest["version"]
+        try:
+            version = max((str(v) for v in list_versions()), key=version_key)
+        except Exception as e:
+            if latest:
+                logging.warning(f"No se pudo consultar Azure ML, se usa la versión {latest['version']}: {e}")
+                return latest["version"]
+            raise
+        self._write_latest(version)
+        return version
+
+    def get(self, version, download):
+        """Ruta de la versión en caché; la descarga (download(destino)) solo si falta o está corrupta"""
+        target = self.path(version)
+        if verify(target):
+            logging.info(f"✅ Modelo {self.name} v{version} servido desde caché: {target}")
+            return target
+
+        with _locked(self.name):
+            if verify(target):
+                return target
+            staging = tempfile.mkdtemp(prefix=f".{version}-", dir=self.root)
+            try:
+                download(staging)
+                write_manifest(staging, self.name, version)
+                shutil.rmtree(target, ignore_errors=True)
+                os.replace(staging, target)
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            logging.info(f"📦 Modelo {self.name} v{version} descargado en caché: {target}")
+            self.evict()
+        return target
+
+    def evict(self):
+        """Elimina las versiones más antiguas, conservando las `keep` más recientes y las fijadas con pin"""
+        pinned = _pinned.get(self.name, set())
+        for version in self.cached_versions()[:-self.keep or None]:
+            if version in pinned:
+                continue
+            logging.info(f"🧹 Eliminando modelo en caché {self.name} v{version}")
+            shutil.rmtree(self.path(version), ignore_errors=True)
@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import os
+import time
+from functools import partial
+
+from . import sansio, telemetry
+
+# Caché de CVs adaptados: hash(CV, oferta, modelo, versión de prompt) -> PDF ya generado.
+# Cada operación se escribe una vez (generador de sansio) y se expone para clientes síncronos
+# del SDK y para clientes .aio (sufijo _async).
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+BLOB_CONTAINER = "upload"
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def result_key(cv_text, job_text, model_version, prompt_version):
+    parts = [_sha256(cv_text), _sha256(job_text), str(model_version), str(prompt_version)]
+    return _sha256("|".join(parts))
+
+
+def generated_blob_name(job_id):
+    return f"generated/{job_id}.pdf"
+
+
+def _item_id(key):
+    return f"result-{key}"
+
+
+def _entry(key, job_id, blob_name, text):
+    return {
+        "id": _item_id(key),
+        "type": "result",
+        "job_id": job_id,
+        "blob_name": blob_name,
+        "text": text,
+        "created": time.time(),
+        "ttl": RESULT_CACHE_TTL_SECONDS  # solo aplica si el contenedor tiene TTL habilitado
+    }
+
+
+def _expired(entry):
+    return time.time() - entry["created"] > RESULT_CACHE_TTL_SECONDS
+
+
+def _lookup(container, blob_service, key):
+    if not RESULT_CACHE_ENABLED:
+        return None
+    from azure.core.exceptions import ResourceNotFoundError
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
+    with telemetry.span("cosmos.read", item_type="result") as span:
+        try:
+            entry = yield partial(
+                container.read_item, _item_id(key), partition_key=_item_id(key), response_hook=telemetry.cosmos_hook(span)
+            )
+        except CosmosResourceNotFoundError as e:
+            span.set(found=False, request_charge=telemetry.cosmos_charge(e.headers))
+            return None
+
+    if _expired(entry):
+        yield _invalidate(container, key)
+        return None
+    try:
+        yield blob_service.get_blob_client(BLOB_CONTAINER, entry["blob_name"]).get_blob_properties
+    except ResourceNotFoundError:
+        logging.warning(f"PDF cacheado {entry['blob_name']} ya no existe, se invalida la entrada")
+        yield _invalidate(container, key)
+        return None
+    return entry
+
+
+def lookup(container, blob_service, key):
+    """Entrada vigente para key (con el PDF todavía en blob storage) o None"""
+    return sansio.run(_lookup(container, blob_service, key))
+
+
+async def lookup_async(container, blob_service, key):
+    """Versión asíncrona de lookup"""
+    return await sansio.run_async(_lookup(container, blob_service, key))
+
+
+def _store(container, key, job_id, blob_name, text):
+    if not RESULT_CACHE_ENABLED:
+        return
+    try:
+        with telemetry.span("cosmos.upsert", item_type="result", bytes=len(text.encode("utf-8"))) as span:
+            yield partial(
+                container.upsert_item, _entry(key, job_id, blob_name, text), response_hook=telemetry.cosmos_hook(span)
+            )
+    except Exception as e:
+        logging.warning(f"No se pudo guardar el resultado en caché: {e}")
+
+
+def store(container, key, job_id, blob_name, text):
+    sansio.run(_store(container, key, job_id, blob_name, text))
+
+
+async def store_async(container, key, job_id, blob_name, text):
+    await sansio.run_async(_store(container, key, job_id, blob_name, text))
+
+
+def _invalidate(container, key):
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
+    try:
+        yield partial(container.delete_item, _item_id(key), partition_key=_item_id(key))
+    except CosmosResourceNotFoundError:
+        pass
+
+
+def invalidate(container, key):
+    sansio.run(_invalidate(container, key))
+
+
+async def invalidate_async(container, key):
+    await sansio.run_async(_invalidate(container, key))
+
+
+def _materialize(blob_service, entry, job_id, sas_token):
+    blob_name = generated_blob_name(job_id)
+    if entry["blob_name"] == blob_name:
+        return blob_name
+    source = blob_service.get_blob_client(BLOB_CONTAINER, entry["blob_name"])
+    target = blob_service.get_blob_client(BLOB_CONTAINER, blob_name)
+    yield partial(target.upload_blob_from_url, f"{source.url}?{sas_token}", overwrite=True)
+    logging.info(f"PDF cacheado copiado de {entry['blob_name']} a {blob_name}")
+    return blob_name
+
+
+def materialize(blob_service, entry, job_id, sas_token):
+    """Devuelve el blob del PDF para job_id, copiándolo en el servidor si pertenece a otro job"""
+    return sansio.run(_materialize(blob_service, entry, job_id, sas_token))
+
+
+async def materialize_async(blob_service, entry, job_id, sas_token):
+    """Versión asíncrona de materialize"""
+    return await sansio.run_async(_materialize(blob_service, entry, job_id, sas_token))
@@ -0,0 +1,87 @@
+import asyncio
+import inspect
+import time
+
+# Operaciones de E/S escritas una sola vez para los clientes síncronos y .aio de los SDKs.
+# Una operación es un generador que cede pasos y recibe su resultado (o su excepción):
+# - una función sin argumentos (p. ej. functools.partial(container.read_item, ...)),
+# - otra operación (generador), equivalente a `yield from`,
+# - Sleep, Parallel o Blocking.
+# run la ejecuta en el hilo actual; run_async espera los resultados awaitables del cliente .aio.
+
+
+class Sleep:
+    """Pausa: time.sleep en run, asyncio.sleep en run_async"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class Parallel:
+    """Pasos independientes: en secuencia en run, a la vez (gather) en run_async; devuelve la lista de resultados"""
+
+    def __init__(self, *steps):
+        self.steps = steps
+
+
+class Blocking:
+    """Llamada síncrona costosa: directa en run, en un hilo (asyncio.to_thread) en run_async"""
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+
+def _execute(step):
+    if inspect.isgenerator(step):
+        return run(step)
+    if isinstance(step, Sleep):
+        return time.sleep(step.seconds)
+    if isinstance(step, Parallel):
+        return [_execute(s) for s in step.steps]
+    if isinstance(step, Blocking):
+        return step.function(*step.args)
+    return step()
+
+
+def run(operation):
+    """Ejecuta la operación con clientes síncronos y devuelve su resultado"""
+    value, error = None, None
+    while True:
+        try:
+            step = operation.throw(error) if error is not None else operation.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = _execute(step)
+        except Exception as e:
+            error = e
+
+
+async def _execute_async(step):
+    if inspect.isgenerator(step):
+        return await run_async(step)
+    if isinstance(step, Sleep):
+        return await asyncio.sleep(step.seconds)
+    if isinstance(step, Parallel):
+        return list(await asyncio.gather(*(_execute_async(s) for s in step.steps)))
+    if isinstance(step, Blocking):
+        return await asyncio.to_thread(step.function, *step.args)
+    value = step()
+    return await value if inspect.isawaitable(value) else value
+
+
+async def run_async(operation):
+    """Ejecuta la operación con clientes .aio y devuelve su resultado"""
+    value, error = None, None
+    while True:
+        try:
+            step = operation.throw(error) if error is not None else operation.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = await _execute_async(step)
+        except Exception as e:
+            error = e
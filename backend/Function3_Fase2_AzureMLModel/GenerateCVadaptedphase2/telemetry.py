@@ -0,0 +1,212 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Trazas por etapa: log (una línea JSON por span) | otel (OpenTelemetry SDK) | none (solo métricas en memoria)
+TELEMETRY_EXPORTER = os.environ.get("TELEMETRY_EXPORTER", "log")
+# Con otel: exportador OTLP si hay endpoint configurado, si no ConsoleSpanExporter (local)
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "genesis")
+
+# Atributos numéricos que se acumulan en las métricas por span
+SUMMED_ATTRIBUTES = ("bytes", "prompt_tokens", "completion_tokens", "total_tokens", "request_charge", "chunks")
+
+logger = logging.getLogger("genesis.telemetry")
+
+_current = contextvars.ContextVar("genesis_span", default=None)
+_metrics = {}
+_metrics_lock = threading.Lock()
+_tracer = None
+_tracer_loaded = False
+
+
+def trace_id_for(job_id):
+    """Trace id derivado del jobId: Function2 y Function3 comparten traza sin propagar contexto"""
+    return hashlib.sha256(f"genesis-job:{job_id}".encode("utf-8")).hexdigest()[:32]
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "job_id", "function", "attributes",
+                 "start", "started", "duration_ms", "error", "otel")
+
+    def __init__(self, name, parent, trace_id=None, job_id=None, function=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id or (parent.trace_id if parent else secrets.token_hex(16))
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.job_id = job_id or (parent.job_id if parent else None)
+        self.function = function or (parent.function if parent else None)
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+        self.otel = None
+
+    def set(self, **attributes):
+        """Añade atributos (tamaños, tokens, RU...) al span"""
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+        if self.otel is not None:
+            for key, value in attributes.items():
+                if isinstance(value, (str, bool, int, float)):
+                    self.otel.set_attribute(f"genesis.{key}", value)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self):
+        record = {
+            "span": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "job_id": self.job_id,
+            "function": self.function,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "error" if self.error else "ok",
+            **self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+def _get_tracer():
+    """Tracer de OpenTelemetry (lazy); None si el exportador no es otel o el SDK no está instalado"""
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer_loaded = True
+        if TELEMETRY_EXPORTER == "otel":
+            try:
+                from opentelemetry import trace
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+                if OTEL_EXPORTER_OTLP_ENDPOINT:
+                    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                    exporter = OTLPSpanExporter()
+                else:
+                    exporter = ConsoleSpanExporter()
+                provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(exporter))
+                trace.set_tracer_provider(provider)
+                _tracer = trace.get_tracer("genesis")
+            except Exception as e:
+                logging.warning(f"OpenTelemetry no disponible, se exportan los spans como logs: {e}")
+    return _tracer
+
+
+def _otel_span(tracer, span):
+    from opentelemetry import trace
+    from opentelemetry.trace import NonRecordingSpan, SpanContext, TraceFlags
+    attributes = {"genesis.job_id": span.job_id, "genesis.function": span.function}
+    attributes = {k: v for k, v in attributes.items() if v is not None}
+    if span.parent_id is None:
+        # Raíz: se cuelga de un contexto remoto con el trace id del job para correlacionar funciones
+        parent = SpanContext(
+            trace_id=int(span.trace_id, 16), span_id=int(secrets.token_hex(8), 16),
+            is_remote=True, trace_flags=TraceFlags(TraceFlags.SAMPLED)
+        )
+        context = trace.set_span_in_context(NonRecordingSpan(parent))
+        return tracer.start_as_current_span(span.name, context=context, attributes=attributes)
+    return tracer.start_as_current_span(span.name, attributes=attributes)
+
+
+def _record(span):
+    with _metrics_lock:
+        metric = _metrics.setdefault(span.name, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        metric["count"] += 1
+        metric["errors"] += 1 if span.error else 0
+        metric["total_ms"] += span.duration_ms
+        metric["max_ms"] = max(metric["max_ms"], span.duration_ms)
+        for key in SUMMED_ATTRIBUTES:
+            value = span.attributes.get(key)
+            if isinstance(value, (int, float)):
+                metric[key] = metric.get(key, 0) + value
+    if span.otel is None and TELEMETRY_EXPORTER != "none" and logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(name, trace_id=None, job_id=None, function=None, **attributes):
+    """Mide una etapa; los spans anidados (también en hilos vía contextvars) comparten traza"""
+    current = Span(name, _current.get(), trace_id, job_id, function, attributes)
+    token = _current.set(current)
+    tracer = _get_tracer()
+    try:
+        with _otel_span(tracer, current) if tracer else nullcontext() as otel:
+            current.otel = otel
+            if otel is not None:
+                current.set(**current.attributes)
+            yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration_ms = current.elapsed_ms()
+        _current.reset(token)
+        _record(current)
+
+
+def job_trace(job_id, function):
+    """Span raíz de una invocación, con el trace id correlacionado por jobId"""
+    return span(function, trace_id=trace_id_for(job_id), job_id=job_id, function=function)
+
+
+def annotate(**attributes):
+    """Añade atributos al span activo (si lo hay)"""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def cosmos_charge(headers):
+    """RU de una respuesta de Cosmos (cabecera x-ms-request-charge) o None"""
+    try:
+        return float(headers.get("x-ms-request-charge"))
+    except Exception:
+        return None
+
+
+def cosmos_hook(span):
+    """response_hook de Cosmos que anota en span las RU de esa misma operación.
+
+    Las cabeceras compartidas del cliente (last_response_headers) no sirven con lecturas
+    concurrentes: un span podría quedarse con las RU de otra petición.
+    """
+    def hook(headers, result):
+        span.set(request_charge=cosmos_charge(headers))
+    return hook
+
+
+def openai_usage(response):
+    """Tokens de una respuesta de OpenAI como atributos de span"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+def stats():
+    """Métricas acumuladas por span en este proceso"""
+    with _metrics_lock:
+        return {
+            name: {**metric, "mean_ms": metric["total_ms"] / metric["count"] if metric["count"] else 0.0}
+            for name, metric in _metrics.items()
+        }
+
+
+def reset():
+    with _metrics_lock:
+        _metrics.clear()
@@ -1,19 +1,34 @@
-import logging, os, json, time, requests, fitz, base64
-from openai import AzureOpenAI
-from azure.storage.blob import BlobServiceClient
-from azure.cosmos import CosmosClient
+import logging, os, json, base64
+from functools import partial
 import azure.functions as func
-from io import BytesIO
 from numpy import dot
 from numpy.linalg import norm
-from reportlab.pdfgen import canvas
+from . import readiness
+from . import chunking
+from . import result_cache
+from . import pdf_render
+from . import aio
+from . import context_packing
+from . import sansio
+from . import openai_client
+from . import telemetry
+from . import warmup
+from .embedding_codec import encode_embedding
 
-# Variables globales para inicialización lazy
+# Variables globales para inicialización lazy (los SDKs se importan al crear cada cliente)
 _client = None
+_async_client = None
 _cosmos = None
 _container = None
 _blob_service = None
 
+# Incrementar al cambiar build_prompt para invalidar los resultados cacheados
+PROMPT_VERSION = "2"
+
+# Presupuesto de tokens del prompt: secciones del CV más relevantes y oferta recortada
+PROMPT_CV_TOKEN_BUDGET = int(os.environ.get("PROMPT_CV_TOKEN_BUDGET", "6000"))
+PROMPT_JOB_TOKEN_BUDGET = int(os.environ.get("PROMPT_JOB_TOKEN_BUDGET", "2000"))
+
 def fix_cosmos_key(key):
     """Corrige el padding de la clave Base64 de Cosmos DB"""
     try:
@@ -32,22 +47,27 @@ def get_openai_client():
     global _client
     if _client is None:
         try:
-            _client = AzureOpenAI(
-                api_version="2024-02-01",
-                azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-                api_key=os.environ["AZURE_OPENAI_KEY"]
-            )
+            _client = openai_client.create_client()
             logging.info("Cliente OpenAI inicializado correctamente")
         except Exception as e:
             logging.error(f"Error inicializando OpenAI: {e}")
             raise Exception(f"Error inicializando OpenAI: {str(e)}")
     return _client
 
+def get_async_openai_client():
+    """Inicializa el cliente OpenAI asíncrono de forma lazy"""
+    global _async_client
+    if _async_client is None:
+        _async_client = openai_client.create_client(asynchronous=True)
+        logging.info("Cliente OpenAI asíncrono inicializado correctamente")
+    return _async_client
+
 def get_cosmos_client():
     """Inicializa el cliente Cosmos de forma lazy"""
     global _cosmos, _container
     if _cosmos is None:
         try:
+            from azure.cosmos import CosmosClient
             cosmos_key = fix_cosmos_key(os.environ["COSMOS_KEY"])
             _cosmos = CosmosClient(os.environ["COSMOS_URL"], credential=cosmos_key)
             db = _cosmos.get_database_client(os.environ["COSMOS_DB"])
@@ -63,6 +83,7 @@ def get_blob_service():
     global _blob_service
     if _blob_service is None:
         try:
+            from azure.storage.blob import BlobServiceClient
             _blob_service = BlobServiceClient.from_connection_string(
                 os.environ["STORAGE_CONNECTION_STRING"]
             )
@@ -75,65 +96,153 @@ def get_blob_service():
 def cosine_sim(a, b):
     return dot(a, b) / (norm(a) * norm(b))
 
-def wait_for_embeddings(job_id, retries=10, delay=3):
+def embed_document(text, deployment):
+    """Embebe un documento por fragmentos (límite de tokens del modelo) y agrega sus vectores"""
+    chunks = chunking.chunk_text(text)
+    if not chunks:
+        raise readiness.EmbeddingsNotReady("Documento sin texto para generar embeddings")
+    with telemetry.span("openai.embeddings", inputs=len(chunks)) as span:
+        response = get_openai_client().embeddings.create(input=[chunk.text for chunk in chunks], model=deployment)
+        span.set(**telemetry.openai_usage(response))
+    vectors = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+    pooled = chunking.pool_embeddings(vectors, [chunk.tokens for chunk in chunks])
+    chunk_docs = [
+        {"start": chunk.start, "end": chunk.end, "tokens": chunk.tokens, "embedding": encode_embedding(vector)}
+        for chunk, vector in zip(chunks, vectors)
+    ]
+    return pooled, chunk_docs
+
+def store_embeddings(job_id, doc_type, text, embedding, chunks):
+    """Guarda el documento calculado en línea con el mismo formato que Function2"""
+    try:
+        _, container = get_cosmos_client()
+        with telemetry.span("cosmos.upsert", item_type=doc_type) as span:
+            container.upsert_item({
+                "id": f"{job_id}-{doc_type}",
+                "text": text,
+                "embedding": encode_embedding(embedding),
+                "type": doc_type,
+                "chunks": chunks
+            }, response_hook=telemetry.cosmos_hook(span))
+    except Exception as e:
+        logging.warning(f"No se pudo guardar {job_id}-{doc_type} calculado en línea: {e}")
+
+def compute_embeddings_inline(job_id):
+    """Extrae y embebe el CV y la oferta en la propia petición cuando Function2 no ha terminado"""
+    deployment = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+    if not deployment:
+        raise readiness.EmbeddingsNotReady("AZURE_OPENAI_EMBEDDING_DEPLOYMENT no configurado para el cálculo en línea")
+    with telemetry.span("blob.load_sources"):
+        cv_text, job_text = readiness.load_source_texts(get_blob_service(), job_id)
+    cv_embed, cv_chunks = embed_document(cv_text, deployment)
+    job_embed, job_chunks = embed_document(job_text, deployment)
+    store_embeddings(job_id, "cv", cv_text, cv_embed, cv_chunks)
+    store_embeddings(job_id, "joboffer", job_text, job_embed, job_chunks)
+    return cv_text, job_text, cv_embed, job_embed
+
+def wait_for_embeddings(job_id):
     _, container = get_cosmos_client()
-    for attempt in range(retries):
+    return readiness.wait_for_embeddings(container, job_id, inline=compute_embeddings_inline)
+
+def pack_context(cv_text, job_text, job_embed, section_vectors=None):
+    """CV reducido a las secciones más relevantes para la oferta dentro del presupuesto de tokens"""
+    job_text = context_packing.truncate_tokens(job_text, PROMPT_JOB_TOKEN_BUDGET)
+    if context_packing.estimate_tokens(cv_text) <= PROMPT_CV_TOKEN_BUDGET:
+        return cv_text, job_text
+    sections = context_packing.split_sections(cv_text)
+    if section_vectors is not None and len(section_vectors[0]) == len(job_embed):
+        scores = context_packing.embedding_scores(section_vectors, job_embed)
+    else:
+        scores = context_packing.lexical_scores(sections, job_text)
+    packed = context_packing.pack(sections, scores, PROMPT_CV_TOKEN_BUDGET)
+    logging.info(f"Contexto empaquetado: {len(packed)}/{len(cv_text)} caracteres del CV")
+    return packed, job_text
+
+def _sections_to_embed(cv_text):
+    """Secciones a puntuar por embeddings (None si no hace falta empaquetar o no hay despliegue)"""
+    if context_packing.estimate_tokens(cv_text) <= PROMPT_CV_TOKEN_BUDGET:
+        return None
+    if not os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"):
+        return None
+    return [s.text for s in context_packing.split_sections(cv_text)]
+
+def _select_context(client, cv_text, job_text, job_embed):
+    sections = _sections_to_embed(cv_text)
+    vectors = None
+    if sections:
         try:
-            cv = container.read_item(f"{job_id}-cv", partition_key=f"{job_id}-cv")
-            job = container.read_item(f"{job_id}-joboffer", partition_key=f"{job_id}-joboffer")
-            return cv["text"], job["text"], cv["embedding"], job["embedding"]
+            with telemetry.span("openai.embeddings", inputs=len(sections)) as span:
+                response = yield partial(
+                    client.embeddings.create, input=sections, model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
+                )
+                span.set(**telemetry.openai_usage(response))
+            vectors = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
         except Exception as e:
-            logging.warning(f"Intento {attempt + 1}/{retries} fallido: {e}")
-            if attempt < retries - 1:
-                time.sleep(delay)
-            else:
-                raise Exception(f"Embeddings no disponibles después de {retries} intentos")
+            logging.warning(f"No se pudieron embeber las secciones del CV, se puntúan por léxico: {e}")
+    return pack_context(cv_text, job_text, job_embed, vectors)
 
-def generate_pdf(text):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer)
-    p.setFont("Helvetica", 10)
-    y = 800
-    
-    # Mejorar la generación del PDF
-    lines = text.split("\n")
-    for line in lines:
-        # Dividir líneas muy largas
-        while len(line) > 100:
-            if y < 40:
-                p.showPage()
-                y = 800
-            p.drawString(50, y, line[:100])
-            y -= 15
-            line = line[100:]
-        
-        if line.strip():  # Solo si la línea no está vacía
-            if y < 40:
-                p.showPage()
-                y = 800
-            p.drawString(50, y, line)
-            y -= 15
-    
-    p.save()
-    buffer.seek(0)
-    return buffer
+def select_context(cv_text, job_text, job_embed):
+    """Contexto del prompt; si hay que empaquetar el CV, puntúa sus secciones con embeddings"""
+    return sansio.run(_select_context(get_openai_client(), cv_text, job_text, job_embed))
+
+async def select_context_async(cv_text, job_text, job_embed):
+    return await sansio.run_async(_select_context(get_async_openai_client(), cv_text, job_text, job_embed))
+
+def build_prompt(cv_text, job_text, sim):
+    return f"""
+Eres un asistente experto en RRHH. Adapta el CV original a la oferta de trabajo resaltando los puntos relevantes, sin inventarte nada.
 
-def upload_pdf(pdf_stream, job_id):
+Similitud cosenoidal: {sim:.2f}
+
+--- CV ORIGINAL ---
+{cv_text}
+
+--- OFERTA ---
+{job_text}
+
+Genera el CV adaptado:
+"""
+
+def blob_url(blob_name):
+    account_name = os.environ["STORAGE_ACCOUNT_NAME"]
+    sas_token = os.environ["BLOB_SAS_TOKEN"]
+    return f"https://{account_name}.blob.core.windows.net/upload/{blob_name}?{sas_token}"
+
+def get_result_key(cv_text, job_text):
+    return result_cache.result_key(cv_text, job_text, os.environ["AZURE_OPENAI_DEPLOYMENT"], PROMPT_VERSION)
+
+def get_cached_result(cache_key, job_id):
+    """URL del PDF ya generado para las mismas entradas (None si no hay)"""
+    try:
+        _, container = get_cosmos_client()
+        blob_service = get_blob_service()
+        entry = result_cache.lookup(container, blob_service, cache_key)
+        if entry is None:
+            return None, None
+        blob_name = result_cache.materialize(blob_service, entry, job_id, os.environ["BLOB_SAS_TOKEN"])
+        return blob_url(blob_name), entry["text"]
+    except Exception as e:
+        logging.warning(f"Error consultando la caché de resultados: {e}")
+        return None, None
+
+def store_result(cache_key, job_id, text):
+    _, container = get_cosmos_client()
+    result_cache.store(container, cache_key, job_id, f"generated/{job_id}.pdf", text)
+
+def render_and_upload_pdf(text, job_id):
+    """Renderiza el PDF y lo sube a generated/{job_id}.pdf (por bloques si supera PDF_BLOCK_SIZE)"""
     blob_service = get_blob_service()
     try:
         blob_name = f"generated/{job_id}.pdf"
         blob = blob_service.get_blob_client("upload", blob_name)
-        blob.upload_blob(pdf_stream, overwrite=True, content_type="application/pdf")
-
-        account_name = os.environ["STORAGE_ACCOUNT_NAME"]
-        sas_token = os.environ["BLOB_SAS_TOKEN"] 
-        url = f"https://{account_name}.blob.core.windows.net/upload/{blob_name}?{sas_token}"
-        return url
+        size = pdf_render.render_to_blob(text, blob)
+        logging.info(f"PDF subido: {size} bytes")
+        return blob_url(blob_name)
     except Exception as e:
         logging.error(f"Error subiendo PDF: {e}")
         raise Exception(f"Error subiendo PDF: {str(e)}")
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Function 3 — GenerateAdaptedCV ejecutándose...")
     
     # Headers CORS
@@ -176,77 +285,100 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        logging.info(f"Procesando job_id: {job_id}")
+        with telemetry.job_trace(job_id, "GenerateAdaptedCV") as trace:
+            logging.info(f"Procesando job_id: {job_id}")
         
-        # Obtener embeddings
-        try:
-            cv_text, job_text, cv_embed, job_embed = wait_for_embeddings(job_id)
-            sim = cosine_sim(cv_embed, job_embed)
-            logging.info(f"Similaridad calculada: {sim:.2f}")
-        except Exception as e:
-            logging.error(f"Error obteniendo embeddings: {e}")
-            return func.HttpResponse(
-                json.dumps({"error": f"Error obteniendo datos: {str(e)}"}),
-                status_code=500,
-                headers=cors_headers,
-                mimetype="application/json"
-            )
+            # Obtener embeddings
+            try:
+                with telemetry.span("wait_for_embeddings"):
+                    cv_text, job_text, cv_embed, job_embed = await aio.wait_for_embeddings(
+                        job_id, inline=compute_embeddings_inline
+                    )
+                sim = cosine_sim(cv_embed, job_embed)
+                logging.info(f"Similaridad calculada: {sim:.2f}")
+            except Exception as e:
+                logging.error(f"Error obteniendo embeddings: {e}")
+                return func.HttpResponse(
+                    json.dumps({"error": f"Error obteniendo datos: {str(e)}"}),
+                    status_code=500,
+                    headers=cors_headers,
+                    mimetype="application/json"
+                )
         
-        # Generar prompt
-        prompt = f"""
-Eres un asistente experto en RRHH. Adapta el CV original a la oferta de trabajo resaltando los puntos relevantes, sin inventarte nada.
-
-Similitud cosenoidal: {sim:.2f}
-
---- CV ORIGINAL ---
-{cv_text}
-
---- OFERTA ---
-{job_text}
+            # Reutilizar el resultado si ya se generó para las mismas entradas
+            cache_key = get_result_key(cv_text, job_text)
+            if request_json.get("refresh"):
+                await aio.invalidate_result(cache_key)
+            else:
+                try:
+                    with telemetry.span("result_cache.lookup") as span:
+                        cached_blob, _ = await aio.lookup_result(cache_key, job_id)
+                        span.set(hit=bool(cached_blob))
+                except Exception as e:
+                    logging.warning(f"Error consultando la caché de resultados: {e}")
+                    cached_blob = None
+                if cached_blob:
+                    logging.info(f"Resultado servido desde caché para job_id: {job_id}")
+                    trace.set(cached=True)
+                    return func.HttpResponse(
+                        json.dumps({"generatedCvUrl": blob_url(cached_blob), "cached": True}),
+                        mimetype="application/json",
+                        status_code=200,
+                        headers=cors_headers
+                    )
 
-Genera el CV adaptado:
-"""
+            # Generar prompt con las secciones del CV más relevantes para la oferta
+            with telemetry.span("select_context", chars=len(cv_text)) as span:
+                cv_context, job_context = await select_context_async(cv_text, job_text, job_embed)
+                span.set(packed_chars=len(cv_context))
+            prompt = build_prompt(cv_context, job_context, sim)
         
-        # Llamar a OpenAI
-        try:
-            client = get_openai_client()
-            response = client.chat.completions.create(
-                model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=2000
-            )
-            new_cv = response.choices[0].message.content
-            logging.info("CV generado correctamente")
-        except Exception as e:
-            logging.error(f"Error en OpenAI: {e}")
-            return func.HttpResponse(
-                json.dumps({"error": f"Error generando CV: {str(e)}"}),
-                status_code=500,
-                headers=cors_headers,
-                mimetype="application/json"
-            )
+            # Llamar a OpenAI
+            try:
+                client = get_async_openai_client()
+                with telemetry.span("openai.chat", prompt_chars=len(prompt)) as span:
+                    response = await client.chat.completions.create(
+                        model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.7,
+                        max_tokens=2000
+                    )
+                    span.set(**telemetry.openai_usage(response))
+                new_cv = response.choices[0].message.content
+                logging.info("CV generado correctamente")
+                logging.info(f"Cuota OpenAI: {openai_client.stats()}")
+                logging.info(f"Telemetría: {telemetry.stats()}")
+            except Exception as e:
+                logging.error(f"Error en OpenAI: {e}")
+                return func.HttpResponse(
+                    json.dumps({"error": f"Error generando CV: {str(e)}"}),
+                    status_code=500,
+                    headers=cors_headers,
+                    mimetype="application/json"
+                )
+        
+            # Generar y subir PDF
+            try:
+                blob_name = await aio.render_and_upload_pdf(new_cv, job_id)
+                # La entrada de caché solo se escribe cuando el PDF ya está subido
+                await aio.store_result(cache_key, job_id, new_cv)
+                url = blob_url(blob_name)
+                logging.info(f"PDF generado y subido: {url}")
+            except Exception as e:
+                logging.error(f"Error generando/subiendo PDF: {e}")
+                return func.HttpResponse(
+                    json.dumps({"error": f"Error creando PDF: {str(e)}"}),
+                    status_code=500,
+                    headers=cors_headers,
+                    mimetype="application/json"
+                )
         
-        # Generar y subir PDF
-        try:
-            pdf = generate_pdf(new_cv)
-            url = upload_pdf(pdf, job_id)
-            logging.info(f"PDF generado y subido: {url}")
-        except Exception as e:
-            logging.error(f"Error generando/subiendo PDF: {e}")
             return func.HttpResponse(
-                json.dumps({"error": f"Error creando PDF: {str(e)}"}),
-                status_code=500,
-                headers=cors_headers,
-                mimetype="application/json"
+                json.dumps({"generatedCvUrl": url}),
+                mimetype="application/json",
+                status_code=200,
+                headers=cors_headers
             )
-        
-        return func.HttpResponse(
-            json.dumps({"generatedCvUrl": url}),
-            mimetype="application/json",
-            status_code=200,
-            headers=cors_headers
-        )
     
     except Exception as e:
         logging.error(f"Error general en Function 3: {e}")
@@ -255,4 +387,8 @@ Genera el CV adaptado:
             status_code=500,
             headers=cors_headers,
             mimetype="application/json"
-        )
\ No newline at end of file
+        )
+
+if warmup.STARTUP_WARMUP:
+    warmup.start(get_openai_client, get_cosmos_client, "azure.cosmos.aio", "azure.storage.blob.aio",
+                 pdf_render.get_page_template, "reportlab.pdfgen.canvas")
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+
+from . import pdf_render, readiness, result_cache, telemetry
+
+# Clientes asíncronos compartidos (inicialización lazy, un único event loop por worker).
+# Los SDKs se importan al crear el cliente o al manejar sus errores, no al cargar la función
+_cosmos = None
+_container = None
+_blob_service = None
+
+
+def get_container():
+    """Inicializa el contenedor Cosmos asíncrono de forma lazy"""
+    global _cosmos, _container
+    if _container is None:
+        from azure.cosmos.aio import CosmosClient
+        from . import fix_cosmos_key
+        _cosmos = CosmosClient(os.environ["COSMOS_URL"], credential=fix_cosmos_key(os.environ["COSMOS_KEY"]))
+        db = _cosmos.get_database_client(os.environ["COSMOS_DB"])
+        _container = db.get_container_client(os.environ["COSMOS_CONTAINER"])
+        logging.info("Cliente Cosmos asíncrono inicializado correctamente")
+    return _container
+
+
+def get_blob_service():
+    """Inicializa el servicio de blob asíncrono de forma lazy"""
+    global _blob_service
+    if _blob_service is None:
+        from azure.storage.blob.aio import BlobServiceClient
+        _blob_service = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
+        logging.info("Servicio Blob asíncrono inicializado correctamente")
+    return _blob_service
+
+
+async def wait_for_embeddings(job_id, inline=None, timeout=readiness.EMBEDDINGS_WAIT_SECONDS):
+    """readiness.wait_for_embeddings_async con el contenedor asíncrono compartido"""
+    return await readiness.wait_for_embeddings_async(get_container(), job_id, timeout=timeout, inline=inline)
+
+
+async def lookup_result(key, job_id):
+    """(blob_name, texto) del resultado cacheado para key, copiado a generated/{job_id}.pdf si hace falta"""
+    blob_service = get_blob_service()
+    entry = await result_cache.lookup_async(get_container(), blob_service, key)
+    if entry is None:
+        return None, None
+    blob_name = await result_cache.materialize_async(blob_service, entry, job_id, os.environ["BLOB_SAS_TOKEN"])
+    return blob_name, entry["text"]
+
+
+async def store_result(key, job_id, text):
+    await result_cache.store_async(get_container(), key, job_id, result_cache.generated_blob_name(job_id), text)
+
+
+async def invalidate_result(key):
+    await result_cache.invalidate_async(get_container(), key)
+
+
+async def render_and_upload_pdf(text, job_id):
+    """Renderiza y sube el PDF (pdf_render.render_to_blob) en un hilo; devuelve blob_name.
+
+    El render es CPU y la subida usa el cliente síncrono: ninguno de los dos bloquea el event loop.
+    """
+    from . import get_blob_service as get_sync_blob_service
+    blob_name = result_cache.generated_blob_name(job_id)
+    blob = get_sync_blob_service().get_blob_client(result_cache.BLOB_CONTAINER, blob_name)
+    with telemetry.span("pdf.render_upload", chars=len(text)) as span:
+        size = await asyncio.to_thread(pdf_render.render_to_blob, text, blob)
+        span.set(bytes=size)
+    logging.info(f"PDF subido: {size} bytes")
+    return blob_name
@@ -0,0 +1,133 @@
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass
+
+# Límites del modelo de embeddings (text-embedding-ada-002 / text-embedding-3-*: 8191 tokens por input)
+MAX_CHUNK_TOKENS = int(os.environ.get("EMBEDDING_CHUNK_TOKENS", "2048"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("EMBEDDING_CHUNK_OVERLAP", "128"))
+TOKENIZER_ENCODING = os.environ.get("EMBEDDING_TOKENIZER", "cl100k_base")
+
+# Fichero BPE del tokenizador incluido en el paquete (lo descarga el workflow de despliegue):
+# sin él tiktoken lo descarga de openaipublic.blob.core.windows.net en cada arranque en frío
+BUNDLED_TIKTOKEN_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktoken_cache")
+
+# Estimación usada cuando tiktoken no está disponible (conservadora para texto en español)
+CHARS_PER_TOKEN = 3
+
+_WORD_RE = re.compile(r"\S+\s*")
+_encoding = None
+_encoding_loaded = False
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: int
+    end: int
+    tokens: int
+
+
+def _get_encoding():
+    """Carga el tokenizador de tiktoken de forma lazy (None si no está instalado)"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            if os.path.isdir(BUNDLED_TIKTOKEN_CACHE):
+                os.environ.setdefault("TIKTOKEN_CACHE_DIR", BUNDLED_TIKTOKEN_CACHE)
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            logging.warning(f"tiktoken no disponible, se estimarán los tokens por caracteres: {e}")
+            _encoding = None
+    return _encoding
+
+
+def _estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def count_tokens(text):
+    """Cuenta los tokens de un texto con el tokenizador del modelo de embeddings"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return _estimate_tokens(text)
+    return len(encoding.encode_ordinary(text))
+
+
+def _word_spans(text, max_tokens):
+    """Divide el texto en palabras (con su espacio final) y parte las que superan el límite"""
+    max_chars = max(1, max_tokens // 2)
+    spans = []
+    for match in _WORD_RE.finditer(text):
+        start, end = match.span()
+        while end - start > max_chars:
+            spans.append((start, start + max_chars))
+            start += max_chars
+        spans.append((start, end))
+    return spans
+
+
+def _span_tokens(text, spans):
+    encoding = _get_encoding()
+    pieces = [text[start:end] for start, end in spans]
+    if encoding is None:
+        return [_estimate_tokens(piece) for piece in pieces]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(pieces)]
+
+
+def chunk_text(text, max_tokens=None, overlap_tokens=None):
+    """Divide un texto en fragmentos de como máximo max_tokens tokens con solapamiento"""
+    max_tokens = max_tokens or MAX_CHUNK_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    spans = _word_spans(text or "", max_tokens)
+    if not spans:
+        return []
+    counts = _span_tokens(text, spans)
+
+    chunks = []
+    first = 0
+    while first < len(spans):
+        last = first
+        tokens = 0
+        while last < len(spans) and (tokens + counts[last] <= max_tokens or last == first):
+            tokens += counts[last]
+            last += 1
+
+        start, end = spans[first][0], spans[last - 1][1]
+        chunks.append(Chunk(text=text[start:end], start=start, end=end, tokens=tokens))
+        if last >= len(spans):
+            break
+
+        # Retroceder hasta cubrir el solapamiento sin volver al inicio del fragmento actual
+        next_first = last
+        overlap = 0
+        while next_first - 1 > first and overlap + counts[next_first - 1] <= overlap_tokens:
+            next_first -= 1
+            overlap += counts[next_first]
+        first = next_first
+
+    return chunks
+
+
+def pool_embeddings(vectors, weights=None):
+    """Media ponderada (por tokens) de los vectores de cada fragmento, normalizada a norma 1"""
+    if not vectors:
+        raise ValueError("No hay vectores que agregar")
+    weights = weights or [1] * len(vectors)
+    total = float(sum(weights)) or float(len(vectors))
+
+    pooled = [0.0] * len(vectors[0])
+    for vector, weight in zip(vectors, weights):
+        factor = weight / total
+        for i, value in enumerate(vector):
+            pooled[i] += value * factor
+
+    norm = math.sqrt(sum(value * value for value in pooled))
+    if norm == 0:
+        return pooled
+    return [value / norm for value in pooled]
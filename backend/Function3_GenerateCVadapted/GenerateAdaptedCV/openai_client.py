@@ -0,0 +1,413 @@
+import asyncio
+import email.utils
+import json
+import logging
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+# Cliente Azure OpenAI con control de cuota: cubos de tokens por TPM/RPM, concurrencia adaptativa
+# (AIMD) y reintentos que respetan Retry-After. Un limitador por despliegue y proceso, compartido
+# entre el cliente síncrono y el asíncrono.
+AZURE_OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-01")
+AZURE_OPENAI_TPM = int(os.environ.get("AZURE_OPENAI_TPM", "120000"))
+AZURE_OPENAI_RPM = int(os.environ.get("AZURE_OPENAI_RPM", "720"))
+# Cuotas por despliegue: {"gpt-4o": {"tpm": 30000, "rpm": 180}}
+AZURE_OPENAI_QUOTAS = json.loads(os.environ.get("AZURE_OPENAI_QUOTAS", "{}"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "6"))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_INITIAL_CONCURRENCY = int(os.environ.get("OPENAI_INITIAL_CONCURRENCY", "4"))
+OPENAI_BACKOFF_BASE = 0.5
+OPENAI_BACKOFF_MAX = 30.0
+# Azure aplica la cuota en ventanas de ~10 s (TPM/6 por ventana): el cubo admite una ventana
+# completa, así que solo se espera cuando la cuota de la ventana se ha agotado de verdad
+RATE_LIMIT_WINDOW_SECONDS = 10.0
+CHARS_PER_TOKEN = 3
+DEFAULT_MAX_TOKENS = 1000
+
+
+class TokenBucket:
+    """Cubo de tokens por minuto con reserva: se descuenta al pedir y se devuelve cuánto esperar"""
+
+    def __init__(self, per_minute, window_seconds=RATE_LIMIT_WINDOW_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * window_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Descuenta amount (el saldo puede quedar negativo) y devuelve los segundos a esperar"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # Una petición mayor que la ventana se adelanta con el cubo lleno: pide prestado el exceso
+            # (el saldo queda negativo y lo pagan las siguientes) sin cambiar la capacidad
+            borrowed = max(0.0, amount - self.capacity)
+            self.tokens -= amount
+            available = self.tokens + borrowed
+            return 0.0 if available >= 0 else -available / self.rate
+
+    def adjust(self, amount):
+        """Corrige una reserva con el consumo real (positivo devuelve tokens, negativo descuenta)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def pause(self, seconds):
+        """Bloquea nuevas reservas durante seconds (tras un 429 con Retry-After)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class AdaptiveConcurrency:
+    """Límite de peticiones en vuelo con incremento aditivo y decremento multiplicativo (AIMD)"""
+
+    def __init__(self, initial=OPENAI_INITIAL_CONCURRENCY, minimum=1, maximum=OPENAI_MAX_CONCURRENCY):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        delay = 0.005
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, success=True):
+        with self._cond:
+            self.in_flight -= 1
+            if success:
+                # +1 por cada "ventana" de peticiones correctas
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def decrease(self):
+        """Reduce a la mitad, como mucho una vez por segundo (un pico de 429 cuenta como uno)"""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= 1.0:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+
+
+class RateLimiter:
+    """Cuota de un despliegue: TPM, RPM, concurrencia adaptativa y métricas"""
+
+    def __init__(self, deployment, tpm, rpm):
+        self.deployment = deployment
+        self.tokens = TokenBucket(tpm)
+        self.requests = TokenBucket(rpm)
+        self.concurrency = AdaptiveConcurrency()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "requests": 0, "succeeded": 0, "throttled": 0, "retries": 0, "failed": 0,
+            "tokens": 0, "limiter_wait_seconds": 0.0, "retry_wait_seconds": 0.0,
+        }
+
+    def reserve(self, estimated_tokens):
+        wait = max(self.tokens.reserve(estimated_tokens), self.requests.reserve(1))
+        self.count("limiter_wait_seconds", wait)
+        return wait
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def throttled(self, delay):
+        self.count("throttled")
+        self.tokens.pause(delay)
+        self.requests.pause(delay)
+        self.concurrency.decrease()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+        stats["concurrency_limit"] = round(self.concurrency.limit, 2)
+        stats["in_flight"] = self.concurrency.in_flight
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(deployment):
+    with _limiters_lock:
+        if deployment not in _limiters:
+            quota = AZURE_OPENAI_QUOTAS.get(deployment, {})
+            _limiters[deployment] = RateLimiter(
+                deployment, quota.get("tpm", AZURE_OPENAI_TPM), quota.get("rpm", AZURE_OPENAI_RPM)
+            )
+        return _limiters[deployment]
+
+
+def stats():
+    """Métricas de todos los despliegues usados por este proceso"""
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+def estimate_tokens(kind, kwargs):
+    if kind == "embeddings":
+        inputs = kwargs.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else inputs or []
+        return max(1, sum(len(text) for text in inputs) // CHARS_PER_TOKEN)
+    prompt = sum(len(str(message.get("content", ""))) for message in kwargs.get("messages", []))
+    return prompt // CHARS_PER_TOKEN + (kwargs.get("max_tokens") or DEFAULT_MAX_TOKENS)
+
+
+def retry_after(error):
+    """Segundos indicados por el servicio en retry-after-ms / retry-after (None si no hay)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "x-ms-retry-after-ms"):
+        if headers.get(name):
+            try:
+                return float(headers[name]) / 1000
+            except ValueError:
+                pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
+    return None
+
+
+def backoff(attempt):
+    return min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _used_tokens(response):
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def _retry_delay(limiter, error, attempt):
+    """Registra el fallo y devuelve cuánto esperar antes de reintentar (None si no se reintenta)"""
+    if attempt >= OPENAI_MAX_RETRIES:
+        return None
+    import openai  # ya cargado: solo se llega aquí tras una llamada del SDK
+    if isinstance(error, openai.RateLimitError):
+        delay = retry_after(error) or backoff(attempt)
+        limiter.throttled(delay)
+    elif isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)):
+        delay = backoff(attempt)
+    else:
+        return None
+    limiter.count("retries")
+    limiter.count("retry_wait_seconds", delay)
+    logging.warning(f"OpenAI {limiter.deployment}: {type(error).__name__}, reintento {attempt + 1} en {delay:.2f}s")
+    return delay
+
+
+def _finish(limiter, estimate, response):
+    used = _used_tokens(response)
+    if used is not None:
+        limiter.tokens.adjust(estimate - used)
+    limiter.count("succeeded")
+    limiter.count("tokens", used if used is not None else estimate)
+
+
+class _LimitedStream:
+    """Stream que ocupa su hueco de concurrencia hasta agotarse, cerrarse o recogerse"""
+
+    def __init__(self, limiter, estimate, stream):
+        self._limiter = limiter
+        self._estimate = estimate
+        self._stream = stream
+        self._iterator = None
+        self._released = False
+
+    def _release(self, success):
+        if self._released:
+            return
+        self._released = True
+        self._limiter.concurrency.release(success=success)
+        if success:
+            _finish(self._limiter, self._estimate, None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._stream)
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self._release(success=True)
+            raise
+        except BaseException:
+            self._release(success=False)
+            raise
+
+    def close(self):
+        # Abandonar el stream a medias no cuenta como éxito ni como fallo para AIMD
+        self._release(success=False)
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self._release(success=False)
+
+
+class _LimitedAsyncStream(_LimitedStream):
+    """Variante asíncrona de _LimitedStream (AsyncStream del SDK)"""
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._stream.__aiter__()
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._release(success=True)
+            raise
+        except BaseException:
+            self._release(success=False)
+            raise
+
+    async def close(self):
+        self._release(success=False)
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class _Endpoint:
+    def __init__(self, owner, kind):
+        self._owner = owner
+        self._kind = kind
+
+    def create(self, **kwargs):
+        return self._owner._request(self._kind, kwargs)
+
+
+class RateLimitedOpenAI:
+    """Misma interfaz que AzureOpenAI para embeddings.create y chat.completions.create"""
+
+    def __init__(self, client):
+        self.raw = client
+        self.embeddings = _Endpoint(self, "embeddings")
+        self.chat = SimpleNamespace(completions=_Endpoint(self, "chat"))
+
+    def _method(self, kind):
+        return self.raw.embeddings.create if kind == "embeddings" else self.raw.chat.completions.create
+
+    def _request(self, kind, kwargs):
+        limiter = get_limiter(kwargs["model"])
+        estimate = estimate_tokens(kind, kwargs)
+        limiter.count("requests")
+        attempt = 0
+        while True:
+            time.sleep(limiter.reserve(estimate))
+            limiter.concurrency.acquire()
+            try:
+                response = self._method(kind)(**kwargs)
+            except Exception as e:
+                limiter.concurrency.release(success=False)
+                limiter.tokens.adjust(estimate)  # la petición fallida no consume cuota
+                delay = _retry_delay(limiter, e, attempt)
+                if delay is None:
+                    limiter.count("failed")
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if kwargs.get("stream"):
+                return _LimitedStream(limiter, estimate, response)
+            limiter.concurrency.release(success=True)
+            _finish(limiter, estimate, response)
+            return response
+
+
+class AsyncRateLimitedOpenAI(RateLimitedOpenAI):
+    """Variante para AsyncAzureOpenAI: create devuelve una corrutina"""
+
+    async def _request(self, kind, kwargs):
+        limiter = get_limiter(kwargs["model"])
+        estimate = estimate_tokens(kind, kwargs)
+        limiter.count("requests")
+        attempt = 0
+        while True:
+            await asyncio.sleep(limiter.reserve(estimate))
+            await limiter.concurrency.acquire_async()
+            try:
+                response = await self._method(kind)(**kwargs)
+            except Exception as e:
+                limiter.concurrency.release(success=False)
+                limiter.tokens.adjust(estimate)  # la petición fallida no consume cuota
+                delay = _retry_delay(limiter, e, attempt)
+                if delay is None:
+                    limiter.count("failed")
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if kwargs.get("stream"):
+                return _LimitedAsyncStream(limiter, estimate, response)
+            limiter.concurrency.release(success=True)
+            _finish(limiter, estimate, response)
+            return response
+
+
+def create_client(asynchronous=False, endpoint=None, api_key=None):
+    """Cliente con control de cuota; los reintentos del SDK se desactivan porque los gestiona esta capa"""
+    import openai  # diferido: el SDK tarda ~0,5 s en importarse y solo hace falta al crear el cliente
+    options = {
+        "api_version": AZURE_OPENAI_API_VERSION,
+        "azure_endpoint": endpoint or os.environ["AZURE_OPENAI_ENDPOINT"],
+        "api_key": api_key or os.environ["AZURE_OPENAI_KEY"],
+        "max_retries": 0,
+    }
+    if asynchronous:
+        return AsyncRateLimitedOpenAI(openai.AsyncAzureOpenAI(**options))
+    return RateLimitedOpenAI(openai.AzureOpenAI(**options))
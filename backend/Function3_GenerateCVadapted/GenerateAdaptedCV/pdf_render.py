@@ -0,0 +1,190 @@
+import base64
+import os
+import uuid
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Renderizado de PDFs con métricas reales de la fuente y subida a blob storage (por bloques si es grande).
+# reportlab se importa en el primer render: las peticiones que no generan PDF no lo cargan
+PDF_BLOCK_SIZE = int(os.environ.get("PDF_BLOCK_SIZE", str(4 * 1024 * 1024)))
+PDF_UPLOAD_CONCURRENCY = int(os.environ.get("PDF_UPLOAD_CONCURRENCY", "4"))
+
+
+class PageTemplate:
+    """Geometría de página y fuente, calculada una vez y compartida entre peticiones"""
+
+    def __init__(self, pagesize=None, font="Helvetica", font_size=10, margin=50, line_height=15):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        self._string_width = stringWidth
+        self.pagesize = pagesize or A4
+        self.font = font
+        self.font_size = font_size
+        self.margin = margin
+        self.line_height = line_height
+        self.width, self.height = self.pagesize
+        self.max_width = self.width - 2 * margin
+        self.lines_per_page = int((self.height - 2 * margin) / line_height)
+        self.space_width = stringWidth(" ", font, font_size)
+        self._word_width = lru_cache(maxsize=16384)(self._measure)
+
+    def _measure(self, word):
+        return self._string_width(word, self.font, self.font_size)
+
+    def _split_word(self, word):
+        """Parte una palabra más ancha que la línea en trozos que quepan"""
+        pieces, current, width = [], "", 0.0
+        for char in word:
+            char_width = self._word_width(char)
+            if current and width + char_width > self.max_width:
+                pieces.append(current)
+                current, width = "", 0.0
+            current += char
+            width += char_width
+        pieces.append(current)
+        return pieces
+
+    def wrap(self, paragraph):
+        """Divide un párrafo en líneas según el ancho medido del texto"""
+        lines, current, width = [], [], 0.0
+        for word in paragraph.split():
+            word_width = self._word_width(word)
+            if word_width > self.max_width:
+                pieces = self._split_word(word)
+                if current:
+                    lines.append(" ".join(current))
+                lines.extend(pieces[:-1])
+                current, width = [pieces[-1]], self._word_width(pieces[-1])
+                continue
+            extra = word_width + (self.space_width if current else 0.0)
+            if current and width + extra > self.max_width:
+                lines.append(" ".join(current))
+                current, width = [word], word_width
+            else:
+                current.append(word)
+                width += extra
+        lines.append(" ".join(current))
+        return lines
+
+    def lines(self, text):
+        for paragraph in text.split("\n"):
+            yield from self.wrap(paragraph)
+
+
+_page_template = None
+
+
+def get_page_template():
+    """Plantilla por defecto, creada en el primer uso"""
+    global _page_template
+    if _page_template is None:
+        _page_template = PageTemplate()
+    return _page_template
+
+
+def render(text, out, template=None):
+    """Escribe el PDF de text en out (cualquier objeto con write)"""
+    from reportlab.pdfgen import canvas
+    template = template or get_page_template()
+    p = canvas.Canvas(out, pagesize=template.pagesize)
+    page = None
+    lines_on_page = 0
+
+    # Un único objeto de texto por página: mucho más barato que un drawString por línea
+    for line in template.lines(text):
+        if page is None or lines_on_page >= template.lines_per_page:
+            if page is not None:
+                p.drawText(page)
+                p.showPage()
+            page = p.beginText(template.margin, template.height - template.margin)
+            page.setFont(template.font, template.font_size, leading=template.line_height)
+            lines_on_page = 0
+        page.textLine(line)
+        lines_on_page += 1
+
+    if page is not None:
+        p.drawText(page)
+    p.save()
+
+
+class BlockBlobWriter:
+    """Objeto de escritura que sube los datos como bloques staged de un block blob.
+
+    Los bloques se suben en paralelo a medida que se escriben; close() confirma la lista.
+    """
+
+    def __init__(self, blob_client, content_type="application/pdf",
+                 block_size=PDF_BLOCK_SIZE, max_concurrency=PDF_UPLOAD_CONCURRENCY):
+        self.blob_client = blob_client
+        self.content_type = content_type
+        self.block_size = block_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._prefix = uuid.uuid4().hex[:16]
+
+    def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _stage(self, block):
+        block_id = base64.b64encode(f"{self._prefix}-{len(self._block_ids):06d}".encode()).decode()
+        self._block_ids.append(block_id)
+        self._futures.append(self._executor.submit(self.blob_client.stage_block, block_id, block))
+
+    def close(self):
+        from azure.storage.blob import BlobBlock, ContentSettings
+        try:
+            if self._buffer or not self._block_ids:
+                self._stage(bytes(self._buffer))
+                self._buffer.clear()
+            for future in self._futures:
+                future.result()
+            self.blob_client.commit_block_list(
+                [BlobBlock(block_id=block_id) for block_id in self._block_ids],
+                content_settings=ContentSettings(content_type=self.content_type)
+            )
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def abort(self):
+        """Descarta la subida sin confirmar la lista de bloques.
+
+        El blob anterior (si existía) no cambia; Azure elimina los bloques sin confirmar a los 7 días.
+        """
+        self._buffer.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def render_to_blob(text, blob_client, template=None):
+    """Renderiza el PDF y lo sube a blob_client; devuelve los bytes subidos.
+
+    reportlab escribe el PDF entero en un único write() al guardar, así que renderizar sobre el
+    blob no transmite nada: un CV normal se sube con una sola petición y solo los PDFs mayores
+    que PDF_BLOCK_SIZE se reparten en bloques staged en paralelo.
+    """
+    from azure.storage.blob import ContentSettings
+    buffer = BytesIO()
+    render(text, buffer, template)
+    data = buffer.getvalue()
+    if len(data) <= PDF_BLOCK_SIZE:
+        blob_client.upload_blob(
+            data, overwrite=True, content_settings=ContentSettings(content_type="application/pdf")
+        )
+        return len(data)
+
+    writer = BlockBlobWriter(blob_client)
+    try:
+        writer.write(data)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.size
@@ -0,0 +1,127 @@
+import logging
+import os
+import random
+import time
+from functools import partial
+
+from . import sansio, telemetry
+from .embedding_codec import decode_embedding
+
+# Espera de embeddings: Function2 publica {job_id}-status cuando termina
+EMBEDDINGS_WAIT_SECONDS = float(os.environ.get("EMBEDDINGS_WAIT_SECONDS", "30"))
+EMBEDDINGS_POLL_INITIAL = float(os.environ.get("EMBEDDINGS_POLL_INITIAL", "0.2"))
+EMBEDDINGS_POLL_MAX = float(os.environ.get("EMBEDDINGS_POLL_MAX", "3"))
+EMBEDDINGS_INLINE_FALLBACK = os.environ.get("EMBEDDINGS_INLINE_FALLBACK", "true").lower() == "true"
+
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class EmbeddingsNotReady(Exception):
+    pass
+
+
+def _read(container, item_id):
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError  # diferido (arranque en frío)
+    with telemetry.span("cosmos.read", item_type=item_id.rsplit("-", 1)[-1]) as span:
+        try:
+            return (yield partial(
+                container.read_item, item_id, partition_key=item_id, response_hook=telemetry.cosmos_hook(span)
+            ))
+        except CosmosResourceNotFoundError as e:
+            span.set(found=False, request_charge=telemetry.cosmos_charge(e.headers))
+            return None
+
+
+def _read_embeddings(container, job_id):
+    cv, job = yield sansio.Parallel(_read(container, f"{job_id}-cv"), _read(container, f"{job_id}-joboffer"))
+    if cv is None or job is None:
+        return None
+    return cv["text"], job["text"], decode_embedding(cv["embedding"]), decode_embedding(job["embedding"])
+
+
+def read_embeddings(container, job_id):
+    """Lee los documentos de CV y oferta (embeddings ya decodificados); None si alguno no existe"""
+    return sansio.run(_read_embeddings(container, job_id))
+
+
+async def read_embeddings_async(container, job_id):
+    """Versión asíncrona de read_embeddings: lee CV y oferta a la vez"""
+    return await sansio.run_async(_read_embeddings(container, job_id))
+
+
+def _wait_for_embeddings(container, job_id, timeout, inline):
+    started = time.monotonic()
+    deadline = started + timeout
+    delay = EMBEDDINGS_POLL_INITIAL
+    attempt = 0
+    while True:
+        attempt += 1
+        if attempt == 1:
+            # El primer intento lee estado, CV y oferta a la vez; después solo se sondea el estado
+            status, result = yield sansio.Parallel(
+                _read(container, f"{job_id}-status"), _read_embeddings(container, job_id)
+            )
+        else:
+            status, result = (yield _read(container, f"{job_id}-status")), None
+        if status is not None and status.get("state") == STATUS_FAILED:
+            # Function2 informó de un fallo: no tiene sentido seguir esperando
+            logging.warning(f"Function2 falló procesando {job_id}: {status.get('error')}")
+            break
+        # Sin documento de estado (versiones anteriores de Function2) se consultan los items directamente
+        if status is None or status.get("state") == STATUS_READY:
+            if result is None:
+                result = yield _read_embeddings(container, job_id)
+            if result is not None:
+                logging.info(f"Embeddings disponibles tras {attempt} intentos")
+                telemetry.annotate(attempts=attempt, waited_ms=(time.monotonic() - started) * 1000)
+                return result
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        yield sansio.Sleep(min(remaining, delay * random.uniform(0.8, 1.2)))
+        delay = min(delay * 2, EMBEDDINGS_POLL_MAX)
+
+    telemetry.annotate(attempts=attempt, waited_ms=(time.monotonic() - started) * 1000)
+    if inline is None or not EMBEDDINGS_INLINE_FALLBACK:
+        raise EmbeddingsNotReady(f"Embeddings no disponibles después de {attempt} intentos")
+    logging.warning(f"Embeddings de {job_id} no disponibles, calculando en línea")
+    telemetry.annotate(inline=True)
+    with telemetry.span("embeddings.inline"):
+        return (yield sansio.Blocking(inline, job_id))
+
+
+def wait_for_embeddings(container, job_id, timeout=EMBEDDINGS_WAIT_SECONDS, inline=None):
+    """Espera al documento de estado de Function2 con backoff exponencial.
+
+    Si el plazo vence (o Function2 falló) y se proporciona `inline`, se calculan los datos
+    en la propia petición.
+    """
+    return sansio.run(_wait_for_embeddings(container, job_id, timeout, inline))
+
+
+async def wait_for_embeddings_async(container, job_id, timeout=EMBEDDINGS_WAIT_SECONDS, inline=None):
+    """Versión asíncrona de wait_for_embeddings para el cliente Cosmos .aio.
+
+    `inline` es la función síncrona de cálculo en línea y se ejecuta en un hilo.
+    """
+    return await sansio.run_async(_wait_for_embeddings(container, job_id, timeout, inline))
+
+
+def load_source_texts(blob_service, job_id, container_name="upload"):
+    """Descarga y extrae el CV y la oferta originales subidos por Function1"""
+    import fitz
+    blob_container = blob_service.get_container_client(container_name)
+    cv_blobs = list(blob_container.list_blobs(name_starts_with=f"cv/cv-{job_id}-"))
+    if not cv_blobs:
+        raise EmbeddingsNotReady(f"No se encontró el CV de {job_id}")
+
+    # Si hay varios CVs para el mismo job se usa el más reciente (igual que el backfill de Function2)
+    cv_blob = max(cv_blobs, key=lambda blob: blob.last_modified)
+    pdf_bytes = blob_container.download_blob(cv_blob.name).readall()
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        cv_text = "".join(page.get_text() for page in doc)
+    job_bytes = blob_container.download_blob(f"joboffer/jobOffer-{job_id}.txt").readall()
+    job_text = job_bytes.decode("utf-8", errors="replace")
+    return cv_text, job_text
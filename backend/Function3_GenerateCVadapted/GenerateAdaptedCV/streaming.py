@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+# Generación en streaming: los tokens se acumulan en un borrador {job_id}-draft que el cliente
+# consulta por long-polling con un cursor (offset de caracteres ya recibidos).
+# El borrador se persiste desde un hilo propio, agrupando tokens por tamaño y por tiempo, y hace de
+# lease: mientras una instancia genera lo renueva, y un reintento que llegue a otra instancia se
+# limita a leerlo en lugar de lanzar una segunda generación.
+STREAM_FLUSH_SECONDS = float(os.environ.get("STREAM_FLUSH_SECONDS", "1.0"))
+STREAM_FLUSH_CHARS = int(os.environ.get("STREAM_FLUSH_CHARS", "512"))
+STREAM_FLUSH_MIN_SECONDS = float(os.environ.get("STREAM_FLUSH_MIN_SECONDS", "0.25"))
+STREAM_POLL_SECONDS = float(os.environ.get("STREAM_POLL_SECONDS", "20"))
+STREAM_LEASE_SECONDS = float(os.environ.get("STREAM_LEASE_SECONDS", "15"))
+STREAM_COALESCE_SECONDS = 0.1
+
+STATE_STREAMING = "streaming"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+_drafts = {}
+_drafts_lock = threading.Lock()
+
+
+class Draft:
+    """Texto generado hasta el momento para un job_id, compartido entre hilos del proceso"""
+
+    def __init__(self, job_id, container):
+        self.job_id = job_id
+        self.container = container
+        self.parts = []
+        self.length = 0
+        self.state = STATE_STREAMING
+        self.url = None
+        self.error = None
+        self._cond = threading.Condition()
+        self._last_flush = 0.0
+        self._flushed_length = 0
+        self._flushed_state = None
+        self._flusher = None
+
+    def text(self):
+        return "".join(self.parts)
+
+    def snapshot(self):
+        with self._cond:
+            return {"text": self.text(), "state": self.state, "url": self.url, "error": self.error}
+
+    def append(self, delta):
+        """Añade texto sin bloquear: la escritura en Cosmos la hace el hilo de persistencia"""
+        with self._cond:
+            self.parts.append(delta)
+            self.length += len(delta)
+            self._cond.notify_all()
+
+    def finish(self, url):
+        with self._cond:
+            self.state = STATE_DONE
+            self.url = url
+            self._cond.notify_all()
+
+    def fail(self, error):
+        with self._cond:
+            self.state = STATE_FAILED
+            self.error = error
+            self._cond.notify_all()
+
+    def _document(self):
+        """Documento {job_id}-draft con el estado actual (se llama con _cond adquirido)"""
+        now = time.time()
+        self._last_flush = time.monotonic()
+        self._flushed_length = self.length
+        self._flushed_state = self.state
+        return {
+            "id": f"{self.job_id}-draft",
+            "type": "draft",
+            "text": self.text(),
+            "state": self.state,
+            "url": self.url,
+            "error": self.error,
+            "lease_until": now + STREAM_LEASE_SECONDS if self.state == STATE_STREAMING else 0,
+            "updated": now
+        }
+
+    def claim(self):
+        """Reclama la generación de job_id en el borrador persistido.
+
+        Devuelve False si otra instancia está generando con el lease vigente. Un borrador terminado,
+        fallido o con el lease caducado se retoma.
+        """
+        # Importación diferida del SDK de Cosmos (arranque en frío)
+        from azure.core import MatchConditions
+        from azure.cosmos.exceptions import (
+            CosmosAccessConditionFailedError,
+            CosmosResourceExistsError,
+            CosmosResourceNotFoundError,
+        )
+        with self._cond:
+            document = self._document()
+        try:
+            self.container.create_item(document)
+            return True
+        except CosmosResourceExistsError:
+            pass
+
+        try:
+            existing = self.container.read_item(document["id"], partition_key=document["id"])
+        except CosmosResourceNotFoundError:
+            return self.claim()
+        if existing.get("state") == STATE_STREAMING and existing.get("lease_until", 0) > time.time():
+            logging.info(f"La generación de {self.job_id} está en curso en otra instancia")
+            return False
+
+        # Retomar: reemplazo condicionado al _etag leído para que solo gane una instancia
+        try:
+            self.container.replace_item(
+                existing["id"], document, etag=existing["_etag"], match_condition=MatchConditions.IfNotModified
+            )
+            return True
+        except CosmosAccessConditionFailedError:
+            logging.info(f"Otra instancia retomó la generación de {self.job_id}")
+            return False
+
+    def flush(self):
+        """Persiste el borrador en Cosmos para que otras instancias puedan servirlo (y renueva el lease)"""
+        with self._cond:
+            document = self._document()
+        try:
+            self.container.upsert_item(document)
+        except Exception as e:
+            logging.warning(f"No se pudo persistir el borrador de {self.job_id}: {e}")
+
+    def _next_flush(self):
+        """Segundos hasta la próxima escritura (0 = ya toca)"""
+        if self.state != self._flushed_state:
+            return 0
+        elapsed = time.monotonic() - self._last_flush
+        # Sin tokens nuevos (p. ej. esperando embeddings) se escribe igualmente para renovar el lease
+        renew = STREAM_LEASE_SECONDS / 3
+        pending = self.length - self._flushed_length
+        if pending == 0:
+            return max(0, renew - elapsed)
+        wait = STREAM_FLUSH_MIN_SECONDS if pending >= STREAM_FLUSH_CHARS else STREAM_FLUSH_SECONDS
+        return max(0, min(wait, renew) - elapsed)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                delay = self._next_flush()
+                while delay != 0:
+                    self._cond.wait(delay)
+                    delay = self._next_flush()
+            self.flush()
+            if self._flushed_state != STATE_STREAMING:
+                return
+
+    def start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop, name=f"draft-{self.job_id}", daemon=True)
+        self._flusher.start()
+
+    def wait_flushed(self, timeout=None):
+        """Espera a que el estado final esté persistido"""
+        if self._flusher is not None:
+            self._flusher.join(timeout)
+
+
+def start(job_id, container, generate):
+    """Lanza generate(draft) en segundo plano si no hay ya una generación activa para job_id.
+
+    Devuelve None si la generación está en curso en otra instancia: el cliente la sigue por poll.
+    """
+    with _drafts_lock:
+        draft = _drafts.get(job_id)
+        if draft is not None and draft.state == STATE_STREAMING:
+            return draft
+        draft = _drafts[job_id] = Draft(job_id, container)
+
+    if not draft.claim():
+        with _drafts_lock:
+            if _drafts.get(job_id) is draft:
+                del _drafts[job_id]
+        return None
+
+    def run():
+        try:
+            generate(draft)
+        except Exception as e:
+            logging.error(f"Error en la generación en streaming de {job_id}: {e}")
+            draft.fail(str(e))
+        finally:
+            if draft.state == STATE_STREAMING:
+                draft.fail("Generación interrumpida")
+            # Tras salir de _drafts las consultas se sirven desde Cosmos: el estado final debe estar escrito
+            draft.wait_flushed()
+            with _drafts_lock:
+                if _drafts.get(job_id) is draft:
+                    del _drafts[job_id]
+
+    draft.start_flusher()
+    threading.Thread(target=run, name=f"stream-{job_id}", daemon=True).start()
+    return draft
+
+
+async def read_stored(container, job_id):
+    """Borrador persistido (cliente Cosmos asíncrono) o None"""
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
+    try:
+        return await container.read_item(f"{job_id}-draft", partition_key=f"{job_id}-draft")
+    except CosmosResourceNotFoundError:
+        return None
+
+
+async def poll(container, job_id, cursor, timeout=STREAM_POLL_SECONDS):
+    """Estado del borrador a partir de cursor: en memoria si se genera en este proceso, si no desde Cosmos.
+
+    La espera es asíncrona: el long-poll no retiene un hilo del worker.
+    """
+    deadline = time.monotonic() + timeout
+    delay = STREAM_COALESCE_SECONDS
+    while True:
+        draft = _drafts.get(job_id)
+        if draft is not None:
+            snapshot = draft.snapshot()
+        else:
+            snapshot = await read_stored(container, job_id)
+            # Fuera de este proceso el borrador cambia como mucho una vez por flush
+            delay = max(delay, STREAM_FLUSH_MIN_SECONDS)
+        if snapshot is not None and (len(snapshot["text"]) > cursor or snapshot["state"] != STATE_STREAMING):
+            if draft is not None and snapshot["state"] == STATE_STREAMING:
+                # Pequeña ventana para agrupar varios tokens en la misma respuesta
+                await asyncio.sleep(STREAM_COALESCE_SECONDS)
+                snapshot = draft.snapshot()
+            return snapshot
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return snapshot
+        await asyncio.sleep(min(remaining, delay))
+        if draft is None:
+            delay = min(delay * 2, 2.0)
+
+
+def format_events(snapshot, cursor):
+    """Serializa el progreso como eventos SSE; el cliente reconecta con el nuevo cursor"""
+    if snapshot is None:
+        return "retry: 500\nevent: waiting\ndata: {}\n\n", cursor
+    text = snapshot["text"]
+    events = ["retry: 250\n"]
+    if len(text) > cursor:
+        events.append(f"event: token\ndata: {json.dumps({'text': text[cursor:], 'cursor': len(text)})}\n\n")
+        cursor = len(text)
+    if snapshot["state"] == STATE_DONE:
+        events.append(f"event: done\ndata: {json.dumps({'generatedCvUrl': snapshot['url']})}\n\n")
+    elif snapshot["state"] == STATE_FAILED:
+        events.append(f"event: error\ndata: {json.dumps({'error': snapshot['error']})}\n\n")
+    if len(events) == 1:
+        events.append("event: ping\ndata: {}\n\n")
+    return "".join(events), cursor
@@ -0,0 +1,60 @@
+import importlib
+import logging
+import os
+import threading
+import time
+
+# Precarga en segundo plano tras importar la función: los módulos y clientes pesados se cargan
+# en su primer uso, y con STARTUP_WARMUP=true se adelanta ese trabajo mientras llega la petición
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "false").lower() == "true"
+
+_thread = None
+_lock = threading.Lock()
+_timings = {}
+
+
+def _step_name(step):
+    return step if isinstance(step, str) else getattr(step, "__name__", repr(step))
+
+
+def _run(steps):
+    started = time.perf_counter()
+    for step in steps:
+        step_started = time.perf_counter()
+        try:
+            if isinstance(step, str):
+                importlib.import_module(step)
+            else:
+                step()
+        except Exception as e:
+            # La petición que lo necesite volverá a intentarlo en su primer uso
+            logging.warning(f"Precarga de {_step_name(step)} fallida: {e}")
+        _timings[_step_name(step)] = (time.perf_counter() - step_started) * 1000
+    logging.info(f"🔥 Precarga completada en {time.perf_counter() - started:.2f}s: "
+                 f"{ {name: round(ms) for name, ms in _timings.items()} }")
+
+
+def start(*steps):
+    """Lanza una vez por proceso un hilo daemon que ejecuta los pasos en orden.
+
+    Cada paso es el nombre de un módulo a importar o un callable sin argumentos (p. ej. un get_*).
+    """
+    global _thread
+    with _lock:
+        if _thread is None and steps:
+            _thread = threading.Thread(target=_run, args=(steps,), name="genesis-warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def wait(timeout=None):
+    """Espera a que termine la precarga (si se lanzó); devuelve False si sigue en curso"""
+    if _thread is None:
+        return True
+    _thread.join(timeout)
+    return not _thread.is_alive()
+
+
+def timings():
+    """Duración en ms de cada paso de precarga completado"""
+    return dict(_timings)
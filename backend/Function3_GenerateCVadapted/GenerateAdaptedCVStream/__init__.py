@@ -0,0 +1,112 @@
+import logging, os, json, asyncio
+import azure.functions as func
+from ..GenerateAdaptedCV import (
+    get_openai_client, get_cosmos_client, wait_for_embeddings, cosine_sim,
+    build_prompt, select_context, render_and_upload_pdf, get_result_key, get_cached_result, store_result
+)
+from ..GenerateAdaptedCV import aio
+from ..GenerateAdaptedCV import streaming
+from ..GenerateAdaptedCV import telemetry
+
+def generate_streaming(draft):
+    """Genera el CV token a token y, al cerrar el stream, renderiza y sube el PDF"""
+    job_id = draft.job_id
+    with telemetry.job_trace(job_id, "GenerateAdaptedCVStream"):
+        with telemetry.span("wait_for_embeddings"):
+            cv_text, job_text, cv_embed, job_embed = wait_for_embeddings(job_id)
+        sim = cosine_sim(cv_embed, job_embed)
+        logging.info(f"Similaridad calculada: {sim:.2f}")
+
+        cache_key = get_result_key(cv_text, job_text)
+        url, text = get_cached_result(cache_key, job_id)
+        if url:
+            logging.info(f"Resultado servido desde caché para job_id: {job_id}")
+            draft.append(text)
+            draft.finish(url)
+            return
+
+        cv_context, job_context = select_context(cv_text, job_text, job_embed)
+        client = get_openai_client()
+        with telemetry.span("openai.chat", stream=True) as span:
+            stream = client.chat.completions.create(
+                model=os.environ["AZURE_OPENAI_DEPLOYMENT"],
+                messages=[{"role": "user", "content": build_prompt(cv_context, job_context, sim)}],
+                temperature=0.7,
+                max_tokens=2000,
+                stream=True
+            )
+            deltas = 0
+            with stream:  # libera el hueco de concurrencia aunque se corte a medias
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        draft.append(chunk.choices[0].delta.content)
+                        deltas += 1
+                        if deltas == 1:
+                            span.set(first_token_ms=span.elapsed_ms())
+            span.set(deltas=deltas, chars=len(draft.text()))
+        logging.info("CV generado correctamente (streaming)")
+
+        with telemetry.span("pdf.render_upload"):
+            url = render_and_upload_pdf(draft.text(), job_id)
+        logging.info(f"PDF generado y subido: {url}")
+        store_result(cache_key, job_id, draft.text())
+        draft.finish(url)
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info("Function 3 — GenerateAdaptedCVStream ejecutándose...")
+
+    cors_headers = {
+        "Access-Control-Allow-Origin": "https://red-sand-04619bc10.6.azurestaticapps.net",
+        "Access-Control-Allow-Methods": "POST, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, Ocp-Apim-Subscription-Key",
+        "Access-Control-Max-Age": "86400"
+    }
+
+    if req.method == "OPTIONS":
+        return func.HttpResponse("", status_code=200, headers=cors_headers)
+
+    try:
+        request_json = req.get_json()
+        job_id = request_json.get("jobId")
+        cursor = request_json.get("cursor")
+    except Exception as e:
+        logging.error(f"Error procesando request: {e}")
+        return func.HttpResponse(
+            json.dumps({"error": "Request inválido"}),
+            status_code=400,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
+
+    if not job_id:
+        return func.HttpResponse(
+            json.dumps({"error": "Falta jobId"}),
+            status_code=400,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
+
+    try:
+        # Sin cursor se inicia la generación; con cursor el cliente reconecta para recibir más tokens
+        if cursor is None:
+            _, container = await asyncio.to_thread(get_cosmos_client)
+            await asyncio.to_thread(streaming.start, job_id, container, generate_streaming)
+            cursor = 0
+
+        snapshot = await streaming.poll(aio.get_container(), job_id, int(cursor))
+        body, _ = streaming.format_events(snapshot, int(cursor))
+        return func.HttpResponse(
+            body,
+            status_code=200,
+            headers={**cors_headers, "Cache-Control": "no-cache"},
+            mimetype="text/event-stream"
+        )
+
+    except Exception as e:
+        logging.error(f"Error general en GenerateAdaptedCVStream: {e}")
+        return func.HttpResponse(
+            json.dumps({"error": f"Error interno: {str(e)}"}),
+            status_code=500,
+            headers=cors_headers,
+            mimetype="application/json"
+        )
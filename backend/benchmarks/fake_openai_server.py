@@ -0,0 +1,204 @@
+"""Servidor local que imita la API de Azure OpenAI (embeddings y chat completions) con cuotas.
+
+Uso:
+    python backend/benchmarks/fake_openai_server.py --port 8089 --tpm 60000 --rpm 300
+
+Después, AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 y cualquier AZURE_OPENAI_KEY.
+Aplica TPM/RPM en ventanas deslizantes de 10 s (como Azure) y responde 429 con retry-after-ms y
+retry-after. Los embeddings son deterministas (derivados del hash del texto); el chat devuelve un
+texto derivado del prompt, también en streaming (SSE).
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WINDOW_SECONDS = 10
+CHARS_PER_TOKEN = 4
+_PATH_RE = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/(?P<op>embeddings|chat/completions)")
+
+
+class Quota:
+    """Ventana deslizante de peticiones y tokens; check devuelve los segundos a esperar o 0"""
+
+    def __init__(self, tpm, rpm):
+        self.tokens_limit = tpm * WINDOW_SECONDS / 60
+        self.requests_limit = max(1, rpm * WINDOW_SECONDS / 60)
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "tokens": 0}
+
+    def check(self, tokens):
+        with self.lock:
+            now = time.monotonic()
+            while self.events and now - self.events[0][0] > WINDOW_SECONDS:
+                self.events.popleft()
+            used = sum(t for _, t in self.events)
+            self.stats["requests"] += 1
+            if len(self.events) + 1 > self.requests_limit or used + tokens > self.tokens_limit:
+                self.stats["throttled"] += 1
+                oldest = self.events[0][0] if self.events else now
+                return max(0.05, WINDOW_SECONDS - (now - oldest))
+            self.events.append((now, tokens))
+            self.stats["tokens"] += tokens
+            return 0.0
+
+
+def fake_embedding(text, dim):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def count_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def make_handler(server_options, quotas):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/stats"):
+                return self._json(200, {name: quota.stats for name, quota in quotas.items()})
+            self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            match = _PATH_RE.match(self.path)
+            length = int(self.headers.get("Content-Length", "0"))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not match:
+                return self._json(404, {"error": {"code": "404", "message": "Resource not found"}})
+            deployment, op = match.group("deployment"), match.group("op")
+            quota = quotas.setdefault(deployment, Quota(server_options.tpm, server_options.rpm))
+
+            if op == "embeddings":
+                inputs = request.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                tokens = sum(count_tokens(text) for text in inputs)
+            else:
+                prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+                tokens = count_tokens(prompt) + int(request.get("max_tokens") or 256)
+
+            wait = quota.check(tokens)
+            if wait:
+                return self._json(429, {"error": {"code": "429", "message": "Rate limit is exceeded."}}, {
+                    "retry-after-ms": str(int(wait * 1000)),
+                    "retry-after": str(math.ceil(wait)),
+                })
+            time.sleep(server_options.latency_ms / 1000 * random.uniform(0.8, 1.2))
+
+            if op == "embeddings":
+                return self._json(200, {
+                    "object": "list",
+                    "model": deployment,
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": fake_embedding(text, server_options.dim)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+            return self._chat(deployment, request, prompt)
+
+        def _chat(self, deployment, request, prompt):
+            words = prompt.split()[:server_options.completion_words]
+            content = "CV ADAPTADO\n" + " ".join(words)
+            completion_id = f"chatcmpl-{hashlib.md5(prompt.encode()).hexdigest()[:12]}"
+            prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(content)
+            if not request.get("stream"):
+                return self._json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": deployment,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            pieces = re.findall(r"\S+\s*", content)
+            for index, piece in enumerate(pieces + [None]):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": deployment,
+                    "choices": [{"index": 0, "delta": {"content": piece} if piece else {},
+                                 "finish_reason": None if piece else "stop"}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                if piece:
+                    time.sleep(server_options.token_delay_ms / 1000)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def parser():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8089)
+    p.add_argument("--tpm", type=int, default=60000)
+    p.add_argument("--rpm", type=int, default=300)
+    p.add_argument("--dim", type=int, default=1536)
+    p.add_argument("--latency-ms", type=float, default=50)
+    p.add_argument("--token-delay-ms", type=float, default=5)
+    p.add_argument("--completion-words", type=int, default=200)
+    return p
+
+
+def start(options=None, **overrides):
+    """Arranca el servidor en un hilo; devuelve (server, endpoint). Útil desde otros benchmarks"""
+    options = options or parser().parse_args([])
+    for name, value in overrides.items():
+        setattr(options, name, value)
+    quotas = {}
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(options, quotas))
+    server.daemon_threads = True
+    server.quotas = quotas
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://{options.host}:{server.server_address[1]}"
+
+
+def main():
+    options = parser().parse_args()
+    server, endpoint = start(options)
+    print(f"🤖 Azure OpenAI simulado en {endpoint} (TPM {options.tpm}, RPM {options.rpm}); Ctrl+C para parar")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,563 @@
+"""Sustitutos locales de los servicios de Azure para ejecutar las funciones sin conexión.
+
+- BlobStore: almacén de blobs en memoria con ETag, servido por HTTP con rutas estilo Azurite
+  (http://127.0.0.1:{puerto}/{cuenta}/{contenedor}/{blob}) y con clientes compatibles con
+  azure.storage.blob (síncrono y asíncrono) para el código que usa el SDK.
+- MemoryCosmos: contenedores de Cosmos DB en memoria (read/create/upsert/replace/delete con _etag
+  y las excepciones reales de azure.cosmos), con cliente síncrono y asíncrono.
+- install(): sustituye CosmosClient y BlobServiceClient del SDK por estos clientes; debe llamarse
+  antes de importar las funciones, que los importan a nivel de módulo.
+- build_tiny_seq2seq(): T5 diminuto con pesos aleatorios y tokenizer propio para medir el
+  pipeline text2text sin descargar modelos.
+
+Cada operación puede añadir una latencia fija (latency_ms) para simular la red.
+"""
+import asyncio
+import copy
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+DEFAULT_ACCOUNT = "devstoreaccount1"
+
+# Coste aproximado en RU de Cosmos DB (lectura puntual ~1 RU/KB, escritura ~5 RU/KB)
+READ_RU_PER_KB = 1.0
+WRITE_RU_PER_KB = 5.0
+
+
+# ---------------------------------------------------------------------------
+# Blob storage
+# ---------------------------------------------------------------------------
+
+class StoredBlob:
+    __slots__ = ("data", "etag", "last_modified", "content_type")
+
+    def __init__(self, data, content_type):
+        self.data = bytes(data)
+        self.etag = f'"0x{uuid.uuid4().hex[:15].upper()}"'
+        self.last_modified = datetime.now(timezone.utc)
+        self.content_type = content_type
+
+
+class BlobProperties:
+    """Subconjunto de azure.storage.blob.BlobProperties usado por las funciones"""
+
+    def __init__(self, container, name, blob):
+        self.container = container
+        self.name = name
+        self.etag = blob.etag
+        self.last_modified = blob.last_modified
+        self.size = len(blob.data)
+
+
+class BlobStore:
+    """Blobs en memoria: {(contenedor, nombre): StoredBlob}, más los bloques pendientes de confirmar"""
+
+    def __init__(self, account=DEFAULT_ACCOUNT, latency_ms=0.0):
+        self.account = account
+        self.latency = latency_ms / 1000
+        self.endpoint = None
+        self._blobs = {}
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put(self, container, name, data, content_type="application/octet-stream"):
+        self._wait()
+        with self._lock:
+            blob = self._blobs[(container, name)] = StoredBlob(data, content_type)
+            self.stats["put"] += 1
+            self.stats["bytes_in"] += len(blob.data)
+        return blob.etag
+
+    def get(self, container, name):
+        self._wait()
+        with self._lock:
+            blob = self._blobs.get((container, name))
+            self.stats["get"] += 1
+            if blob is not None:
+                self.stats["bytes_out"] += len(blob.data)
+        if blob is None:
+            raise ResourceNotFoundError(f"The specified blob does not exist: {container}/{name}")
+        return blob
+
+    def head(self, container, name):
+        self._wait()
+        with self._lock:
+            blob = self._blobs.get((container, name))
+            self.stats["head"] += 1
+        if blob is None:
+            raise ResourceNotFoundError(f"The specified blob does not exist: {container}/{name}")
+        return blob
+
+    def list(self, container, prefix=""):
+        self._wait()
+        with self._lock:
+            return [
+                BlobProperties(c, name, blob) for (c, name), blob in sorted(self._blobs.items())
+                if c == container and name.startswith(prefix)
+            ]
+
+    def stage_block(self, container, name, block_id, data):
+        self._wait()
+        with self._lock:
+            self._blocks.setdefault((container, name), {})[block_id] = bytes(data)
+
+    def commit_blocks(self, container, name, block_ids, content_type):
+        with self._lock:
+            staged = self._blocks.pop((container, name), {})
+        return self.put(container, name, b"".join(staged[block_id] for block_id in block_ids), content_type)
+
+    def copy(self, source_url, container, name):
+        source_container, source_name = self.parse_url(source_url)
+        blob = self.get(source_container, source_name)
+        return self.put(container, name, blob.data, blob.content_type)
+
+    def url(self, container, name):
+        return f"{self.endpoint or f'http://127.0.0.1/{self.account}'}/{container}/{name}"
+
+    def parse_url(self, url):
+        """(contenedor, blob) de una URL de Azure (https://{cuenta}.blob...) o estilo Azurite"""
+        path = unquote(urlparse(url).path).lstrip("/")
+        if path.startswith(f"{self.account}/"):
+            path = path[len(self.account) + 1:]
+        container, _, name = path.partition("/")
+        return container, name
+
+    def connection_string(self):
+        return (f"DefaultEndpointsProtocol=http;AccountName={self.account};"
+                f"AccountKey=bG9jYWw=;BlobEndpoint={self.endpoint}")
+
+
+def _blob_handler(store):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _headers(self, blob, status=200):
+            self.send_response(status)
+            self.send_header("Content-Type", blob.content_type)
+            self.send_header("Content-Length", str(len(blob.data)))
+            self.send_header("ETag", blob.etag)
+            self.send_header("Last-Modified", format_datetime(blob.last_modified, usegmt=True))
+            self.end_headers()
+
+        def _not_found(self):
+            body = b"BlobNotFound"
+            self.send_response(404)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_GET(self):
+            try:
+                blob = store.get(*store.parse_url(self.path))
+            except ResourceNotFoundError:
+                return self._not_found()
+            self._headers(blob)
+            self.wfile.write(blob.data)
+
+        def do_HEAD(self):
+            try:
+                blob = store.head(*store.parse_url(self.path))
+            except ResourceNotFoundError:
+                return self._not_found()
+            self._headers(blob)
+
+        def do_PUT(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            data = self.rfile.read(length)
+            container, name = store.parse_url(self.path)
+            etag = store.put(container, name, data, self.headers.get("Content-Type", "application/octet-stream"))
+            self.send_response(201)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    return Handler
+
+
+def start_blob_server(store, host="127.0.0.1", port=0):
+    """Sirve el BlobStore por HTTP en un hilo; fija store.endpoint y devuelve el servidor"""
+    server = ThreadingHTTPServer((host, port), _blob_handler(store))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="blob-store", daemon=True).start()
+    store.endpoint = f"http://{host}:{server.server_address[1]}/{store.account}"
+    return server
+
+
+class _Download:
+    def __init__(self, data):
+        self._data = data
+
+    def readall(self):
+        return self._data
+
+
+class MemoryBlobClient:
+    def __init__(self, store, container, name):
+        self.store = store
+        self.container_name = container
+        self.blob_name = name
+        self.url = store.url(container, name)
+
+    def upload_blob(self, data, overwrite=False, content_type=None, content_settings=None, **kwargs):
+        if hasattr(data, "read"):
+            data = data.read()
+        if content_settings is not None:
+            content_type = content_settings.content_type
+        etag = self.store.put(self.container_name, self.blob_name, data, content_type or "application/octet-stream")
+        return {"etag": etag}
+
+    def stage_block(self, block_id, data, **kwargs):
+        self.store.stage_block(self.container_name, self.blob_name, block_id, data)
+
+    def commit_block_list(self, block_list, content_settings=None, **kwargs):
+        ids = [block.id if hasattr(block, "id") else block for block in block_list]
+        content_type = content_settings.content_type if content_settings else "application/octet-stream"
+        return {"etag": self.store.commit_blocks(self.container_name, self.blob_name, ids, content_type)}
+
+    def get_blob_properties(self, **kwargs):
+        return BlobProperties(self.container_name, self.blob_name, self.store.head(self.container_name, self.blob_name))
+
+    def download_blob(self, **kwargs):
+        return _Download(self.store.get(self.container_name, self.blob_name).data)
+
+    def upload_blob_from_url(self, source_url, overwrite=False, **kwargs):
+        return {"etag": self.store.copy(source_url, self.container_name, self.blob_name)}
+
+
+class MemoryContainerClient:
+    def __init__(self, store, container):
+        self.store = store
+        self.container_name = container
+
+    def get_blob_client(self, name):
+        return MemoryBlobClient(self.store, self.container_name, name)
+
+    def list_blobs(self, name_starts_with=""):
+        return self.store.list(self.container_name, name_starts_with or "")
+
+    def download_blob(self, name, **kwargs):
+        return self.get_blob_client(name).download_blob()
+
+
+class MemoryBlobServiceClient:
+    """Sustituto de azure.storage.blob.BlobServiceClient sobre el BlobStore instalado"""
+
+    store = None
+
+    def __init__(self, store=None):
+        self.store = store or type(self).store
+
+    @classmethod
+    def from_connection_string(cls, connection_string, **kwargs):
+        return cls()
+
+    def get_blob_client(self, container, blob):
+        return MemoryBlobClient(self.store, container, blob)
+
+    def get_container_client(self, container):
+        return MemoryContainerClient(self.store, container)
+
+
+class _AsyncBlobClient:
+    """Versión asíncrona: cada operación se ejecuta en un hilo para no bloquear el event loop"""
+
+    def __init__(self, blob_client):
+        self._blob = blob_client
+        self.url = blob_client.url
+
+    def __getattr__(self, name):
+        method = getattr(self._blob, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+    async def upload_blob(self, data, **kwargs):
+        kwargs.pop("max_concurrency", None)
+        return await asyncio.to_thread(self._blob.upload_blob, data, **kwargs)
+
+
+class AsyncMemoryBlobServiceClient(MemoryBlobServiceClient):
+    """Sustituto de azure.storage.blob.aio.BlobServiceClient"""
+
+    def get_blob_client(self, container, blob):
+        return _AsyncBlobClient(super().get_blob_client(container, blob))
+
+    async def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Cosmos DB
+# ---------------------------------------------------------------------------
+
+class MemoryContainer:
+    """Contenedor de Cosmos DB en memoria (partición /id) con concurrencia optimista por _etag.
+
+    Como el SDK, entrega el coste (estimado) en RU en la cabecera x-ms-request-charge: al
+    response_hook de cada operación o en error.headers cuando falla.
+    """
+
+    def __init__(self, name, latency_ms=0.0):
+        self.id = name
+        self.latency = latency_ms / 1000
+        self._items = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _wait(self, operation):
+        self.stats[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _charge(self, item, per_kb):
+        kilobytes = len(json.dumps(item, default=str)) / 1024 if item is not None else 0
+        charge = round(max(1.0, per_kb * kilobytes), 2)
+        self.stats["request_charge"] += charge
+        return {"x-ms-request-charge": str(charge)}
+
+    def _store(self, body):
+        item = copy.deepcopy(body)
+        item["_etag"] = f'"{uuid.uuid4()}"'
+        item["_ts"] = int(time.time())
+        self._items[item["id"]] = item
+        return copy.deepcopy(item)
+
+    @staticmethod
+    def _respond(headers, result, kwargs):
+        hook = kwargs.get("response_hook")
+        if hook is not None:
+            hook(headers, result)
+        return result
+
+    @staticmethod
+    def _fail(error_type, headers, status_code, message):
+        error = error_type(status_code=status_code, message=message)
+        error.headers = headers
+        return error
+
+    def read_item(self, item, partition_key=None, **kwargs):
+        self._wait("read")
+        with self._lock:
+            found = self._items.get(item)
+            headers = self._charge(found, READ_RU_PER_KB)
+            if found is None:
+                raise self._fail(CosmosResourceNotFoundError, headers, 404, f"Entity with id {item} not found")
+            return self._respond(headers, copy.deepcopy(found), kwargs)
+
+    def create_item(self, body, **kwargs):
+        self._wait("create")
+        with self._lock:
+            headers = self._charge(body, WRITE_RU_PER_KB)
+            if body["id"] in self._items:
+                raise self._fail(CosmosResourceExistsError, headers, 409, f"Entity with id {body['id']} already exists")
+            return self._respond(headers, self._store(body), kwargs)
+
+    def upsert_item(self, body, **kwargs):
+        self._wait("upsert")
+        with self._lock:
+            headers = self._charge(body, WRITE_RU_PER_KB)
+            return self._respond(headers, self._store(body), kwargs)
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        self._wait("replace")
+        with self._lock:
+            current = self._items.get(item)
+            headers = self._charge(body, WRITE_RU_PER_KB)
+            if current is None:
+                raise self._fail(CosmosResourceNotFoundError, headers, 404, f"Entity with id {item} not found")
+            if etag is not None and match_condition is not None and current["_etag"] != etag:
+                raise self._fail(CosmosAccessConditionFailedError, headers, 412, "Precondition failed")
+            return self._respond(headers, self._store(body), kwargs)
+
+    def delete_item(self, item, partition_key=None, **kwargs):
+        self._wait("delete")
+        with self._lock:
+            headers = self._charge(None, WRITE_RU_PER_KB)
+            if self._items.pop(item, None) is None:
+                raise self._fail(CosmosResourceNotFoundError, headers, 404, f"Entity with id {item} not found")
+            self._respond(headers, None, kwargs)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class AsyncMemoryContainer:
+    """Vista asíncrona de un MemoryContainer (las operaciones se ejecutan en un hilo)"""
+
+    def __init__(self, container):
+        self._container = container
+        self.id = container.id
+
+    def __getattr__(self, name):
+        method = getattr(self._container, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+
+class MemoryCosmos:
+    """Cuenta de Cosmos en memoria: un MemoryContainer por nombre, compartido entre clientes"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self._containers = {}
+        self._lock = threading.Lock()
+
+    def container(self, name):
+        with self._lock:
+            if name not in self._containers:
+                self._containers[name] = MemoryContainer(name, self.latency_ms)
+            return self._containers[name]
+
+    def stats(self):
+        return {name: dict(container.stats) for name, container in self._containers.items()}
+
+
+class _MemoryDatabase:
+    def __init__(self, cosmos, asynchronous):
+        self._cosmos = cosmos
+        self._asynchronous = asynchronous
+
+    def get_container_client(self, name):
+        container = self._cosmos.container(name)
+        return AsyncMemoryContainer(container) if self._asynchronous else container
+
+    def create_container_if_not_exists(self, id, partition_key=None, **kwargs):
+        return self.get_container_client(id)
+
+
+class MemoryCosmosClient:
+    """Sustituto de azure.cosmos.CosmosClient sobre la MemoryCosmos instalada"""
+
+    cosmos = None
+    asynchronous = False
+
+    def __init__(self, url=None, credential=None, **kwargs):
+        self._cosmos = type(self).cosmos
+
+    def get_database_client(self, name):
+        return _MemoryDatabase(self._cosmos, self.asynchronous)
+
+    def close(self):
+        pass
+
+
+class AsyncMemoryCosmosClient(MemoryCosmosClient):
+    """Sustituto de azure.cosmos.aio.CosmosClient"""
+
+    asynchronous = True
+
+    async def close(self):
+        pass
+
+
+@contextmanager
+def install(store, cosmos):
+    """Sustituye los clientes de Cosmos y Blob del SDK por los locales mientras dure el bloque"""
+    import azure.cosmos
+    import azure.cosmos.aio
+    import azure.storage.blob
+    import azure.storage.blob.aio
+
+    MemoryBlobServiceClient.store = store
+    MemoryCosmosClient.cosmos = cosmos
+    replacements = [
+        (azure.cosmos, "CosmosClient", MemoryCosmosClient),
+        (azure.cosmos.aio, "CosmosClient", AsyncMemoryCosmosClient),
+        (azure.storage.blob, "BlobServiceClient", MemoryBlobServiceClient),
+        (azure.storage.blob.aio, "BlobServiceClient", AsyncMemoryBlobServiceClient),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in replacements]
+    for module, name, replacement in replacements:
+        setattr(module, name, replacement)
+    try:
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+
+def azure_blob_adapter(store):
+    """Adaptador de requests que redirige https://{cuenta}.blob.core.windows.net al BlobStore local"""
+    from requests.adapters import HTTPAdapter
+
+    class AzuriteAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            parsed = urlparse(request.url)
+            request.url = f"{store.endpoint}{parsed.path}" + (f"?{parsed.query}" if parsed.query else "")
+            return super().send(request, **kwargs)
+
+    return AzuriteAdapter()
+
+
+# ---------------------------------------------------------------------------
+# Modelo seq2seq diminuto
+# ---------------------------------------------------------------------------
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def build_tiny_seq2seq(target_dir, texts, vocab_size=4000, d_model=64, layers=2, max_length=512, seed=0):
+    """Guarda en target_dir un T5 con pesos aleatorios y un tokenizer WordLevel entrenado con texts.
+
+    Tiene la misma interfaz que los modelos registrados (config.json, model.safetensors,
+    tokenizer.json), así que recorre el mismo camino de carga e inferencia que el modelo real.
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+
+    specials = ["<pad>", "</s>", "<unk>"]
+    counts = Counter(word for text in texts for word in _WORD_RE.findall(text))
+    vocab = {token: i for i, token in enumerate(specials)}
+    for word, _ in counts.most_common(vocab_size - len(specials)):
+        vocab[word] = len(vocab)
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split(_WORD_RE.pattern, behavior="isolated")
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="$A </s>", special_tokens=[("</s>", vocab["</s>"])]
+    )
+    fast = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>",
+        model_max_length=max_length
+    )
+
+    torch.manual_seed(seed)
+    config = T5Config(
+        vocab_size=len(vocab), d_model=d_model, d_kv=d_model // 4, d_ff=d_model * 2,
+        num_layers=layers, num_decoder_layers=layers, num_heads=4,
+        pad_token_id=vocab["<pad>"], eos_token_id=vocab["</s>"], decoder_start_token_id=vocab["<pad>"]
+    )
+    model = T5ForConditionalGeneration(config)
+    os.makedirs(target_dir, exist_ok=True)
+    model.save_pretrained(target_dir, safe_serialization=True)
+    fast.save_pretrained(target_dir)
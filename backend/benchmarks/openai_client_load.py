@@ -0,0 +1,103 @@
+"""Prueba de carga del cliente OpenAI con control de cuota contra el servidor simulado.
+
+Uso:
+    python backend/benchmarks/openai_client_load.py --requests 300 --threads 32 --tpm 60000 --rpm 300
+
+Lanza una ráfaga de peticiones de embeddings contra fake_openai_server (arrancado en el propio
+proceso, o uno externo con --endpoint) con dos clientes:
+- sdk: AzureOpenAI con sus reintentos por defecto (sin conocer la cuota).
+- limited: openai_client.create_client (TPM/RPM + AIMD + Retry-After).
+Informa de peticiones completadas, errores, 429 recibidos por el servidor y throughput.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OPENAI_CLIENT_PATH = os.path.join(HERE, "..", "Function2_GenerateEmbeddings", "GenerateEmbeddings", "openai_client.py")
+sys.path.insert(0, HERE)
+
+import fake_openai_server  # noqa: E402
+
+
+def load_openai_client():
+    spec = importlib.util.spec_from_file_location("openai_client", OPENAI_CLIENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def server_stats(endpoint):
+    with urllib.request.urlopen(f"{endpoint}/stats") as response:
+        return json.load(response)
+
+
+def run(client, deployment, texts, threads):
+    def call(text):
+        try:
+            client.embeddings.create(input=[text], model=deployment)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(call, texts))
+    return sum(results), len(results) - sum(results), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", help="servidor externo (por defecto se arranca uno local)")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--tpm", type=int, default=60000)
+    parser.add_argument("--rpm", type=int, default=300)
+    parser.add_argument("--chars", type=int, default=2000, help="longitud de cada texto")
+    parser.add_argument("--clients", default="sdk,limited")
+    args = parser.parse_args()
+
+    # La cuota del limitador se configura igual que en las funciones, por entorno
+    os.environ.setdefault("AZURE_OPENAI_TPM", str(args.tpm))
+    os.environ.setdefault("AZURE_OPENAI_RPM", str(args.rpm))
+    os.environ.setdefault("AZURE_OPENAI_KEY", "fake")
+
+    endpoint = args.endpoint
+    if endpoint is None:
+        _, endpoint = fake_openai_server.start(port=0, tpm=args.tpm, rpm=args.rpm, dim=256, latency_ms=20)
+
+    openai_client = load_openai_client()
+    rng = random.Random(0)
+    report = {}
+    for name in args.clients.split(","):
+        deployment = f"embeddings-{name}"  # un despliegue (y una cuota) por cliente
+        texts = ["".join(rng.choices("abcdefghij ", k=args.chars)) for _ in range(args.requests)]
+        if name == "sdk":
+            import openai
+            client = openai.AzureOpenAI(api_key="fake", api_version="2024-02-01", azure_endpoint=endpoint)
+        else:
+            client = openai_client.create_client(endpoint=endpoint, api_key="fake")
+        ok, failed, seconds = run(client, deployment, texts, args.threads)
+        report[name] = {
+            "ok": ok, "failed": failed, "seconds": seconds, "requests_per_second": ok / seconds,
+            "server": server_stats(endpoint).get(deployment, {}),
+        }
+        if name == "limited":
+            report[name]["client"] = openai_client.stats().get(deployment, {})
+
+    print(f"{'cliente':<9}{'ok':>6}{'fallos':>8}{'429 servidor':>14}{'req/s':>8}{'seg':>7}")
+    for name, r in report.items():
+        print(f"{name:<9}{r['ok']:>6}{r['failed']:>8}{r['server'].get('throttled', 0):>14}"
+              f"{r['requests_per_second']:>8.1f}{r['seconds']:>7.1f}")
+    if "limited" in report:
+        print(f"📊 Métricas del limitador: {report['limited']['client']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark de renderizado de PDFs: generate_pdf original frente a pdf_render.
+
+Uso:
+    python backend/benchmarks/pdf_render_benchmark.py --repeat 20
+
+Mide documentos/s, MB/s de PDF generado y pico de memoria (tracemalloc) para textos
+sintéticos de distinta longitud y para la subida por bloques contra un blob simulado en memoria.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+from reportlab.pdfgen import canvas
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PDF_RENDER_PATH = os.path.join(HERE, "..", "Function3_GenerateCVadapted", "GenerateAdaptedCV", "pdf_render.py")
+
+
+def load_pdf_render():
+    spec = importlib.util.spec_from_file_location("pdf_render", PDF_RENDER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_pdf_baseline(text):
+    """Copia del generate_pdf original (cortes cada 100 caracteres, BytesIO completo)"""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer)
+    p.setFont("Helvetica", 10)
+    y = 800
+    for line in text.split("\n"):
+        while len(line) > 100:
+            if y < 40:
+                p.showPage()
+                y = 800
+            p.drawString(50, y, line[:100])
+            y -= 15
+            line = line[100:]
+        if line.strip():
+            if y < 40:
+                p.showPage()
+                y = 800
+            p.drawString(50, y, line)
+            y -= 15
+    p.save()
+    buffer.seek(0)
+    return buffer
+
+
+class MemoryBlob:
+    """Blob simulado que acepta stage_block/commit_block_list"""
+
+    def __init__(self):
+        self.blocks = {}
+        self.committed = b""
+
+    def stage_block(self, block_id, data):
+        self.blocks[block_id] = data
+
+    def commit_block_list(self, block_list, content_settings=None):
+        self.committed = b"".join(self.blocks[b.id] for b in block_list)
+
+
+def synthetic_text(paragraphs, seed=0):
+    rng = random.Random(seed)
+    words = ["experiencia", "gestión", "equipos", "Python", "Azure", "liderazgo", "proyectos",
+             "análisis", "datos", "cliente", "desarrollo", "formación", "responsable", "2019-2023"]
+    return "\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(5, 120))) for _ in range(paragraphs)
+    )
+
+
+def measure(func, text, repeat):
+    func(text)  # calentamiento (imports, cachés de métricas)
+    durations, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func(text)
+        durations.append(time.perf_counter() - start)
+
+    # El pico de memoria se mide aparte para no penalizar los tiempos con tracemalloc
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(durations), size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--sizes", default="20,200,2000", help="Número de párrafos por documento")
+    args = parser.parse_args()
+
+    pdf_render = load_pdf_render()
+
+    def baseline(text):
+        return len(generate_pdf_baseline(text).getvalue())
+
+    def measured(text):
+        buffer = BytesIO()
+        pdf_render.render(text, buffer)
+        return len(buffer.getvalue())
+
+    def staged(text):
+        return pdf_render.render_to_blob(text, MemoryBlob())
+
+    print(f"{'párrafos':>9} {'variante':<22}{'ms/doc':>9}{'docs/s':>9}{'MB/s':>8}{'pico MB':>9}")
+    for paragraphs in (int(p) for p in args.sizes.split(",")):
+        text = synthetic_text(paragraphs)
+        for name, func in [("generate_pdf original", baseline),
+                           ("pdf_render.render", measured),
+                           ("render_to_blob", staged)]:
+            seconds, size, peak = measure(func, text, args.repeat)
+            print(f"{paragraphs:>9} {name:<22}{seconds * 1000:>9.1f}{1 / seconds:>9.1f}"
+                  f"{size / seconds / 1e6:>8.2f}{peak / 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
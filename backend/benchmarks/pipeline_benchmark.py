@@ -0,0 +1,379 @@
+"""Benchmark extremo a extremo sin Azure: Upload → GenerateEmbeddings → GenerateAdaptedCV / GenerateCVadaptedphase2.
+
+Uso:
+    python backend/benchmarks/pipeline_benchmark.py --jobs 50 --concurrency 8
+    python backend/benchmarks/pipeline_benchmark.py --jobs 50 --output report.json
+    python backend/benchmarks/pipeline_benchmark.py --jobs 50 --baseline report.json --max-regression 0.2
+
+Ejecuta los handlers reales de las funciones (los mismos módulos que se despliegan) contra
+sustitutos locales:
+- fake_openai_server: Azure OpenAI simulado con latencia y cuota configurables.
+- local_standins.BlobStore: blobs en memoria servidos por HTTP al estilo Azurite.
+- local_standins.MemoryCosmos: contenedor de Cosmos DB en memoria.
+- local_standins.build_tiny_seq2seq: T5 diminuto instalado en la caché de modelos de la fase 2.
+
+Cada job toma un ejemplo de data/*.jsonl ("CV: ... Job offer: ..."), sube el CV como PDF y la
+oferta como texto (lo que hace Function1), entrega el evento de EventGrid a GenerateEmbeddings y
+pide el CV adaptado a cada Function3. Se lanzan --concurrency jobs a la vez y se informa, por
+etapa, de throughput y latencias p50/p95/p99. Con --baseline se compara el p95 de cada etapa con
+un informe anterior y se termina con código 1 si empeora más de --max-regression.
+
+Además se muestra el desglose por span (telemetry.stats() de cada función): descarga de blobs,
+extracción del PDF, embeddings, lecturas/escrituras de Cosmos con sus RU, inferencia, PDF...
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from itertools import count
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+DATA_GLOB = os.path.join(BACKEND, "..", "data", "*.jsonl")
+APP_DIRS = {
+    "embeddings": os.path.join(BACKEND, "Function2_GenerateEmbeddings"),
+    "openai": os.path.join(BACKEND, "Function3_GenerateCVadapted"),
+    "phase2": os.path.join(BACKEND, "Function3_Fase2_AzureMLModel"),
+}
+sys.path.insert(0, HERE)
+
+import fake_openai_server  # noqa: E402
+import local_standins  # noqa: E402
+
+STAGES = ("upload", "embeddings", "adapt_openai", "adapt_phase2", "end_to_end")
+MODEL_NAME = "genesis-bench"
+ACCOUNT = "benchaccount"
+OFFER_MARKER = "\nJob offer:\n"
+_job_numbers = count()
+
+
+def load_samples(pattern, limit=None):
+    """[(cv_text, job_text)] de los ficheros del dataset de entrenamiento"""
+    samples = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                text = json.loads(line)["input"]
+                if OFFER_MARKER not in text:
+                    continue
+                cv_text, job_text = text.split(OFFER_MARKER, 1)
+                samples.append((cv_text.removeprefix("CV:\n").strip(), job_text.strip()))
+                if limit and len(samples) >= limit:
+                    return samples
+    return samples
+
+
+def percentile(values, q):
+    """Percentil q (0-100) con interpolación lineal"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def configure_environment(args, openai_endpoint, store, workdir):
+    """Variables de entorno comunes; las específicas de cada app se fijan antes de importarla"""
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": openai_endpoint,
+        "AZURE_OPENAI_KEY": "bench",
+        "AZURE_OPENAI_TPM": str(args.tpm),
+        "AZURE_OPENAI_RPM": str(args.rpm),
+        "COSMOS_URL": "https://localhost:8081",
+        "COSMOS_KEY": "YmVuY2g=",
+        "COSMOS_DB": "genesis",
+        "COSMOS_CONTAINER": "documents",
+        "STORAGE_ACCOUNT_NAME": ACCOUNT,
+        "BLOB_SAS_TOKEN": "sv=bench",
+        "STORAGE_CONNECTION_STRING": store.connection_string(),
+        "EMBEDDING_CACHE_BACKEND": "memory" if args.embedding_cache else "none",
+        "RESULT_CACHE_ENABLED": "true" if args.result_cache else "false",
+        "VECTOR_INDEX_DIR": os.path.join(workdir, "index"),
+        "MODEL_CACHE_DIR": os.path.join(workdir, "models"),
+        "MODEL_NAME": MODEL_NAME,
+        "EMBEDDINGS_INLINE_FALLBACK": "false",
+        "TELEMETRY_EXPORTER": args.telemetry,
+    })
+
+
+def import_embeddings_app(store):
+    # Function2 lee AZURE_OPENAI_DEPLOYMENT al importarse: es el despliegue de embeddings
+    os.environ["AZURE_OPENAI_DEPLOYMENT"] = "embeddings-bench"
+    import GenerateEmbeddings
+    from GenerateEmbeddings import blob_fetch
+    # Las descargas HTTP de https://{cuenta}.blob.core.windows.net van al BlobStore local
+    blob_fetch.get_session().mount(f"https://{ACCOUNT}.blob.core.windows.net/", local_standins.azure_blob_adapter(store))
+    return GenerateEmbeddings
+
+
+def import_openai_app():
+    # En Function3 AZURE_OPENAI_DEPLOYMENT es el modelo de chat y se lee en cada petición
+    os.environ["AZURE_OPENAI_DEPLOYMENT"] = "chat-bench"
+    os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"] = "embeddings-bench"
+    import GenerateAdaptedCV
+    return GenerateAdaptedCV
+
+
+def import_phase2_app(samples, args):
+    """Instala el T5 diminuto como versión 1 de MODEL_NAME en la caché de modelos e importa la app"""
+    try:
+        import GenerateCVadaptedphase2
+        from GenerateCVadaptedphase2 import model_cache
+    except ImportError as e:
+        logging.warning(f"Fase 2 no disponible (faltan dependencias: {e}); se omite su etapa")
+        return None
+    version_dir = model_cache.ModelCache(MODEL_NAME).path("1")
+    local_standins.build_tiny_seq2seq(
+        os.path.join(version_dir, MODEL_NAME, "model"),
+        [cv + "\n" + job for cv, job in samples],
+        d_model=args.model_dim, layers=args.model_layers
+    )
+    model_cache.write_manifest(version_dir, MODEL_NAME, "1")
+    # Versión "recién comprobada": no se consulta Azure ML durante el benchmark
+    model_cache.ModelCache(MODEL_NAME)._write_latest("1")
+    return GenerateCVadaptedphase2
+
+
+def render_pdf(pdf_render, text):
+    from io import BytesIO
+    buffer = BytesIO()
+    pdf_render.render(text, buffer)
+    return buffer.getvalue()
+
+
+def http_request(job_id):
+    import azure.functions as func
+    return func.HttpRequest(
+        method="POST", url="http://localhost/api/bench", headers={"Content-Type": "application/json"},
+        body=json.dumps({"jobId": job_id}).encode()
+    )
+
+
+class Recorder:
+    """Duraciones por etapa (segundos) y errores"""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first_error = {}
+
+    async def measure(self, stage, coroutine):
+        start = time.perf_counter()
+        try:
+            result = await coroutine
+        except Exception as e:
+            self.errors[stage] += 1
+            self.first_error.setdefault(stage, repr(e))
+            raise
+        self.durations[stage].append(time.perf_counter() - start)
+        return result
+
+
+async def check_response(coroutine):
+    response = await coroutine
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_body().decode()[:200]}")
+    return response
+
+
+async def run_job(index, sample, apps, store, pdf_render, recorder):
+    import azure.functions as func
+    cv_text, job_text = sample
+    job_id = f"{int(time.time())}{next(_job_numbers):05d}"
+    cv_name = f"cv/cv-{job_id}-bench.pdf"
+    start = time.perf_counter()
+
+    async def upload():
+        pdf = await asyncio.to_thread(render_pdf, pdf_render, cv_text)
+        await asyncio.to_thread(store.put, "upload", f"joboffer/jobOffer-{job_id}.txt", job_text.encode(), "text/plain")
+        return await asyncio.to_thread(store.put, "upload", cv_name, pdf, "application/pdf")
+
+    try:
+        etag = await recorder.measure("upload", upload())
+        event = func.EventGridEvent(
+            id=f"bench-{job_id}", subject=f"/blobServices/default/containers/upload/blobs/{cv_name}",
+            event_type="Microsoft.Storage.BlobCreated", event_time=None, data_version="1", topic="bench",
+            data={"url": f"https://{ACCOUNT}.blob.core.windows.net/upload/{cv_name}", "eTag": etag}
+        )
+        # Los handlers síncronos se ejecutan en el pool de hilos, como en el host de Functions
+        await recorder.measure("embeddings", asyncio.to_thread(apps["embeddings"].main, event))
+        if "openai" in apps:
+            await recorder.measure("adapt_openai", check_response(apps["openai"].main(http_request(job_id))))
+        if "phase2" in apps:
+            await recorder.measure("adapt_phase2", check_response(apps["phase2"].main(http_request(job_id))))
+    except Exception as e:
+        logging.debug(f"Job {job_id} fallido: {e}")
+        recorder.errors["end_to_end"] += 1
+        return
+    recorder.durations["end_to_end"].append(time.perf_counter() - start)
+
+
+async def benchmark(samples, args, apps, store, pdf_render, recorder):
+    """Calentamiento secuencial (sin medir) y carga concurrente en el mismo event loop"""
+    if args.warmup:
+        await run_load(samples, args.warmup, 1, apps, store, pdf_render, Recorder())
+        for app in apps.values():
+            if hasattr(app, "telemetry"):
+                app.telemetry.reset()
+    return await run_load(samples, args.jobs, args.concurrency, apps, store, pdf_render, recorder)
+
+
+async def run_load(samples, jobs, concurrency, apps, store, pdf_render, recorder):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index):
+        async with semaphore:
+            await run_job(index, samples[index % len(samples)], apps, store, pdf_render, recorder)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(index) for index in range(jobs)))
+    return time.perf_counter() - start
+
+
+def summarize(recorder, wall_seconds):
+    report = {}
+    for stage in STAGES:
+        values = recorder.durations.get(stage, [])
+        if not values and not recorder.errors.get(stage):
+            continue
+        report[stage] = {
+            "count": len(values),
+            "errors": recorder.errors.get(stage, 0),
+            "throughput": len(values) / wall_seconds,
+            "mean_ms": 1000 * sum(values) / len(values) if values else None,
+            **{f"p{q}_ms": 1000 * percentile(values, q) if values else None for q in (50, 95, 99)},
+        }
+        if stage in recorder.first_error:
+            report[stage]["first_error"] = recorder.first_error[stage]
+    return report
+
+
+def print_report(report, wall_seconds):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    print(f"{'etapa':<14}{'n':>6}{'errores':>9}{'jobs/s':>9}{'media':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for stage, r in report.items():
+        print(f"{stage:<14}{r['count']:>6}{r['errors']:>9}{r['throughput']:>9.2f}{ms(r['mean_ms']):>9}"
+              f"{ms(r['p50_ms']):>9}{ms(r['p95_ms']):>9}{ms(r['p99_ms']):>9}")
+    print(f"⏱️ Duración total: {wall_seconds:.1f}s")
+    for stage, r in report.items():
+        if "first_error" in r:
+            print(f"❌ {stage}: {r['first_error']}")
+
+
+def span_breakdown(apps):
+    """telemetry.stats() de cada app: {app: {span: métricas}}"""
+    return {name: app.telemetry.stats() for name, app in apps.items() if hasattr(app, "telemetry")}
+
+
+def print_breakdown(breakdown):
+    print(f"{'app':<11}{'span':<22}{'n':>6}{'media':>9}{'máx':>9}{'RU':>9}{'tokens':>9}{'KB':>9}  (ms)")
+    for app, spans in breakdown.items():
+        for name, m in sorted(spans.items(), key=lambda item: -item[1]["total_ms"]):
+            ru = f"{m['request_charge']:.0f}" if "request_charge" in m else "-"
+            tokens = f"{m['total_tokens']:.0f}" if "total_tokens" in m else "-"
+            kilobytes = f"{m['bytes'] / 1024:.0f}" if "bytes" in m else "-"
+            print(f"{app:<11}{name:<22}{m['count']:>6}{m['mean_ms']:>9.1f}{m['max_ms']:>9.0f}{ru:>9}{tokens:>9}{kilobytes:>9}")
+
+
+def compare_baseline(report, baseline_path, max_regression):
+    """Etapas cuyo p95 empeora más de max_regression respecto al informe de referencia"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["stages"]
+    regressions = []
+    for stage, r in report.items():
+        before = baseline.get(stage, {}).get("p95_ms")
+        if before and r["p95_ms"] is not None and r["p95_ms"] > before * (1 + max_regression):
+            regressions.append(f"{stage}: p95 {before:.0f} → {r['p95_ms']:.0f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8, help="jobs en curso a la vez")
+    parser.add_argument("--warmup", type=int, default=2, help="jobs previos (no medidos) para cargar clientes y modelo")
+    parser.add_argument("--data", default=DATA_GLOB, help="ficheros JSONL de ejemplos")
+    parser.add_argument("--targets", default="openai,phase2", help="Function3 a medir: openai, phase2")
+    parser.add_argument("--openai-latency-ms", type=float, default=50)
+    parser.add_argument("--openai-token-delay-ms", type=float, default=2)
+    parser.add_argument("--tpm", type=int, default=2_000_000)
+    parser.add_argument("--rpm", type=int, default=20_000)
+    parser.add_argument("--blob-latency-ms", type=float, default=5)
+    parser.add_argument("--cosmos-latency-ms", type=float, default=5)
+    parser.add_argument("--model-dim", type=int, default=64, help="d_model del T5 diminuto")
+    parser.add_argument("--model-layers", type=int, default=2)
+    parser.add_argument("--embedding-cache", action="store_true", help="activar la caché de embeddings")
+    parser.add_argument("--result-cache", action="store_true", help="activar la caché de resultados de Function3")
+    parser.add_argument("--output", help="guardar el informe en JSON")
+    parser.add_argument("--baseline", help="informe JSON anterior con el que comparar")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="empeoramiento de p95 tolerado")
+    parser.add_argument("--telemetry", default="none", choices=["none", "log", "otel"],
+                        help="exportador de spans de las funciones (las métricas se recogen siempre)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    samples = load_samples(args.data)
+    if not samples:
+        parser.error(f"No hay ejemplos en {args.data}")
+
+    _, openai_endpoint = fake_openai_server.start(
+        port=0, tpm=args.tpm, rpm=args.rpm, dim=1536,
+        latency_ms=args.openai_latency_ms, token_delay_ms=args.openai_token_delay_ms
+    )
+    store = local_standins.BlobStore(ACCOUNT, latency_ms=args.blob_latency_ms)
+    local_standins.start_blob_server(store)
+    cosmos = local_standins.MemoryCosmos(latency_ms=args.cosmos_latency_ms)
+    workdir = tempfile.mkdtemp(prefix="genesis-bench-")
+    configure_environment(args, openai_endpoint, store, workdir)
+
+    targets = set(args.targets.split(","))
+    sys.path[:0] = APP_DIRS.values()
+    with local_standins.install(store, cosmos):
+        apps = {"embeddings": import_embeddings_app(store)}
+        if "openai" in targets:
+            apps["openai"] = import_openai_app()
+        if "phase2" in targets:
+            phase2 = import_phase2_app(samples, args)
+            if phase2 is not None:
+                apps["phase2"] = phase2
+        from GenerateAdaptedCV import pdf_render
+
+        print(f"🚀 {args.jobs} jobs, concurrencia {args.concurrency}, etapas: {', '.join(apps)}")
+        recorder = Recorder()
+        wall_seconds = asyncio.run(benchmark(samples, args, apps, store, pdf_render, recorder))
+        breakdown = span_breakdown(apps)
+
+    report = summarize(recorder, wall_seconds)
+    print_report(report, wall_seconds)
+    print_breakdown(breakdown)
+    print(f"📦 Blobs: {dict(store.stats)} · Cosmos: {cosmos.stats()}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "wall_seconds": wall_seconds, "stages": report, "spans": breakdown},
+                      f, indent=2)
+        print(f"💾 Informe guardado en {args.output}")
+    if args.baseline:
+        regressions = compare_baseline(report, args.baseline, args.max_regression)
+        if regressions:
+            print("🚨 Regresiones de latencia respecto a la referencia:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ Sin regresiones respecto a la referencia")
+
+
+if __name__ == "__main__":
+    main()
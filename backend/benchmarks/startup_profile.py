@@ -0,0 +1,279 @@
+"""Perfil de arranque en frío de cada función y control de regresiones.
+
+Uso:
+    python backend/benchmarks/startup_profile.py
+    python backend/benchmarks/startup_profile.py --repeat 5 --output startup.json
+    python backend/benchmarks/startup_profile.py --baseline startup.json --max-regression 0.3
+    python backend/benchmarks/startup_profile.py --functions GenerateCVadaptedphase2 --warmup
+
+Cada función (carpeta con function.json en backend/Function*) se importa en un proceso nuevo
+con `python -X importtime`, igual que el worker de Python de Azure Functions (__app__.<función>,
+con azure.functions ya cargado), y a las funciones HTTP se les envía un preflight OPTIONS.
+Se informa de la mediana del tiempo de import y del preflight, de los imports más costosos de
+la función y de los módulos pesados que quedan cargados.
+
+Termina con código 1 si:
+- algún módulo pesado (transformers, torch, openai, SDKs de Azure...) se carga al importar la
+  función o al responder al preflight: deben cargarse en el primer uso;
+- el import supera --max-import-ms;
+- con --baseline, el import o el preflight empeoran más de --max-regression (y más de
+  --min-delta-ms, para no fallar por ruido en tiempos pequeños).
+
+Con --warmup se activa STARTUP_WARMUP y se mide también cuánto tarda la precarga en segundo plano
+(sin servicios reales, la creación de clientes de Azure falla y solo queda registrada). La precarga
+importa en paralelo los módulos pesados, así que en ese modo no se comprueban ni se desglosan los imports.
+"""
+import argparse
+import asyncio
+import glob
+import inspect
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+
+# Módulos que no deben cargarse al importar una función ni al responder a un preflight
+HEAVY_MODULES = (
+    "transformers", "torch", "optimum", "peft", "azure.ai.ml", "azure.identity", "openai", "fitz",
+    "reportlab", "azure.cosmos", "azure.storage.blob",
+)
+
+# Valores de relleno para las variables que las funciones leen al importarse (no se conecta a nada)
+PLACEHOLDER_ENV = {
+    "AZURE_OPENAI_KEY": "startup-profile",
+    "AZURE_OPENAI_ENDPOINT": "https://startup-profile.openai.azure.com",
+    "AZURE_OPENAI_DEPLOYMENT": "startup-profile",
+    "COSMOS_URL": "https://127.0.0.1:1",
+    "COSMOS_KEY": "c3RhcnR1cC1wcm9maWxl",
+    "COSMOS_DB": "genesis",
+    "COSMOS_CONTAINER": "documents",
+    "STORAGE_ACCOUNT_NAME": "startupprofile",
+    "BLOB_SAS_TOKEN": "sv=startup-profile",
+    "STORAGE_CONNECTION_STRING": (
+        "DefaultEndpointsProtocol=http;AccountName=startupprofile;AccountKey=c3RhcnR1cC1wcm9maWxl;"
+        "BlobEndpoint=http://127.0.0.1:1/startupprofile"
+    ),
+    "TELEMETRY_EXPORTER": "none",
+}
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def discover_functions():
+    """{función: (carpeta de la app, métodos HTTP o None si no es HTTP)}"""
+    functions = {}
+    for path in sorted(glob.glob(os.path.join(BACKEND, "Function*", "*", "function.json"))):
+        with open(path, encoding="utf-8") as f:
+            bindings = json.load(f)["bindings"]
+        http = [b for b in bindings if b.get("type") == "httpTrigger"]
+        methods = [m.lower() for m in http[0].get("methods", [])] if http else None
+        function_dir = os.path.dirname(path)
+        functions[os.path.basename(function_dir)] = (os.path.dirname(function_dir), methods)
+    return functions
+
+
+def child(app_dir, function, methods, warmup_timeout):
+    """Se ejecuta en el proceso medido: importa la función como el worker y responde a un preflight"""
+    import azure.functions as func  # el worker lo carga antes que cualquier función
+
+    sys.path.insert(0, app_dir)
+    app = types.ModuleType("__app__")
+    app.__path__ = [app_dir]
+    sys.modules["__app__"] = app
+
+    started = time.perf_counter()
+    # __import__ (no importlib.import_module) para que -X importtime registre la propia función
+    __import__(f"__app__.{function}")
+    module = sys.modules[f"__app__.{function}"]
+    result = {"import_ms": (time.perf_counter() - started) * 1000, "preflight_ms": None}
+
+    if methods and "options" in methods:
+        request = func.HttpRequest(method="OPTIONS", url=f"/api/{function}", body=b"", headers={})
+        started = time.perf_counter()
+        response = module.main(request)
+        if inspect.iscoroutine(response):
+            response = asyncio.run(response)
+        result["preflight_ms"] = (time.perf_counter() - started) * 1000
+        result["preflight_status"] = response.status_code
+
+    result["heavy_modules"] = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+
+    warmups = {name: m for name, m in sys.modules.items() if name.startswith("__app__.") and name.endswith(".warmup")}
+    for warmup in warmups.values():
+        if warmup.STARTUP_WARMUP:
+            started = time.perf_counter()
+            result["warmup_finished"] = warmup.wait(warmup_timeout)
+            result["warmup_wait_ms"] = (time.perf_counter() - started) * 1000
+            result["warmup_steps_ms"] = warmup.timings()
+    print(json.dumps(result))
+
+
+def parse_importtime(stderr, function):
+    """Imports hechos al cargar __app__.<función>: directos (acumulado) y por paquete (propio)"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            entries.append((int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+
+    # -X importtime escribe cada módulo después de sus dependencias: el subárbol de la función son
+    # las líneas contiguas anteriores a la suya con más sangría
+    root = next((i for i, e in enumerate(entries) if e[3] == f"__app__.{function}"), None)
+    if root is None:
+        return {}, {}
+    depth = entries[root][2]
+    start = root
+    while start > 0 and entries[start - 1][2] > depth:
+        start -= 1
+    subtree = entries[start:root]
+
+    direct = {name: cumulative / 1000 for _, cumulative, level, name in subtree if level == depth + 1}
+    packages = {}
+    for own, _, _, name in subtree:
+        parts = name.split(".")
+        package = ".".join(parts[:2]) if parts[0] in ("azure", "__app__") and len(parts) > 1 else parts[0]
+        packages[package] = packages.get(package, 0.0) + own / 1000
+    return direct, packages
+
+
+def profile(function, app_dir, methods, repeat, warmup, warmup_timeout):
+    env = dict(os.environ)
+    for key, value in PLACEHOLDER_ENV.items():
+        env.setdefault(key, value)
+    env["STARTUP_WARMUP"] = "true" if warmup else "false"
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__),
+               "--child", app_dir, function, json.dumps(methods), str(warmup_timeout)]
+
+    runs = []
+    direct, packages = {}, {}
+    for _ in range(repeat):
+        completed = subprocess.run(command, env=env, capture_output=True, text=True, cwd=app_dir)
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "sin salida"
+            return {"error": error}
+        runs.append(json.loads(lines[-1]))
+        direct, packages = parse_importtime(completed.stderr, function)
+
+    def median(key):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        return statistics.median(values) if values else None
+
+    report = {
+        "import_ms": median("import_ms"),
+        "preflight_ms": median("preflight_ms"),
+        "heavy_modules": sorted({name for run in runs for name in run["heavy_modules"]}),
+        "imports_ms": dict(sorted(direct.items(), key=lambda item: -item[1])),
+        "packages_ms": dict(sorted(packages.items(), key=lambda item: -item[1])),
+    }
+    if warmup:
+        report["warmup_wait_ms"] = median("warmup_wait_ms")
+        report["warmup_steps_ms"] = runs[-1].get("warmup_steps_ms", {})
+        report["warmup_finished"] = all(run.get("warmup_finished", True) for run in runs)
+    return report
+
+
+def print_report(report, top):
+    def ms(value):
+        return f"{value:.0f}" if value is not None else "-"
+
+    print(f"{'función':<26}{'import':>9}{'preflight':>11}  módulos pesados cargados  (ms)")
+    for function, r in report.items():
+        if "error" in r:
+            print(f"{function:<26}❌ {r['error']}")
+            continue
+        print(f"{function:<26}{ms(r['import_ms']):>9}{ms(r['preflight_ms']):>11}  {', '.join(r['heavy_modules']) or '-'}")
+    for function, r in report.items():
+        if "error" in r:
+            continue
+        if "warmup_wait_ms" in r:
+            state = "completa" if r["warmup_finished"] else "sin terminar"
+            steps = ", ".join(f"{name} {value:.0f}" for name, value in r["warmup_steps_ms"].items())
+            print(f"🔥 {function}: precarga {state} {ms(r['warmup_wait_ms'])} ms después del preflight: {steps}")
+            continue
+        print(f"📦 {function}: imports más costosos (acumulado)")
+        for name, value in list(r["imports_ms"].items())[:top]:
+            print(f"   {name:<48}{value:>8.1f} ms")
+        packages = ", ".join(f"{name} {value:.0f}" for name, value in list(r["packages_ms"].items())[:top])
+        print(f"   por paquete (ms propios): {packages}")
+
+
+def check(report, max_import_ms, baseline_path, max_regression, min_delta_ms, warmup=False):
+    """Lista de problemas: módulos pesados cargados, presupuesto superado o regresiones"""
+    problems = []
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["functions"]
+    for function, r in report.items():
+        if "error" in r:
+            problems.append(f"{function}: no se pudo importar ({r['error']})")
+            continue
+        if r["heavy_modules"] and not warmup:
+            problems.append(f"{function}: carga {', '.join(r['heavy_modules'])} al arrancar")
+        if max_import_ms and r["import_ms"] > max_import_ms:
+            problems.append(f"{function}: import {r['import_ms']:.0f} ms > presupuesto {max_import_ms:.0f} ms")
+        for key in ("import_ms", "preflight_ms"):
+            before = baseline.get(function, {}).get(key)
+            after = r[key]
+            if before and after is not None and after > before * (1 + max_regression) and after - before > min_delta_ms:
+                problems.append(f"{function}: {key} {before:.0f} → {after:.0f} ms")
+    return problems
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _, _, app_dir, function, methods, warmup_timeout = sys.argv
+        child(app_dir, function, json.loads(methods), float(warmup_timeout))
+        return
+
+    functions = discover_functions()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", default=",".join(functions), help="funciones a medir (separadas por comas)")
+    parser.add_argument("--repeat", type=int, default=3, help="procesos por función (se usa la mediana)")
+    parser.add_argument("--top", type=int, default=8, help="imports a mostrar por función")
+    parser.add_argument("--max-import-ms", type=float, help="presupuesto de import por función")
+    parser.add_argument("--warmup", action="store_true", help="activa STARTUP_WARMUP y mide la precarga")
+    parser.add_argument("--warmup-timeout", type=float, default=300, help="espera máxima a la precarga (s)")
+    parser.add_argument("--output", help="guarda el informe en JSON")
+    parser.add_argument("--baseline", help="informe JSON anterior con el que comparar")
+    parser.add_argument("--max-regression", type=float, default=0.3, help="empeoramiento relativo tolerado")
+    parser.add_argument("--min-delta-ms", type=float, default=50, help="empeoramiento absoluto ignorado")
+    args = parser.parse_args()
+
+    selected = [name for name in args.functions.split(",") if name]
+    unknown = [name for name in selected if name not in functions]
+    if unknown:
+        parser.error(f"Funciones desconocidas: {', '.join(unknown)} (disponibles: {', '.join(functions)})")
+
+    print(f"🚀 Arranque en frío de {len(selected)} funciones, {args.repeat} procesos cada una")
+    report = {}
+    for function in selected:
+        app_dir, methods = functions[function]
+        report[function] = profile(function, app_dir, methods, args.repeat, args.warmup, args.warmup_timeout)
+    print_report(report, args.top)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "functions": report}, f, indent=2)
+        print(f"💾 Informe guardado en {args.output}")
+
+    problems = check(report, args.max_import_ms, args.baseline, args.max_regression, args.min_delta_ms, args.warmup)
+    if problems:
+        print("🚨 Problemas de arranque:")
+        for line in problems:
+            print(f"   {line}")
+        sys.exit(1)
+    print("✅ Arranque dentro de presupuesto" if args.warmup else
+          "✅ Arranque sin módulos pesados" + (" ni regresiones" if args.baseline else ""))
+
+
+if __name__ == "__main__":
+    main()
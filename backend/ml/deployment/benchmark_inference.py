@@ -0,0 +1,133 @@
+"""Comparativa de latencia y calidad de los backends de inferencia en CPU.
+
+Uso:
+    python backend/ml/deployment/benchmark_inference.py --model-dir ./model --samples 20
+
+Compara pytorch (fp32, pipeline actual) con pytorch-int8 y onnx-int8 sobre ejemplos de data/*.jsonl.
+La calidad se mide como similitud con la salida fp32 y F1 de tokens frente al target del dataset.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+from collections import Counter
+from difflib import SequenceMatcher
+
+ONNX_INT8_SUBDIR = "onnx-int8"
+
+
+def load_model(model_dir, backend):
+    from transformers import AutoModelForSeq2SeqLM
+    if backend == "pytorch":
+        return AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+    if backend == "pytorch-int8":
+        import torch
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "onnx-int8":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        onnx_dir = os.path.join(model_dir, ONNX_INT8_SUBDIR)
+        with open(os.path.join(onnx_dir, "quantization.json")) as f:
+            files = json.load(f)["files"]
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            onnx_dir,
+            encoder_file_name=files["encoder"],
+            decoder_file_name=files["decoder"],
+            decoder_with_past_file_name=files.get("decoder_with_past"),
+            use_cache=files.get("decoder_with_past") is not None
+        )
+    raise ValueError(f"Backend desconocido: {backend}")
+
+
+def load_samples(data_glob, limit):
+    samples = []
+    for path in sorted(glob.glob(data_glob)):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                samples.append(json.loads(line))
+                if len(samples) >= limit:
+                    return samples
+    return samples
+
+
+def token_f1(prediction, reference):
+    pred, ref = prediction.lower().split(), reference.lower().split()
+    common = sum((Counter(pred) & Counter(ref)).values())
+    if not pred or not ref or not common:
+        return 0.0
+    precision, recall = common / len(pred), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_backend(model_dir, backend, samples, max_new_tokens):
+    from transformers import AutoTokenizer, pipeline
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    start = time.perf_counter()
+    model = load_model(model_dir, backend)
+    pipe = pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+    load_seconds = time.perf_counter() - start
+
+    pipe(samples[0]["input"], max_new_tokens=8, truncation=True)  # calentamiento
+    outputs, latencies = [], []
+    for sample in samples:
+        start = time.perf_counter()
+        result = pipe(sample["input"], max_new_tokens=max_new_tokens, do_sample=False, truncation=True)
+        latencies.append(time.perf_counter() - start)
+        outputs.append(result[0]["generated_text"])
+    return load_seconds, latencies, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--data", default="./data/*.jsonl")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--backends", default="pytorch,pytorch-int8,onnx-int8")
+    parser.add_argument("--output", default="inference_benchmark.json")
+    args = parser.parse_args()
+
+    samples = load_samples(args.data, args.samples)
+    print(f"📊 {len(samples)} ejemplos de {args.data}")
+
+    report = {}
+    baseline = None
+    for backend in args.backends.split(","):
+        try:
+            load_seconds, latencies, outputs = run_backend(args.model_dir, backend, samples, args.max_new_tokens)
+        except Exception as e:
+            print(f"⚠️ Backend {backend} omitido: {e}")
+            continue
+        if baseline is None:
+            baseline = outputs
+        report[backend] = {
+            "load_seconds": load_seconds,
+            "p50_seconds": statistics.median(latencies),
+            "p95_seconds": percentile(latencies, 0.95),
+            "mean_seconds": statistics.mean(latencies),
+            "similarity_to_baseline": statistics.mean(
+                SequenceMatcher(None, a, b).ratio() for a, b in zip(outputs, baseline)
+            ),
+            "exact_match_baseline": sum(a == b for a, b in zip(outputs, baseline)) / len(outputs),
+            "token_f1_target": statistics.mean(token_f1(o, s["target"]) for o, s in zip(outputs, samples)),
+        }
+
+    print(f"{'backend':<14}{'carga(s)':>10}{'p50(s)':>9}{'p95(s)':>9}{'sim':>7}{'F1':>7}")
+    for backend, r in report.items():
+        print(f"{backend:<14}{r['load_seconds']:>10.2f}{r['p50_seconds']:>9.2f}{r['p95_seconds']:>9.2f}"
+              f"{r['similarity_to_baseline']:>7.3f}{r['token_f1_target']:>7.3f}")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Informe guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Comparativa del tiempo de carga y la memoria pico del modelo según formato y precisión.
+
+Uso:
+    python backend/ml/deployment/benchmark_model_load.py --model-dir ./model --repeat 3
+
+Variantes: pickle (.bin, carga clásica), safetensors (memory-mapped + low_cpu_mem_usage) y
+safetensors en bfloat16. Cada carga se ejecuta en un proceso nuevo para medir un arranque en frío
+y su RSS pico de forma aislada. Si el modelo solo tiene uno de los dos formatos, se genera el otro
+en un directorio temporal.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+VARIANTS = {
+    "pickle-fp32": {"format": "bin", "kwargs": {}},
+    "safetensors-fp32": {"format": "safetensors", "kwargs": {"low_cpu_mem_usage": True, "use_safetensors": True}},
+    "safetensors-bf16": {"format": "safetensors", "kwargs": {"low_cpu_mem_usage": True, "use_safetensors": True,
+                                                             "torch_dtype": "bfloat16"}},
+}
+
+
+def child(model_dir, variant):
+    """Carga el modelo una vez e imprime tiempo y RSS pico en JSON (se ejecuta en un proceso aparte)"""
+    import resource
+    import time
+    start = time.perf_counter()
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+    import_seconds = time.perf_counter() - start
+
+    kwargs = dict(VARIANTS[variant]["kwargs"])
+    if "torch_dtype" in kwargs:
+        kwargs["torch_dtype"] = getattr(torch, kwargs["torch_dtype"])
+    if VARIANTS[variant]["format"] == "bin":
+        kwargs["use_safetensors"] = False
+
+    start = time.perf_counter()
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_dir, local_files_only=True, **kwargs)
+    load_seconds = time.perf_counter() - start
+    params = sum(p.numel() for p in model.parameters())
+    print(json.dumps({
+        "import_seconds": import_seconds,
+        "load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "parameters": params,
+    }))
+
+
+def prepare_formats(model_dir, workdir):
+    """Directorios {formato: ruta} con los pesos en .bin y en safetensors"""
+    from transformers import AutoModelForSeq2SeqLM
+    names = os.listdir(model_dir)
+    has_safetensors = any(n.endswith(".safetensors") for n in names)
+    has_bin = any(n.startswith("pytorch_model") and n.endswith(".bin") for n in names)
+    dirs = {}
+    if has_safetensors:
+        dirs["safetensors"] = model_dir
+    if has_bin:
+        dirs["bin"] = model_dir
+    missing = "bin" if has_safetensors and not has_bin else "safetensors" if has_bin and not has_safetensors else None
+    if missing:
+        target = os.path.join(workdir, missing)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+        model.save_pretrained(target, safe_serialization=missing == "safetensors")
+        for name in names:
+            if name.endswith(".json") and not name.startswith(("pytorch_model", "model.safetensors")):
+                shutil.copy(os.path.join(model_dir, name), target)
+        dirs[missing] = target
+    return dirs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default="./model")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--output", default="model_load_benchmark.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.model_dir, args.child)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    report = {}
+    try:
+        dirs = prepare_formats(args.model_dir, workdir)
+        for variant in args.variants.split(","):
+            model_dir = dirs[VARIANTS[variant]["format"]]
+            runs = []
+            for _ in range(args.repeat):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--model-dir", model_dir, "--child", variant],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            report[variant] = {
+                "load_seconds_median": statistics.median(r["load_seconds"] for r in runs),
+                "load_seconds_min": min(r["load_seconds"] for r in runs),
+                "peak_rss_mb": statistics.median(r["peak_rss_mb"] for r in runs),
+                "import_seconds": statistics.median(r["import_seconds"] for r in runs),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'variante':<20}{'carga p50(s)':>14}{'carga min(s)':>14}{'RSS pico(MB)':>14}")
+    for variant, r in report.items():
+        print(f"{variant:<20}{r['load_seconds_median']:>14.2f}{r['load_seconds_min']:>14.2f}{r['peak_rss_mb']:>14.0f}")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Informe guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import json
 from azure.identity import DefaultAzureCredential
 from azure.ai.ml import MLClient
 from azure.ai.ml.entities import Model
@@ -10,13 +11,56 @@ AZURE_RESOURCE_GROUP = os.getenv("AZURE_RESOURCE_GROUP")
 AZURE_WORKSPACE_NAME = os.getenv("AZURE_WORKSPACE_NAME")
 MODEL_NAME = os.getenv("MODEL_NAME", "genesis-model")
 MODEL_PATH = "./model"
+EXPORT_ONNX_INT8 = os.getenv("EXPORT_ONNX_INT8", "false").lower() == "true"
+ONNX_INT8_DIR = os.path.join(MODEL_PATH, "onnx-int8")
 
 # Verificación de la carpeta del modelo
 if not os.path.exists(MODEL_PATH):
     raise FileNotFoundError(f"❌ Model directory not found: {MODEL_PATH}")
 
+# Adaptador LoRA (TRAINING_MODE=lora): solo pesos del adaptador + referencia al modelo base
+is_adapter = os.path.exists(os.path.join(MODEL_PATH, "adapter_config.json"))
+base_reference = {}
+if is_adapter:
+    with open(os.path.join(MODEL_PATH, "base_model.json")) as f:
+        base_reference = json.load(f)
+    print(f"🧩 Adaptador LoRA sobre el modelo base: {base_reference}")
+
+def convert_to_safetensors(model_path, adapter=False):
+    """Convierte los pesos .bin (pickle) a safetensors, el formato registrado.
+
+    safetensors se carga memory-mapped y sin deserializar pickle; los .bin se eliminan tras convertir.
+    Devuelve True si había algo que convertir.
+    """
+    names = os.listdir(model_path)
+    bin_files = [n for n in names if n.endswith(".bin") and (n.startswith("pytorch_model") or n.startswith("adapter_model"))]
+    if not bin_files or any(n.endswith(".safetensors") for n in names):
+        return False
+    if adapter:
+        import torch
+        from safetensors.torch import save_file
+        state_dict = torch.load(os.path.join(model_path, "adapter_model.bin"), map_location="cpu", weights_only=True)
+        save_file(state_dict, os.path.join(model_path, "adapter_model.safetensors"), metadata={"format": "pt"})
+    else:
+        # from_pretrained + save_pretrained resuelve los pesos compartidos (embeddings de T5)
+        from transformers import AutoModelForSeq2SeqLM
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path, low_cpu_mem_usage=True)
+        model.save_pretrained(model_path, safe_serialization=True, max_shard_size="2GB")
+    for name in bin_files + ["pytorch_model.bin.index.json"]:
+        if os.path.exists(os.path.join(model_path, name)):
+            os.remove(os.path.join(model_path, name))
+    return True
+
+if convert_to_safetensors(MODEL_PATH, adapter=is_adapter):
+    print("🔁 Pesos convertidos de .bin a safetensors")
+
 # Asegurar que contiene los archivos necesarios
-required_files = ["config.json", "pytorch_model.bin"]
+if is_adapter:
+    required_files = ["adapter_config.json", "base_model.json", "adapter_model.safetensors"]
+elif os.path.exists(os.path.join(MODEL_PATH, "model.safetensors.index.json")):
+    required_files = ["config.json", "model.safetensors.index.json"]
+else:
+    required_files = ["config.json", "model.safetensors"]
 missing_files = [f for f in required_files if not os.path.exists(os.path.join(MODEL_PATH, f))]
 
 if missing_files:
@@ -27,6 +71,59 @@ if missing_files:
 else:
     print(f"✅ Model directory is complete: {MODEL_PATH}")
 
+def export_onnx_int8(model_path, output_dir):
+    """Exporta el modelo a ONNX y aplica cuantización dinámica int8 (artefacto para inferencia en CPU)"""
+    import json
+    import shutil
+    import tempfile
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    fp32_dir = tempfile.mkdtemp(prefix="onnx-fp32-")
+    try:
+        ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True).save_pretrained(fp32_dir)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+        files = {}
+        for role, name in [("encoder", "encoder_model.onnx"),
+                           ("decoder", "decoder_model.onnx"),
+                           ("decoder_with_past", "decoder_with_past_model.onnx")]:
+            if not os.path.exists(os.path.join(fp32_dir, name)):
+                continue
+            quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name=name)
+            quantizer.quantize(save_dir=output_dir, quantization_config=qconfig)
+            files[role] = name.replace(".onnx", "_quantized.onnx")
+
+        for name in os.listdir(fp32_dir):
+            if name.endswith(".json"):
+                shutil.copy(os.path.join(fp32_dir, name), output_dir)
+        AutoTokenizer.from_pretrained(model_path).save_pretrained(output_dir)
+        with open(os.path.join(output_dir, "quantization.json"), "w") as f:
+            json.dump({"files": files, "scheme": "dynamic-int8", "source": "optimum"}, f)
+    finally:
+        shutil.rmtree(fp32_dir, ignore_errors=True)
+
+# Artefacto adicional ONNX int8 (se registra dentro de la carpeta del modelo)
+onnx_int8_exported = False
+if EXPORT_ONNX_INT8 and is_adapter:
+    print("⏭️ Exportación ONNX int8 omitida: el artefacto es un adaptador LoRA")
+elif EXPORT_ONNX_INT8:
+    try:
+        export_onnx_int8(MODEL_PATH, ONNX_INT8_DIR)
+        onnx_int8_exported = True
+        print(f"✅ Artefacto ONNX int8 generado en: {ONNX_INT8_DIR}")
+    except Exception as e:
+        print(f"⚠️ No se pudo generar el artefacto ONNX int8: {e}")
+
+# Shards del dataset con los que se ha entrenado (los escribe train_model.py)
+dataset_manifest = {}
+manifest_path = os.path.join(MODEL_PATH, "dataset_manifest.json")
+if os.path.exists(manifest_path):
+    with open(manifest_path) as f:
+        dataset_manifest = json.load(f)
+    print(f"📦 Shards del dataset: {sorted(dataset_manifest.get('shards', {}))}")
+
 # Inicializar cliente de Azure ML
 credential = DefaultAzureCredential(exclude_environment_credential=True)
 ml_client = MLClient(
@@ -44,8 +141,17 @@ model = Model(
     type="custom_model",  # ¡Correcto para HF!
     tags={
         "framework": "transformers",
-        "hf_compatible": "true"
-    }
+        "hf_compatible": "true",
+        "onnx_int8": str(onnx_int8_exported).lower(),
+        "dataset_fingerprint": dataset_manifest.get("fingerprint", "unknown"),
+        "artifact": "lora-adapter" if is_adapter else "full",
+        "weights_format": "safetensors",
+        # Mismo formato que adapters.reference_key: Function3 decide con este tag si puede aplicar el adaptador
+        "base_model": ":".join(str(base_reference[k]) for k in ("source", "name", "version") if k in base_reference)
+    },
+    properties={
+        "dataset_shards": json.dumps(dataset_manifest.get("shards", {}), sort_keys=True)
+    } if dataset_manifest else None
 )
 
 # Registro en Azure ML
@@ -0,0 +1,75 @@
+"""Preparación del dataset de entrenamiento (tokenización y collator).
+
+Dos caminos:
+- padded: el original, cada ejemplo rellenado a max_length (512 entrada / 128 target).
+- dinámico: tokenización sin padding, en paralelo y cacheada; el padding se hace por lote en el
+  collator y los ejemplos de longitud parecida se agrupan en los mismos lotes (group_by_length).
+"""
+import os
+
+from transformers import DataCollatorForSeq2Seq, default_data_collator
+
+MAX_SOURCE_LENGTH = int(os.getenv("MAX_SOURCE_LENGTH", "512"))
+MAX_TARGET_LENGTH = int(os.getenv("MAX_TARGET_LENGTH", "128"))
+TOKENIZE_NUM_PROC = int(os.getenv("TOKENIZE_NUM_PROC", str(max(1, (os.cpu_count() or 1) - 1))))
+TOKENIZE_BATCH_SIZE = 256
+LENGTH_COLUMN = "length"
+LABEL_PAD_TOKEN_ID = -100
+
+
+def _num_proc(dataset):
+    # Con pocos ejemplos lanzar procesos cuesta más que tokenizar en serie
+    return TOKENIZE_NUM_PROC if TOKENIZE_NUM_PROC > 1 and len(dataset) >= 1000 else None
+
+
+def tokenize_padded(dataset, tokenizer, max_source=MAX_SOURCE_LENGTH, max_target=MAX_TARGET_LENGTH):
+    """Camino original: padding fijo a max_length"""
+    def preprocess(example):
+        inputs = tokenizer(example["input"], truncation=True, padding="max_length", max_length=max_source)
+        targets = tokenizer(example["target"], truncation=True, padding="max_length", max_length=max_target)
+        inputs["labels"] = targets["input_ids"]
+        return inputs
+    return dataset.map(preprocess, remove_columns=["input", "target"])
+
+
+def tokenize_dynamic(dataset, tokenizer, max_source=MAX_SOURCE_LENGTH, max_target=MAX_TARGET_LENGTH):
+    """Tokeniza por lotes y en paralelo, sin padding, añadiendo la columna de longitud para agrupar.
+
+    `datasets` cachea el resultado junto al dataset (fingerprint de la función y sus parámetros),
+    así que una segunda ejecución con los mismos datos y tokenizer no vuelve a tokenizar.
+    """
+    def preprocess(batch):
+        inputs = tokenizer(batch["input"], truncation=True, max_length=max_source)
+        targets = tokenizer(text_target=batch["target"], truncation=True, max_length=max_target)
+        inputs["labels"] = targets["input_ids"]
+        inputs[LENGTH_COLUMN] = [len(ids) for ids in inputs["input_ids"]]
+        return inputs
+
+    return dataset.map(
+        preprocess,
+        batched=True,
+        batch_size=TOKENIZE_BATCH_SIZE,
+        num_proc=_num_proc(dataset),
+        remove_columns=["input", "target"],
+        load_from_cache_file=True,
+        desc="Tokenizando",
+    )
+
+
+def build_collator(tokenizer, model=None, dynamic=True):
+    """Collator para Seq2SeqTrainer: padding por lote y labels de relleno ignorados en la loss"""
+    if not dynamic:
+        return default_data_collator
+    return DataCollatorForSeq2Seq(
+        tokenizer,
+        model=model,
+        label_pad_token_id=LABEL_PAD_TOKEN_ID,
+        pad_to_multiple_of=8,
+    )
+
+
+def prepare_dataset(dataset, tokenizer, model=None, dynamic=True):
+    """(dataset tokenizado, collator) según el camino elegido"""
+    if dynamic:
+        return tokenize_dynamic(dataset, tokenizer), build_collator(tokenizer, model)
+    return tokenize_padded(dataset, tokenizer), build_collator(tokenizer, dynamic=False)
@@ -0,0 +1,147 @@
+"""Gestión incremental de los shards del dataset (data/datasetmodel_*.jsonl).
+
+- Cada shard se identifica por el hash de su contenido; el modelo registrado guarda el mapa
+  shard -> hash (dataset_manifest.json) para que el siguiente entrenamiento use solo shards nuevos
+  o modificados.
+- Los ejemplos se deduplican entre shards por hash de (input, target): gana la primera aparición.
+- Cada shard se tokeniza una vez y se guarda como Arrow en DATASET_CACHE_DIR; las siguientes
+  ejecuciones lo cargan memory-mapped sin volver a tokenizar.
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass
+
+from datasets import Dataset, concatenate_datasets, load_from_disk
+
+from data_pipeline import MAX_SOURCE_LENGTH, MAX_TARGET_LENGTH, tokenize_dynamic, tokenize_padded
+
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "./.dataset_cache")
+MANIFEST_FILE = "dataset_manifest.json"
+EXAMPLE_ID_COLUMN = "example_id"
+
+
+@dataclass
+class Shard:
+    name: str
+    path: str
+    hash: str
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def example_id(row):
+    text = " ".join(row["input"].split()) + "\0" + " ".join(row["target"].split())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_manifest(model_dir):
+    """Manifest del modelo del que se parte ({} si no existe)"""
+    path = os.path.join(model_dir, MANIFEST_FILE) if model_dir else None
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class DatasetManager:
+    def __init__(self, pattern, tokenizer, tokenizer_name, dynamic=True, cache_dir=DATASET_CACHE_DIR):
+        self.shards = [Shard(os.path.basename(p), p, file_hash(p)) for p in sorted(glob.glob(pattern))]
+        if not self.shards:
+            raise FileNotFoundError(f"❌ No hay shards que coincidan con {pattern}")
+        self.tokenizer = tokenizer
+        self.dynamic = dynamic
+        # La caché depende del tokenizer y de la forma de tokenizar, además del contenido del shard
+        settings = f"{tokenizer_name}|{MAX_SOURCE_LENGTH}|{MAX_TARGET_LENGTH}|{'dynamic' if dynamic else 'padded'}"
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha256(settings.encode()).hexdigest()[:16])
+
+    def pending(self, manifest, incremental=True):
+        """Shards a entrenar: todos, o solo los nuevos/modificados respecto al manifest"""
+        seen = manifest.get("shards", {})
+        if not incremental:
+            return list(self.shards)
+        return [s for s in self.shards if seen.get(s.name) != s.hash]
+
+    def _tokenized_shard(self, shard):
+        path = os.path.join(self.cache_dir, shard.hash)
+        if os.path.exists(os.path.join(path, "dataset_info.json")):
+            return load_from_disk(path)  # Arrow memory-mapped
+
+        rows, ids, seen = [], [], set()
+        for row in read_rows(shard.path):
+            key = example_id(row)
+            if key not in seen:
+                seen.add(key)
+                rows.append({"input": row["input"], "target": row["target"]})
+                ids.append(key)
+        dataset = Dataset.from_list(rows)
+        tokenize = tokenize_dynamic if self.dynamic else tokenize_padded
+        dataset = tokenize(dataset, self.tokenizer).add_column(EXAMPLE_ID_COLUMN, ids)
+
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        dataset.save_to_disk(tmp_path)
+        if os.path.exists(os.path.join(path, "dataset_info.json")):
+            # Otro proceso lo ha cacheado mientras tanto: se usa su copia
+            shutil.rmtree(tmp_path)
+            return load_from_disk(path)
+        if os.path.exists(path):
+            # Restos de una escritura interrumpida: os.replace no sobrescribe un directorio con contenido
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        print(f"💾 Shard {shard.name} tokenizado y cacheado ({len(dataset)} ejemplos)")
+        return load_from_disk(path)
+
+    def build(self, shards):
+        """Dataset tokenizado de los shards indicados, sin ejemplos repetidos.
+
+        También se excluyen los ejemplos que ya estaban en shards no seleccionados (ya vistos).
+        """
+        selected = {s.name for s in shards}
+        excluded = set()
+        for shard in self.shards:
+            if shard.name not in selected:
+                excluded.update(example_id(row) for row in read_rows(shard.path))
+
+        parts = []
+        for shard in shards:
+            dataset = self._tokenized_shard(shard)
+            keep = []
+            for index, key in enumerate(dataset[EXAMPLE_ID_COLUMN]):
+                if key not in excluded:
+                    excluded.add(key)
+                    keep.append(index)
+            if len(keep) < len(dataset):
+                print(f"🧹 {shard.name}: {len(dataset) - len(keep)} ejemplos duplicados descartados")
+            parts.append(dataset.select(keep) if len(keep) < len(dataset) else dataset)
+
+        dataset = concatenate_datasets(parts) if len(parts) > 1 else parts[0]
+        return dataset.remove_columns([EXAMPLE_ID_COLUMN])
+
+    def manifest(self, previous, trained, examples):
+        """Manifest acumulado: shards ya vistos + los entrenados en esta ejecución"""
+        shards = dict(previous.get("shards", {}))
+        shards.update({s.name: s.hash for s in trained})
+        return {
+            "shards": shards,
+            "trained_on": [s.name for s in trained],
+            "examples": examples,
+            "fingerprint": hashlib.sha256(json.dumps(shards, sort_keys=True).encode()).hexdigest()[:16],
+        }
+
+    @staticmethod
+    def save_manifest(manifest, model_dir):
+        with open(os.path.join(model_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
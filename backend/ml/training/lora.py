@@ -0,0 +1,65 @@
+"""Entrenamiento de adaptadores LoRA (PEFT) sobre un modelo base.
+
+El artefacto registrado contiene solo el adaptador (adapter_config.json + pesos) y base_model.json
+con la referencia al modelo base:
+    {"source": "hf", "name": "google/flan-t5-base"}
+    {"source": "azureml", "name": "genesis-model", "version": "7"}
+"""
+import json
+import os
+from pathlib import Path
+
+from transformers import AutoModelForSeq2SeqLM
+
+ADAPTER_CONFIG = "adapter_config.json"
+BASE_MODEL_FILE = "base_model.json"
+
+LORA_R = int(os.getenv("LORA_R", "16"))
+LORA_ALPHA = int(os.getenv("LORA_ALPHA", "32"))
+LORA_DROPOUT = float(os.getenv("LORA_DROPOUT", "0.05"))
+LORA_TARGET_MODULES = os.getenv("LORA_TARGET_MODULES", "q,v").split(",")
+
+
+def is_adapter(model_dir):
+    return model_dir is not None and (Path(model_dir) / ADAPTER_CONFIG).exists()
+
+
+def read_base_reference(adapter_dir):
+    path = Path(adapter_dir) / BASE_MODEL_FILE
+    if path.exists():
+        return json.loads(path.read_text())
+    with open(Path(adapter_dir) / ADAPTER_CONFIG) as f:
+        return {"source": "hf", "name": json.load(f)["base_model_name_or_path"]}
+
+
+def write_base_reference(adapter_dir, reference):
+    (Path(adapter_dir) / BASE_MODEL_FILE).write_text(json.dumps(reference))
+
+
+def load_base_model(reference, ml_client, download_path=Path("base_model")):
+    """Modelo base completo de una referencia (Hugging Face o modelo registrado en Azure ML)"""
+    if reference["source"] == "hf":
+        return AutoModelForSeq2SeqLM.from_pretrained(reference["name"])
+    ml_client.models.download(name=reference["name"], version=reference["version"], download_path=download_path)
+    candidate = download_path / reference["name"] / "model"
+    return AutoModelForSeq2SeqLM.from_pretrained(candidate if candidate.exists() else download_path)
+
+
+def load_adapter(base_model, adapter_dir, trainable=True):
+    from peft import PeftModel
+    return PeftModel.from_pretrained(base_model, adapter_dir, is_trainable=trainable)
+
+
+def add_lora(model):
+    """Congela el modelo y añade matrices LoRA entrenables en las capas de atención"""
+    from peft import LoraConfig, TaskType, get_peft_model
+    config = LoraConfig(
+        task_type=TaskType.SEQ_2_SEQ_LM,
+        r=LORA_R,
+        lora_alpha=LORA_ALPHA,
+        lora_dropout=LORA_DROPOUT,
+        target_modules=LORA_TARGET_MODULES,
+    )
+    model = get_peft_model(model, config)
+    model.print_trainable_parameters()
+    return model
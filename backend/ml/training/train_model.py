@@ -1,18 +1,29 @@
+import logging
 import os
+import sys
 import mlflow
 import mlflow.pytorch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, Seq2SeqTrainer, Seq2SeqTrainingArguments
-from datasets import load_dataset
 from azure.ai.ml import MLClient
 from azure.identity import DefaultAzureCredential
 from pathlib import Path
+from data_pipeline import build_collator, LENGTH_COLUMN
+from dataset_manager import DatasetManager, load_manifest
+import lora
 
 # Cargar configuración desde variables de entorno
 MODEL_NAME = os.getenv("HUGGINGFACE_MODEL", "google/flan-t5-base")
-DATASET_PATH = os.getenv("DATASET_PATH")
+# Fichero o patrón de shards (p. ej. ./data/datasetmodel_*.jsonl)
+DATASET_PATH = os.getenv("DATASET_PATH", "./data/datasetmodel_*.jsonl")
+# Entrenar solo con los shards nuevos o modificados respecto al modelo registrado
+INCREMENTAL_TRAINING = os.getenv("INCREMENTAL_TRAINING", "true").lower() == "true"
 AZURE_SUBSCRIPTION_ID = os.getenv("AZURE_SUBSCRIPTION_ID")
 AZURE_RESOURCE_GROUP = os.getenv("AZURE_RESOURCE_GROUP")
 AZURE_WORKSPACE_NAME = os.getenv("AZURE_WORKSPACE_NAME")
+# Padding por lote y lotes agrupados por longitud (false = padding fijo a max_length)
+DYNAMIC_PADDING = os.getenv("DYNAMIC_PADDING", "true").lower() == "true"
+# full: se ajusta y registra el modelo completo | lora: solo un adaptador LoRA con referencia al modelo base
+TRAINING_MODE = os.getenv("TRAINING_MODE", "full")
 
 # Inicializar cliente de Azure ML usando federated identity (GitHub Actions)
 try:
@@ -26,12 +37,24 @@ try:
 except Exception as e:
     raise RuntimeError(f"❌ Error autenticando con Azure ML: {e}")
 
+
+def version_key(model):
+    """Orden de versiones registradas: numéricas por número; las demás (por detrás) por fecha de creación"""
+    try:
+        return (1, int(model.version), 0.0)
+    except (TypeError, ValueError):
+        created = getattr(getattr(model, "creation_context", None), "created_at", None)
+        return (0, 0, created.timestamp() if created else 0.0)
+
+
 # Intentar cargar el último modelo desde Azure ML
 download_path = Path("downloaded_model")
+base_model_dir = None
+base_reference = {"source": "hf", "name": MODEL_NAME}
 try:
     models = list(ml_client.models.list(name="genesis-model"))
     if models:
-        latest_model = sorted(models, key=lambda m: m.version, reverse=True)[0]
+        latest_model = max(models, key=version_key)
         ml_client.models.download(
             name=latest_model.name, 
             version=latest_model.version, 
@@ -41,26 +64,46 @@ try:
         # Recalcular path correcto
         candidate = download_path / "genesis-model" / "model"
         model_dir = candidate if candidate.exists() else download_path
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+        if lora.is_adapter(model_dir):
+            # La versión registrada es un adaptador: se carga sobre su modelo base
+            base_reference = lora.read_base_reference(model_dir)
+            base = lora.load_base_model(base_reference, ml_client)
+            model = lora.load_adapter(base, model_dir, trainable=TRAINING_MODE == "lora")
+            if TRAINING_MODE != "lora":
+                model = model.merge_and_unload()
+        else:
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+            base_reference = {"source": "azureml", "name": latest_model.name, "version": str(latest_model.version)}
+        base_model_dir = model_dir
     else:
         raise Exception("No se encontró ninguna versión registrada")
 except Exception as e:
-    print(f"⚠️ No se pudo recuperar un modelo registrado. Motivo: {e}")
-    print("➡️ Se utilizará el modelo base de Hugging Face.")
+    logging.warning(f"⚠️ No se pudo recuperar un modelo registrado. Motivo: {e}")
+    logging.warning(f"➡️ Se utilizará el modelo base de Hugging Face ({MODEL_NAME}).")
     model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
+    base_reference = {"source": "hf", "name": MODEL_NAME}
+
+if TRAINING_MODE == "lora" and not hasattr(model, "peft_config"):
+    model = lora.add_lora(model)
+print(f"🧩 Modo de entrenamiento: {TRAINING_MODE} (modelo base: {base_reference})")
 
 # Tokenizador
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 
-# Preprocesar dataset
-def preprocess(example):
-    inputs = tokenizer(example["input"], truncation=True, padding="max_length", max_length=512)
-    targets = tokenizer(example["target"], truncation=True, padding="max_length", max_length=128)
-    inputs["labels"] = targets["input_ids"]
-    return inputs
+# Preprocesar dataset: shards deduplicados, tokenizados una vez y cacheados en Arrow
 print(f"✅ Dataset utilizado: {DATASET_PATH}")
-dataset = load_dataset("json", data_files=DATASET_PATH, split="train")
-dataset = dataset.map(preprocess, remove_columns=["input", "target"])
+dataset_manager = DatasetManager(DATASET_PATH, tokenizer, MODEL_NAME, dynamic=DYNAMIC_PADDING)
+previous_manifest = load_manifest(base_model_dir)
+shards = dataset_manager.pending(previous_manifest, incremental=INCREMENTAL_TRAINING and base_model_dir is not None)
+if not shards:
+    print("⏭️ No hay shards nuevos ni modificados desde el último modelo registrado, nada que entrenar.")
+    sys.exit(0)
+print(f"📦 Shards a entrenar: {[s.name for s in shards]}")
+dataset = dataset_manager.build(shards)
+if len(dataset) == 0:
+    print("⏭️ Los shards pendientes solo contienen ejemplos ya vistos, nada que entrenar.")
+    sys.exit(0)
+data_collator = build_collator(tokenizer, model, dynamic=DYNAMIC_PADDING)
 
 # Configurar entrenamiento
 training_args = Seq2SeqTrainingArguments(
@@ -72,6 +115,9 @@ training_args = Seq2SeqTrainingArguments(
     save_total_limit=1,
     evaluation_strategy="epoch",
     logging_dir="./logs",
+    save_safetensors=True,
+    group_by_length=DYNAMIC_PADDING,
+    length_column_name=LENGTH_COLUMN,
 )
 
 trainer = Seq2SeqTrainer(
@@ -80,6 +126,7 @@ trainer = Seq2SeqTrainer(
     train_dataset=dataset,
     eval_dataset=dataset,
     tokenizer=tokenizer,
+    data_collator=data_collator,
 )
 
 # Tracking con MLflow
@@ -89,6 +136,10 @@ mlflow.set_experiment("FineTuningGenesis")
 with mlflow.start_run():
     mlflow.log_param("model", MODEL_NAME)
     mlflow.log_param("epochs", training_args.num_train_epochs)
+    mlflow.log_param("dynamic_padding", DYNAMIC_PADDING)
+    mlflow.log_param("training_mode", TRAINING_MODE)
+    mlflow.log_param("shards", ",".join(s.name for s in shards))
+    mlflow.log_param("examples", len(dataset))
     
     trainer.train()
     metrics = trainer.evaluate()
@@ -96,6 +147,10 @@ with mlflow.start_run():
     
     # Guardar y exportar modelo
     trainer.save_model("./model")
+    if TRAINING_MODE == "lora":
+        # Solo se guardan los pesos del adaptador; el modelo base se referencia
+        lora.write_base_reference("./model", base_reference)
+    DatasetManager.save_manifest(dataset_manager.manifest(previous_manifest, shards, len(dataset)), "./model")
     mlflow.pytorch.log_model(trainer.model, artifact_path="model")
 
 print("✅ Fine-tuning y guardado completado correctamente.")
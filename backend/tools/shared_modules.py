@@ -0,0 +1,73 @@
+"""Módulos compartidos entre Function Apps: comprueba que las copias no divergen.
+
+Cada Function App se despliega por separado (su carpeta es el paquete que se sube), así que los
+módulos comunes viven copiados en cada app. La copia canónica es la de GenerateAdaptedCV: se
+edita esa y se propaga con --write.
+
+Uso:
+    python backend/tools/shared_modules.py          # falla (exit 1) si alguna copia difiere
+    python backend/tools/shared_modules.py --write  # copia la versión canónica sobre las demás
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CANONICAL = "Function3_GenerateCVadapted/GenerateAdaptedCV"
+EMBEDDINGS = "Function2_GenerateEmbeddings/GenerateEmbeddings"
+PHASE2 = "Function3_Fase2_AzureMLModel/GenerateCVadaptedphase2"
+
+# módulo -> carpetas con copias de la versión canónica
+SHARED_MODULES = {
+    "telemetry.py": [EMBEDDINGS, PHASE2],
+    "warmup.py": [EMBEDDINGS, PHASE2],
+    "embedding_codec.py": [EMBEDDINGS, PHASE2],
+    "openai_client.py": [EMBEDDINGS],
+    "chunking.py": [EMBEDDINGS],
+    "aio.py": [PHASE2],
+    "readiness.py": [PHASE2],
+    "result_cache.py": [PHASE2],
+    "sansio.py": [PHASE2],
+    "pdf_render.py": [PHASE2],
+    "context_packing.py": [PHASE2],
+}
+
+
+def diverged():
+    """(canónico, copia) de cada copia que no coincide con su versión canónica"""
+    pairs = []
+    for module, folders in SHARED_MODULES.items():
+        source = os.path.join(BACKEND, CANONICAL, module)
+        for folder in folders:
+            copy = os.path.join(BACKEND, folder, module)
+            if not os.path.exists(copy) or not filecmp.cmp(source, copy, shallow=False):
+                pairs.append((source, copy))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--write", action="store_true", help="sobrescribe las copias con la versión canónica")
+    args = parser.parse_args()
+
+    pairs = diverged()
+    for source, copy in pairs:
+        source, copy = os.path.relpath(source, BACKEND), os.path.relpath(copy, BACKEND)
+        if args.write:
+            shutil.copyfile(os.path.join(BACKEND, source), os.path.join(BACKEND, copy))
+            print(f"🔁 {copy} actualizado desde {source}")
+        else:
+            print(f"❌ {copy} difiere de {source}")
+    if pairs and not args.write:
+        print("Edita la copia canónica y ejecuta: python backend/tools/shared_modules.py --write")
+        return 1
+    if not pairs:
+        print(f"✅ {sum(len(folders) for folders in SHARED_MODULES.values())} copias de módulos compartidos al día")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
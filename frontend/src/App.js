@@ -3,11 +3,38 @@ import logoRight from './assets/images/upv.png';
 import logoLeft from './assets/images/etsinf.png';
 import './App.css';
 
+const STREAM_URL = "https://api-genesis.azure-api.net/func-genesis-generate/GenerateAdaptedCVStream";
+
+// La respuesta de GenerateAdaptedCVStream es un lote de eventos SSE (long-polling con cursor)
+const parseEvents = (body) => {
+  let retry = null;
+  const events = body.split("\n\n").filter((block) => block.trim()).map((block) => {
+    const event = { type: "message", data: "" };
+    block.split("\n").forEach((line) => {
+      if (line.startsWith("retry: ")) retry = Number(line.slice(7));
+      else if (line.startsWith("event: ")) event.type = line.slice(7);
+      else if (line.startsWith("data: ")) event.data += line.slice(6);
+    });
+    return event;
+  });
+  return { events, retry };
+};
+
+const downloadPdf = (url, name) => {
+  const a = document.createElement("a");
+  a.href = url;
+  a.download = name;
+  document.body.appendChild(a);
+  a.click();
+  document.body.removeChild(a);
+};
+
 function App() {
   const [file, setFile] = useState(null);
   const [jobId, setJobId] = useState(null);
   const [isUploading, setIsUploading] = useState(false);
   const [isGenerating, setIsGenerating] = useState(false);
+  const [streamedText, setStreamedText] = useState("");
 
   const handleFileChange = (e) => {
     const selectedFile = e.target.files[0];
@@ -59,35 +86,48 @@ function App() {
   const handleGenerate = async () => {
     if (!jobId) return alert("No se ha subido ningún archivo aún.");
     setIsGenerating(true);
+    setStreamedText("");
+    // Sin cursor se inicia (o se retoma) la generación; después se pide el texto a partir del cursor
+    let cursor = null;
     try {
-      const response = await fetch("https://api-genesis.azure-api.net/func-genesis-generate/GenerateAdaptedCV", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "Ocp-Apim-Subscription-Key": "75efa2c8485243f5ae8397740e084a8e"
-        },
-        body: JSON.stringify({ jobId })
-      });
-
-      let result;
-      try {
-        result = await response.json();
-      } catch (e) {
-        const text = await response.text();
-        console.error("Respuesta no JSON:", text);
-        alert("Error inesperado en el servidor.");
-        return;
-      }
+      while (true) {
+        const response = await fetch(STREAM_URL, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            "Ocp-Apim-Subscription-Key": "75efa2c8485243f5ae8397740e084a8e"
+          },
+          body: JSON.stringify(cursor === null ? { jobId } : { jobId, cursor })
+        });
+
+        const body = await response.text();
+        if (!response.ok) {
+          let message = body;
+          try {
+            message = JSON.parse(body).error;
+          } catch (e) {
+            console.error("Respuesta no JSON:", body);
+          }
+          alert("Error: " + message);
+          return;
+        }
 
-      if (response.ok && result.generatedCvUrl) {
-        const a = document.createElement("a");
-        a.href = result.generatedCvUrl;
-        a.download = `CV_Adaptado_${jobId}.pdf`;
-        document.body.appendChild(a);
-        a.click();
-        document.body.removeChild(a);
-      } else {
-        alert("Error: " + result.message);
+        const { events, retry } = parseEvents(body);
+        for (const event of events) {
+          const data = event.data ? JSON.parse(event.data) : {};
+          if (event.type === "token") {
+            setStreamedText((text) => text + data.text);
+            cursor = data.cursor;
+          } else if (event.type === "done") {
+            downloadPdf(data.generatedCvUrl, `CV_Adaptado_${jobId}.pdf`);
+            return;
+          } else if (event.type === "error") {
+            alert("Error: " + data.error);
+            return;
+          }
+        }
+        if (cursor === null) cursor = 0;
+        await new Promise((resolve) => setTimeout(resolve, retry ?? 250));
       }
     } catch (err) {
       alert("Error generando el CV: " + err.message);
@@ -120,12 +160,7 @@ const handleGenerateFineTuned = async () => {
     }
 
     if (response.ok && result.generatedCvUrl) {
-      const a = document.createElement("a");
-      a.href = result.generatedCvUrl;
-      a.download = `CV_Adaptado_FT_${jobId}.pdf`;
-      document.body.appendChild(a);
-      a.click();
-      document.body.removeChild(a);
+      downloadPdf(result.generatedCvUrl, `CV_Adaptado_FT_${jobId}.pdf`);
     } else {
       alert("Error: " + (result.message || "No se pudo generar el CV"));
     }
@@ -179,6 +214,8 @@ const handleGenerateFineTuned = async () => {
         </div>
       )}
 
+      {streamedText && <pre className="cv-preview">{streamedText}</pre>}
+
 
       <img src={logoLeft} alt="ETSINF logo" className="bottom-left" />
       <img src={logoRight} alt="UPV logo" className="bottom-right" />